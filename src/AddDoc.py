@@ -13,10 +13,15 @@ from langchain.text_splitter import RecursiveCharacterTextSplitter
 from langchain_qdrant import QdrantVectorStore
 from langchain_core.documents import Document
 
-from qdrant_client import QdrantClient
-from qdrant_client.http.models import Distance, VectorParams
 from qdrant_client.http import models as rest
 
+from .SemanticCache import get_semantic_cache
+from .EmbeddingCache import CachedEmbeddings
+from .KnowledgeSync import get_kb_sync
+from .LexicalIndex import get_lexical_index
+from .Retriever import get_qdrant_client
+from .Collection import CollectionManager
+
 class DocumentProcessor:
     """用于处理和向量化不同类型文档的类"""
     
@@ -41,12 +46,15 @@ class DocumentProcessor:
                            format='%(asctime)s - %(name)s - %(levelname)s - %(message)s')
         self.logger = logging.getLogger("DocumentProcessor")
         
-        # 初始化嵌入模型
-        self.embeddings = OpenAIEmbeddings(
+        # 初始化嵌入模型，重复的分片直接使用缓存的向量
+        self.embeddings = CachedEmbeddings(
+            OpenAIEmbeddings(
+                model=embedding_model,
+                api_key=os.getenv("EMBEDDING_API_KEY"),
+                base_url=os.getenv("EMBEDDING_API_BASE")
+            ),
             model=embedding_model,
-            api_key=os.getenv("EMBEDDING_API_KEY"),
-            base_url=os.getenv("EMBEDDING_API_BASE")
-            )
+        )
         
         # 配置文本分割器
         self.splitter = RecursiveCharacterTextSplitter(
@@ -60,9 +68,16 @@ class DocumentProcessor:
         self.storage_dir = persist_directory or tempfile.mkdtemp(prefix="qdrant_")
         self.logger.info(f"使用存储目录: {self.storage_dir}")
         
-        # 初始化Qdrant客户端和集合
+        # 初始化Qdrant客户端和集合，与同进程内的检索服务共用同一个客户端
         self.collection_name = collection_name
-        self.client = QdrantClient(path=self.storage_dir)
+        self.client, self.client_lock = get_qdrant_client(self.storage_dir)
+        self.collection = CollectionManager(
+            self.client,
+            collection_name,
+            embedding_model=embedding_model,
+            embeddings=self.embeddings,
+            lock=self.client_lock,
+        )
         
         # 检查并创建集合
         self._ensure_collection_exists()
@@ -75,24 +90,9 @@ class DocumentProcessor:
         )
     
     def _ensure_collection_exists(self) -> None:
-        """确保Qdrant集合存在，不存在则创建"""
+        """确保Qdrant集合存在，不存在则按嵌入模型维度和 COLLECTION_PROFILE 档位创建，已有集合按档位迁移"""
         try:
-            collections = self.client.get_collections().collections
-            if not any(collection.name == self.collection_name for collection in collections):
-                self.logger.info(f"创建新集合: {self.collection_name}")
-                self.client.create_collection(
-                    collection_name=self.collection_name,
-                    vectors_config=VectorParams(size=1024, distance=Distance.COSINE),
-                    optimizers_config=rest.OptimizersConfigDiff(
-                        indexing_threshold=10000,  # 优化索引阈值
-                    ),
-                    hnsw_config=rest.HnswConfigDiff(
-                        m=16,  # 提高检索精度的HNSW图参数
-                        ef_construct=128,  # 提高构建质量
-                    )
-                )
-            else:
-                self.logger.info(f"使用已有集合: {self.collection_name}")
+            self.collection.ensure()
         except Exception as e:
             self.logger.error(f"创建集合时出错: {e}")
             raise
@@ -144,7 +144,31 @@ class DocumentProcessor:
             
             # 生成 UUID 格式的 ID
             ids = [str(uuid.uuid4()) for _ in range(len(chunks))]
-            self.vector_store.add_documents(documents=chunks, ids=ids)
+            # 先在锁外完成嵌入，写入时才持有客户端锁，避免长时间阻塞检索
+            texts = [chunk.page_content for chunk in chunks]
+            vectors = self.embeddings.embed_documents(texts)
+            points = [
+                rest.PointStruct(
+                    id=point_id,
+                    vector=vector,
+                    payload={
+                        self.vector_store.content_payload_key: chunk.page_content,
+                        self.vector_store.metadata_payload_key: chunk.metadata,
+                    },
+                )
+                for point_id, vector, chunk in zip(ids, vectors, chunks)
+            ]
+            with self.client_lock:
+                self.client.upsert(collection_name=self.collection_name, points=points)
+            # 同步更新进程内的 BM25 索引
+            get_lexical_index(self.collection_name).add_many(
+                (point_id, chunk.page_content, chunk.metadata) for point_id, chunk in zip(ids, chunks)
+            )
+            self.invalidate_answer_cache(ids)
+            # 通知其他进程(Slack 机器人)的检索服务更新各自的索引和缓存；
+            # 嵌入式 Qdrant 不能被其他进程读取，只在连接 Qdrant 服务时通知
+            if not self.collection.embedded:
+                get_kb_sync(self.collection_name).publish(ids)
             
             return {
                 "status": "success", 
@@ -156,6 +180,27 @@ class DocumentProcessor:
             self.logger.error(f"处理文档时出错: {e}")
             return {"error": str(e)}
     
+    def invalidate_answer_cache(self, chunk_ids: List[str]) -> int:
+        """
+        分片新增或变更后，使语义缓存中可能受影响的回答失效
+        
+        Args:
+            chunk_ids: 新增或变更的分片ID
+            
+        Returns:
+            失效的缓存条目数
+        """
+        with self.client_lock:
+            points = self.client.retrieve(
+                collection_name=self.collection_name,
+                ids=chunk_ids,
+                with_vectors=True,
+            )
+        return get_semantic_cache(self.collection_name).invalidate(
+            chunk_ids=chunk_ids,
+            vectors=[point.vector for point in points],
+        )
+    
     def __del__(self):
         """析构函数，清理临时资源"""
         if hasattr(self, 'is_temp_dir') and self.is_temp_dir and hasattr(self, 'storage_dir'):
@@ -1,15 +1,19 @@
 # 导入必要的库和模块
+import queue
+import threading
+from concurrent.futures import ThreadPoolExecutor, TimeoutError as FutureTimeoutError
 from langchain.agents import AgentExecutor,create_tool_calling_agent
 from langchain_openai import ChatOpenAI  # OpenAI聊天模型接口
 from langchain_core.runnables import ConfigurableField
-from .Prompt import PromptClass  # 导入提示词管理类
+from langchain_core.callbacks import BaseCallbackHandler
+from .Prompt import PromptClass, MOODS, normalize_feeling  # 导入提示词管理类
 from .Memory import MemoryClass  # 导入记忆管理类
 from .Emotion import EmotionClass  # 导入情感分析类
-from langchain_core.caches import InMemoryCache  # 内存缓存，用于加速响应
+from .Cache import create_llm_cache  # 有容量上限和TTL的LLM缓存，用于加速响应
 from .Storage import get_user  # 获取用户信息的函数
 
 # 导入各种工具函数
-from .Tools import search,get_info_from_local,create_todo,checkSchedule,SetSchedule,SearchSchedule,ModifySchedule,DelSchedule,ConfirmDelSchedule
+from .Tools import search,get_info_from_local,get_info_from_local_batch,create_todo,create_todo_batch,checkSchedule,SetSchedule,SetScheduleBatch,SearchSchedule,ModifySchedule,DelSchedule,ConfirmDelSchedule,ConfirmDelScheduleBatch
 from dotenv import load_dotenv as _load_dotenv
 _load_dotenv()
 import os
@@ -27,8 +31,37 @@ os.environ["OPENAI_API_BASE"] = os.getenv("OPENAI_API_BASE")
 
 
 # 添加缓存以提高性能，避免重复请求相同内容时消耗额外的API调用
+# 缓存有条目数上限和过期时间，可通过 LLM_CACHE_BACKEND 选择 memory / sqlite / redis 后端，在多个进程间共享
 from langchain_core.globals import set_llm_cache
-set_llm_cache(InMemoryCache())
+llm_cache = create_llm_cache()
+set_llm_cache(llm_cache)
+
+
+class StreamingEventHandler(BaseCallbackHandler):
+    """
+    将代理运行过程中的工具调用状态和回答 token 写入队列，供流式输出消费
+    """
+    def __init__(self, events: queue.Queue):
+        self.events = events
+        # 工具内部也可能调用 LLM，只转发代理本身生成的 token
+        self.tool_depth = 0
+
+    def on_tool_start(self, serialized, input_str, **kwargs):
+        self.tool_depth += 1
+        self.events.put({"type": "tool_start", "tool": serialized.get("name"), "input": input_str})
+
+    def on_tool_end(self, output, **kwargs):
+        self.tool_depth = max(0, self.tool_depth - 1)
+        self.events.put({"type": "tool_end", "tool": kwargs.get("name")})
+
+    def on_tool_error(self, error, **kwargs):
+        self.tool_depth = max(0, self.tool_depth - 1)
+        self.events.put({"type": "tool_end", "tool": kwargs.get("name"), "error": str(error)})
+
+    def on_llm_new_token(self, token, **kwargs):
+        # 工具调用阶段的 token 为空字符串，直接跳过
+        if token and self.tool_depth == 0:
+            self.events.put({"type": "token", "text": token})
 
 
 class AgentClass:
@@ -43,11 +76,11 @@ class AgentClass:
         # 获取主模型名称
         self.modelname = os.getenv("BASE_MODEL")
         
-        # 创建主聊天模型，并配置备用模型
-        self.chatmodel = ChatOpenAI(model=self.modelname).with_fallbacks([fallback_llm])
+        # 创建主聊天模型，并配置备用模型；开启 streaming 以便流式模式逐个输出 token
+        self.chatmodel = ChatOpenAI(model=self.modelname, streaming=True).with_fallbacks([fallback_llm])
         
         # 设置可用的工具列表，这些工具可以被AI代理调用
-        self.tools = [search,get_info_from_local,create_todo,checkSchedule,SetSchedule,SearchSchedule,ModifySchedule,DelSchedule,ConfirmDelSchedule]
+        self.tools = [search,get_info_from_local,get_info_from_local_batch,create_todo,create_todo_batch,checkSchedule,SetSchedule,SetScheduleBatch,SearchSchedule,ModifySchedule,DelSchedule,ConfirmDelSchedule,ConfirmDelScheduleBatch]
         
         # 从环境变量获取记忆键名
         self.memorykey = os.getenv("MEMORY_KEY")
@@ -55,36 +88,80 @@ class AgentClass:
         # 初始化情感状态，默认中性(5分)
         self.feeling = {"feeling":"default","score":5}
         
-        # 创建提示词结构
-        self.prompt = PromptClass(memorykey=self.memorykey,feeling=self.feeling).Prompt_Structure()
-        
         # 初始化记忆系统
         self.memory = MemoryClass(memorykey=self.memorykey,model=self.modelname)
         
         # 初始化情感分析系统
         self.emotion = EmotionClass(model=self.modelname)
         
-        # 创建工具调用型代理
-        self.agent = create_tool_calling_agent(
-            self.chatmodel,  # 使用的聊天模型
-            self.tools,      # 可用工具列表
-            self.prompt,     # 提示词结构
+        # 情感分析和记忆加载并行执行所用的线程池
+        self.stage_pool = ThreadPoolExecutor(
+            max_workers=int(os.getenv("AGENT_STAGE_WORKERS", "16")),
+            thread_name_prefix="agent-stage",
         )
         
-        # 创建代理执行器，整合代理、工具和记忆系统
-        self.agent_chain = AgentExecutor(
-            agent=self.agent,
-            tools=self.tools,
-            memory=self.memory.set_memory(),
-            verbose=True  # 启用详细输出，便于调试
-        ).configurable_fields(
-            # 设置可配置的记忆字段，允许在运行时修改记忆系统
-            memory=ConfigurableField(
-                id="agent_memory",
-                name="Agent Memory",
-                description="The memory of the agent",
-            )
-        )
+        # 情感分析截止时间(秒)，超时则先用该会话上一次的情绪启动代理；为空表示一直等待
+        deadline = os.getenv("EMOTION_DEADLINE")
+        self.emotion_deadline = float(deadline) if deadline else None
+        
+        # 每个会话最近一次的情绪结果，供超时时推测使用
+        self.last_feelings = {}
+        self.last_feelings_lock = threading.Lock()
+        
+        # 按 (情绪, 分值) 缓存已编译的提示词和代理执行器，每轮只需取出对应条目
+        self.agent_chains = {}
+        self.agent_chains_lock = threading.Lock()
+        if os.getenv("AGENT_PREBUILD_PROMPTS", "false").lower() == "true":
+            # 启动时预先构建全部 6 种情绪 x 10 个分值的代理
+            for mood in MOODS:
+                for score in range(1, 11):
+                    self.get_agent_chain({"feeling": mood, "score": score})
+        
+        # 默认情绪对应的代理执行器
+        self.agent_chain = self.get_agent_chain(self.feeling)
+
+    def get_agent_chain(self, feeling):
+        """
+        获取情绪对应的代理执行器，不存在时构建并缓存
+        
+        参数:
+            feeling: 情感分析结果，如 {"feeling": "angry", "score": "8"}
+            
+        返回:
+            记忆字段可按请求配置的代理执行器
+        """
+        key = normalize_feeling(feeling)
+        chain = self.agent_chains.get(key)
+        if chain is not None:
+            return chain
+        with self.agent_chains_lock:
+            if key not in self.agent_chains:
+                # 创建提示词结构
+                prompt = PromptClass(memorykey=self.memorykey, feeling={"feeling": key[0], "score": key[1]}).Prompt_Structure()
+                
+                # 创建工具调用型代理
+                agent = create_tool_calling_agent(
+                    self.chatmodel,  # 使用的聊天模型
+                    self.tools,      # 可用工具列表
+                    prompt,          # 提示词结构
+                )
+                
+                # 创建代理执行器，整合代理、工具和记忆系统
+                # 记忆在每次调用时通过 configurable 传入，这里不预先加载
+                self.agent_chains[key] = AgentExecutor(
+                    agent=agent,
+                    tools=self.tools,
+                    memory=None,
+                    verbose=True  # 启用详细输出，便于调试
+                ).configurable_fields(
+                    # 设置可配置的记忆字段，允许在运行时修改记忆系统
+                    memory=ConfigurableField(
+                        id="agent_memory",
+                        name="Agent Memory",
+                        description="The memory of the agent",
+                    )
+                )
+            return self.agent_chains[key]
 
     def run_agent(self, input, session_id=None):
         """
@@ -97,19 +174,84 @@ class AgentClass:
         返回:
             包含AI回复的字典
         """
-        # 进行情感分析，了解用户当前的情绪状态
-        self.feeling = self.emotion.Emotion_Sensing(input)
-        
-        # 根据用户情绪更新提示词结构
-        self.prompt = PromptClass(memorykey=self.memorykey, feeling=self.feeling).Prompt_Structure()
-        print("self.prompt", self.prompt)
-        
-        # 运行代理链，处理用户输入
-        # 根据当前用户ID设置对应的记忆
-        res = self.agent_chain.with_config({
-            "agent_memory": self.memory.set_memory(session_id=session_id)
-        }).invoke(
+        return self._prepare_agent(input, session_id).invoke(
             {"input": input}  # 传入用户输入
+        )  # 返回代理处理结果
+
+    def stream_agent(self, input, session_id=None):
+        """
+        以流式方式运行AI代理
+        
+        参数:
+            input: 用户输入的文本
+            session_id: 会话ID，用于标识不同的对话上下文
+            
+        返回:
+            事件生成器，依次产出 tool_start / tool_end / token 事件，
+            最后产出包含完整回复的 final 事件，出错时产出 error 事件
+        """
+        events = queue.Queue()
+        agent_chain = self._prepare_agent(input, session_id)
+
+        def run():
+            try:
+                res = agent_chain.invoke(
+                    {"input": input},
+                    config={"callbacks": [StreamingEventHandler(events)]},
+                )
+                events.put({"type": "final", "output": res.get("output", "")})
+            except Exception as e:
+                events.put({"type": "error", "error": str(e)})
+            finally:
+                events.put(None)
+
+        # 代理在独立线程中运行，生成器一边等待一边把事件交给调用方
+        threading.Thread(target=run, daemon=True).start()
+        while True:
+            event = events.get()
+            if event is None:
+                return
+            yield event
+
+    def _prepare_agent(self, input, session_id=None):
+        """完成情感分析和记忆加载，返回已绑定本次会话记忆的代理执行器"""
+        # 情感分析(一次LLM调用)和加载Redis记忆互不依赖，并行执行
+        # 情绪和提示词只保存在本次调用的局部变量中，避免并发请求互相覆盖
+        emotion_future = self.stage_pool.submit(self.emotion.Emotion_Sensing, input)
+        emotion_future.add_done_callback(lambda f: self._remember_feeling(session_id, f))
+        memory_future = self.stage_pool.submit(self.memory.set_memory, session_id=session_id)
+        
+        feeling = self._wait_feeling(emotion_future, session_id)
+        memory = memory_future.result()
+        
+        # 根据用户情绪选取已编译的提示词和代理
+        agent_chain = self.get_agent_chain(feeling)
+        print("feeling", feeling)
+        
+        # 根据当前用户ID设置对应的记忆，记忆通过 configurable 按请求传入
+        return agent_chain.with_config(
+            configurable={"agent_memory": memory}
         )
-        return res  # 返回代理处理结果
 
+    def _wait_feeling(self, emotion_future, session_id):
+        """
+        等待情感分析结果
+        
+        设置了 EMOTION_DEADLINE 时，超过截止时间仍未返回则推测性地使用该会话上一次的情绪，
+        分析结果返回后仍会被记录下来供下一轮使用
+        """
+        try:
+            feeling = emotion_future.result(timeout=self.emotion_deadline)
+        except FutureTimeoutError:
+            print(f"情感分析超过 {self.emotion_deadline}s，使用上一次的情绪")
+            feeling = None
+        if feeling:
+            return feeling
+        with self.last_feelings_lock:
+            return self.last_feelings.get(session_id, {"feeling": "default", "score": 5})
+
+    def _remember_feeling(self, session_id, emotion_future):
+        """记录会话最近一次成功的情感分析结果"""
+        if emotion_future.exception() is None and emotion_future.result():
+            with self.last_feelings_lock:
+                self.last_feelings[session_id] = emotion_future.result()
@@ -0,0 +1,343 @@
+import hashlib
+import logging
+import os
+import sqlite3
+import threading
+import time
+from collections import OrderedDict
+from typing import Any, Optional, Sequence
+
+from langchain_core.caches import RETURN_VAL_TYPE, BaseCache
+from langchain_core.load import dumps, loads
+from dotenv import load_dotenv as _load_dotenv
+_load_dotenv()
+
+
+class MemoryStore:
+    """进程内 LRU 存储，按条目数上限和 TTL 淘汰"""
+
+    def __init__(self, max_entries: int = 10000, ttl: Optional[float] = None) -> None:
+        self.max_entries = max_entries
+        self.ttl = ttl
+        self.evictions = 0
+        self.expirations = 0
+        self._data: "OrderedDict[str, tuple]" = OrderedDict()
+        self._lock = threading.Lock()
+
+    def get(self, key: str) -> Optional[bytes]:
+        with self._lock:
+            item = self._data.get(key)
+            if item is None:
+                return None
+            value, expires_at = item
+            if expires_at is not None and expires_at <= time.time():
+                del self._data[key]
+                self.expirations += 1
+                return None
+            self._data.move_to_end(key)
+            return value
+
+    def set(self, key: str, value: bytes) -> None:
+        expires_at = time.time() + self.ttl if self.ttl else None
+        with self._lock:
+            self._data[key] = (value, expires_at)
+            self._data.move_to_end(key)
+            while len(self._data) > self.max_entries:
+                self._data.popitem(last=False)
+                self.evictions += 1
+
+    def delete(self, key: str) -> None:
+        with self._lock:
+            self._data.pop(key, None)
+
+    def clear(self) -> None:
+        with self._lock:
+            self._data.clear()
+
+    def _purge_expired(self) -> None:
+        """删除已过期的条目，调用方需持有锁"""
+        if not self.ttl:
+            return
+        now = time.time()
+        expired = [key for key, (_, expires_at) in self._data.items()
+                   if expires_at is not None and expires_at <= now]
+        for key in expired:
+            del self._data[key]
+        self.expirations += len(expired)
+
+    def __len__(self) -> int:
+        with self._lock:
+            self._purge_expired()
+            return len(self._data)
+
+    def size_bytes(self) -> int:
+        with self._lock:
+            self._purge_expired()
+            return sum(len(key) + len(value) for key, (value, _) in self._data.items())
+
+
+class SQLiteStore:
+    """SQLite 文件存储，进程重启后仍可命中，同一台机器上的多个进程可共享"""
+
+    def __init__(self, path: str = "./llm_cache.sqlite", max_entries: int = 100000,
+                 ttl: Optional[float] = None, table: str = "cache") -> None:
+        self.max_entries = max_entries
+        self.ttl = ttl
+        self.table = table
+        self.evictions = 0
+        self.expirations = 0
+        self._lock = threading.Lock()
+        self._conn = sqlite3.connect(path, check_same_thread=False, timeout=30)
+        self._conn.execute("PRAGMA journal_mode=WAL")
+        self._conn.execute(
+            f"CREATE TABLE IF NOT EXISTS {table} ("
+            "key TEXT PRIMARY KEY, value BLOB, expires_at REAL, accessed_at REAL)"
+        )
+        self._conn.execute(f"CREATE INDEX IF NOT EXISTS {table}_accessed ON {table}(accessed_at)")
+        self._conn.commit()
+
+    def get(self, key: str) -> Optional[bytes]:
+        now = time.time()
+        with self._lock:
+            row = self._conn.execute(
+                f"SELECT value, expires_at FROM {self.table} WHERE key = ?", (key,)
+            ).fetchone()
+            if row is None:
+                return None
+            if row[1] is not None and row[1] <= now:
+                self._conn.execute(f"DELETE FROM {self.table} WHERE key = ?", (key,))
+                self._conn.commit()
+                self.expirations += 1
+                return None
+            self._conn.execute(f"UPDATE {self.table} SET accessed_at = ? WHERE key = ?", (now, key))
+            self._conn.commit()
+            return row[0]
+
+    def set(self, key: str, value: bytes) -> None:
+        now = time.time()
+        expires_at = now + self.ttl if self.ttl else None
+        with self._lock:
+            self._conn.execute(
+                f"INSERT OR REPLACE INTO {self.table} (key, value, expires_at, accessed_at) VALUES (?, ?, ?, ?)",
+                (key, value, expires_at, now),
+            )
+            # 超出上限时按最近访问时间淘汰最旧的条目
+            overflow = self._conn.execute(f"SELECT COUNT(*) FROM {self.table}").fetchone()[0] - self.max_entries
+            if overflow > 0:
+                self._conn.execute(
+                    f"DELETE FROM {self.table} WHERE key IN "
+                    f"(SELECT key FROM {self.table} ORDER BY accessed_at LIMIT ?)",
+                    (overflow,),
+                )
+                self.evictions += overflow
+            self._conn.commit()
+
+    def delete(self, key: str) -> None:
+        with self._lock:
+            self._conn.execute(f"DELETE FROM {self.table} WHERE key = ?", (key,))
+            self._conn.commit()
+
+    def clear(self) -> None:
+        with self._lock:
+            self._conn.execute(f"DELETE FROM {self.table}")
+            self._conn.commit()
+
+    def __len__(self) -> int:
+        with self._lock:
+            return self._conn.execute(f"SELECT COUNT(*) FROM {self.table}").fetchone()[0]
+
+    def size_bytes(self) -> int:
+        with self._lock:
+            row = self._conn.execute(
+                f"SELECT COALESCE(SUM(LENGTH(key) + LENGTH(value)), 0) FROM {self.table}"
+            ).fetchone()
+            return row[0]
+
+
+class RedisStore:
+    """
+    Redis 存储，多个进程和机器共享；TTL 由 Redis 过期处理，条目数上限通过有序集合记录访问时间实现 LRU
+    另用一个按过期时间排序的有序集合，在计数和淘汰前清掉已过期条目的 LRU 记录
+    """
+
+    def __init__(self, redis_url: str = os.environ.get("REDIS_URL", "redis://localhost:6379/0"),
+                 prefix: str = "llm_cache", max_entries: int = 100000, ttl: Optional[float] = None) -> None:
+        from .RedisPool import get_redis
+
+        # 与对话记录共用进程级连接池
+        self.client = get_redis(redis_url)
+        self.prefix = prefix
+        self.max_entries = max_entries
+        self.ttl = ttl
+        self.evictions = 0
+        self.expirations = 0
+        self._lock = threading.Lock()
+        self._lru_key = f"{prefix}:lru"
+        self._expiry_key = f"{prefix}:expiry"
+
+    def _key(self, key: str) -> str:
+        return f"{self.prefix}:{key}"
+
+    def _count(self, name: str, n: int) -> None:
+        with self._lock:
+            setattr(self, name, getattr(self, name) + n)
+
+    def _purge_expired(self) -> None:
+        """从 LRU 和过期记录中移除 Redis 已过期删除的条目"""
+        if not self.ttl:
+            return
+        expired = self.client.zrangebyscore(self._expiry_key, 0, time.time())
+        if not expired:
+            return
+        pipe = self.client.pipeline()
+        pipe.zrem(self._lru_key, *expired)
+        pipe.zrem(self._expiry_key, *expired)
+        removed = pipe.execute()[0]
+        if removed:
+            self._count("expirations", removed)
+
+    def get(self, key: str) -> Optional[bytes]:
+        value = self.client.get(self._key(key))
+        if value is None:
+            # 已被 Redis 过期删除的条目同时从 LRU 记录中移除
+            pipe = self.client.pipeline()
+            pipe.zrem(self._lru_key, key)
+            pipe.zrem(self._expiry_key, key)
+            if pipe.execute()[0]:
+                self._count("expirations", 1)
+            return None
+        self.client.zadd(self._lru_key, {key: time.time()}, xx=True)
+        return value
+
+    def set(self, key: str, value: bytes) -> None:
+        self._purge_expired()
+        now = time.time()
+        pipe = self.client.pipeline()
+        if self.ttl:
+            pipe.set(self._key(key), value, px=int(self.ttl * 1000))
+            pipe.zadd(self._expiry_key, {key: now + self.ttl})
+        else:
+            pipe.set(self._key(key), value)
+        pipe.zadd(self._lru_key, {key: now})
+        pipe.zcard(self._lru_key)
+        overflow = pipe.execute()[-1] - self.max_entries
+        if overflow > 0:
+            oldest = self.client.zpopmin(self._lru_key, overflow)
+            if oldest:
+                members = [member.decode() for member, _ in oldest]
+                pipe = self.client.pipeline()
+                pipe.delete(*(self._key(member) for member in members))
+                pipe.zrem(self._expiry_key, *members)
+                pipe.execute()
+                self._count("evictions", len(oldest))
+
+    def delete(self, key: str) -> None:
+        pipe = self.client.pipeline()
+        pipe.delete(self._key(key))
+        pipe.zrem(self._lru_key, key)
+        pipe.zrem(self._expiry_key, key)
+        pipe.execute()
+
+    def clear(self) -> None:
+        keys = [self._key(member.decode()) for member in self.client.zrange(self._lru_key, 0, -1)]
+        if keys:
+            self.client.delete(*keys)
+        self.client.delete(self._lru_key, self._expiry_key)
+
+    def __len__(self) -> int:
+        self._purge_expired()
+        return self.client.zcard(self._lru_key)
+
+    def size_bytes(self) -> int:
+        self._purge_expired()
+        pipe = self.client.pipeline()
+        for member in self.client.zrange(self._lru_key, 0, -1):
+            pipe.strlen(self._key(member.decode()))
+        return sum(pipe.execute())
+
+
+def create_store(backend: str, name: str, max_entries: int, ttl: Optional[float] = None):
+    """
+    按名称创建存储后端
+
+    Args:
+        backend: memory、sqlite 或 redis
+        name: 用于区分不同用途的缓存，作为 SQLite 表名和 Redis 键前缀
+        max_entries: 条目数上限
+        ttl: 过期时间(秒)，None 表示不过期
+    """
+    if backend == "memory":
+        return MemoryStore(max_entries=max_entries, ttl=ttl)
+    if backend == "sqlite":
+        return SQLiteStore(path=os.getenv("CACHE_SQLITE_PATH", "./cache.sqlite"),
+                           max_entries=max_entries, ttl=ttl, table=name)
+    if backend == "redis":
+        return RedisStore(prefix=name, max_entries=max_entries, ttl=ttl)
+    raise ValueError(f"Unknown cache backend: {backend}")
+
+
+class BoundedLLMCache(BaseCache):
+    """
+    有容量上限和 TTL 的 LLM 响应缓存，替代无上限的 InMemoryCache
+    存储后端可以是进程内存、SQLite 文件或 Redis，并统计命中/未命中/淘汰次数
+    """
+
+    def __init__(self, store) -> None:
+        self.store = store
+        self.hits = 0
+        self.misses = 0
+        self._lock = threading.Lock()
+        self.logger = logging.getLogger("BoundedLLMCache")
+
+    @staticmethod
+    def _key(prompt: str, llm_string: str) -> str:
+        return hashlib.sha256(f"{llm_string}\x00{prompt}".encode("utf-8")).hexdigest()
+
+    def lookup(self, prompt: str, llm_string: str) -> Optional[RETURN_VAL_TYPE]:
+        try:
+            value = self.store.get(self._key(prompt, llm_string))
+        except Exception as e:
+            # 缓存故障不能影响正常请求
+            self.logger.warning(f"读取LLM缓存失败: {e}")
+            value = None
+        with self._lock:
+            if value is None:
+                self.misses += 1
+            else:
+                self.hits += 1
+        if value is None:
+            return None
+        return loads(value.decode("utf-8") if isinstance(value, bytes) else value)
+
+    def update(self, prompt: str, llm_string: str, return_val: RETURN_VAL_TYPE) -> None:
+        try:
+            self.store.set(self._key(prompt, llm_string), dumps(list(return_val)).encode("utf-8"))
+        except Exception as e:
+            self.logger.warning(f"写入LLM缓存失败: {e}")
+
+    def clear(self, **kwargs: Any) -> None:
+        self.store.clear()
+
+    def stats(self) -> dict:
+        lookups = self.hits + self.misses
+        return {
+            "backend": type(self.store).__name__,
+            "entries": len(self.store),
+            "hits": self.hits,
+            "misses": self.misses,
+            "hit_rate": self.hits / lookups if lookups else 0.0,
+            "evictions": self.store.evictions,
+            "expirations": self.store.expirations,
+        }
+
+
+def create_llm_cache() -> BoundedLLMCache:
+    """根据环境变量 LLM_CACHE_BACKEND / LLM_CACHE_MAX_ENTRIES / LLM_CACHE_TTL 创建 LLM 缓存"""
+    ttl = os.getenv("LLM_CACHE_TTL", "86400")
+    store = create_store(
+        backend=os.getenv("LLM_CACHE_BACKEND", "memory"),
+        name="llm_cache",
+        max_entries=int(os.getenv("LLM_CACHE_MAX_ENTRIES", "10000")),
+        ttl=float(ttl) if ttl else None,
+    )
+    return BoundedLLMCache(store)
@@ -0,0 +1,425 @@
+import json
+import logging
+import os
+import sqlite3
+import threading
+import time
+from datetime import datetime, timezone
+from typing import Iterable, List, Optional
+
+from googleapiclient.errors import HttpError
+
+from .GoogleServices import get_google_services
+
+
+def parse_time(value: Optional[str]) -> Optional[float]:
+    """
+    把 ISO-8601 时间或日期转换为时间戳
+    不带时区的时间和全天日程的日期按本机时区处理
+    """
+    if not value:
+        return None
+    parsed = datetime.fromisoformat(value.replace("Z", "+00:00"))
+    return parsed.timestamp()
+
+
+def event_bounds(event: dict) -> tuple:
+    """日程的 (开始, 结束) 时间戳，全天日程使用 date 字段"""
+    start = event.get("start", {})
+    end = event.get("end", {})
+    start_ts = parse_time(start.get("dateTime") or start.get("date"))
+    end_ts = parse_time(end.get("dateTime") or end.get("date"))
+    if end_ts is None or end_ts < start_ts:
+        end_ts = start_ts
+    return start_ts, end_ts
+
+
+class CalendarMirror:
+    """
+    Google Calendar 日程的本地镜像
+    日程保存在 SQLite 中，并用 R*Tree 按 [开始, 结束] 区间建立索引，范围查询直接在本地完成；
+    通过 events().list 的 syncToken 增量同步，只有同步令牌失效(410 Gone)时才全量重新同步。
+    后台线程定期同步，本进程内的写操作通过 apply/remove 立即更新镜像
+
+    重复日程按 singleEvents 展开为单次日程，为避免无结束日期的重复日程无限展开，全量同步只拉取
+    [现在 - past_days, 现在 + future_days] 内的日程；窗口剩余的未来天数不足一半时重新全量同步以向前滑动。
+    查询范围超出窗口，或首次同步尚未完成时，直接请求 API，不在工具调用中等待全量同步
+    """
+
+    def __init__(self, service=None,
+                 path: str = os.getenv("CALENDAR_MIRROR_PATH", "./calendar_mirror.sqlite"),
+                 calendars: Iterable[str] = os.getenv("CALENDAR_MIRROR_CALENDARS", "primary").split(","),
+                 sync_interval: float = float(os.getenv("CALENDAR_SYNC_INTERVAL", "60")),
+                 page_size: int = int(os.getenv("CALENDAR_SYNC_PAGE_SIZE", "2500")),
+                 past_days: float = float(os.getenv("CALENDAR_MIRROR_PAST_DAYS", "90")),
+                 future_days: float = float(os.getenv("CALENDAR_MIRROR_FUTURE_DAYS", "365"))) -> None:
+        """
+        Args:
+            service: Google Calendar 服务，默认使用进程内共享的服务
+            path: SQLite 文件路径，":memory:" 表示只保存在内存中
+            calendars: 需要镜像的日历 id
+            sync_interval: 后台增量同步的间隔(秒)，0 表示不启动后台同步
+            page_size: 同步时每页的日程数
+            past_days: 镜像保留过去多少天内的日程
+            future_days: 镜像保留未来多少天内的日程
+        """
+        self.logger = logging.getLogger("CalendarMirror")
+        self.service = service
+        self.calendars = [c.strip() for c in calendars if c.strip()]
+        self.sync_interval = sync_interval
+        self.page_size = page_size
+        self.past_days = past_days
+        self.future_days = future_days
+        self.full_syncs = 0
+        self.incremental_syncs = 0
+        self.queries = 0
+        self.sync_errors = 0
+        self.live_queries = 0
+        self._lock = threading.Lock()
+        self._sync_lock = threading.Lock()
+        self._conn = sqlite3.connect(path, check_same_thread=False, timeout=30)
+        self._conn.execute("PRAGMA journal_mode=WAL")
+        self._conn.execute(
+            "CREATE TABLE IF NOT EXISTS calendar_events ("
+            "rowid INTEGER PRIMARY KEY, calendar_id TEXT, event_id TEXT, "
+            "start_ts REAL, end_ts REAL, data TEXT, UNIQUE(calendar_id, event_id))"
+        )
+        self._conn.execute(
+            "CREATE VIRTUAL TABLE IF NOT EXISTS calendar_events_span USING rtree(id, start_ts, end_ts)"
+        )
+        # 按标题查找日程时使用
+        self._conn.execute(
+            "CREATE INDEX IF NOT EXISTS calendar_events_summary "
+            "ON calendar_events(calendar_id, json_extract(data, '$.summary'))"
+        )
+        self._conn.execute(
+            "CREATE TABLE IF NOT EXISTS calendar_sync ("
+            "calendar_id TEXT PRIMARY KEY, sync_token TEXT, synced_at REAL, window_min REAL, window_max REAL)"
+        )
+        columns = {row[1] for row in self._conn.execute("PRAGMA table_info(calendar_sync)")}
+        if "window_min" not in columns:
+            # 旧版本的镜像没有记录窗口，清掉同步令牌，下次同步时按窗口全量同步
+            self._conn.execute("DROP TABLE calendar_sync")
+            self._conn.execute(
+                "CREATE TABLE calendar_sync (calendar_id TEXT PRIMARY KEY, sync_token TEXT, synced_at REAL, "
+                "window_min REAL, window_max REAL)"
+            )
+        self._conn.commit()
+
+    def _calendar(self):
+        if self.service is None:
+            self.service = get_google_services().calendar
+        return self.service
+
+    def _sync_state(self, calendar_id: str) -> tuple:
+        """(同步令牌, 同步时间, 窗口开始, 窗口结束)，尚未同步时全部为 None"""
+        with self._lock:
+            row = self._conn.execute(
+                "SELECT sync_token, synced_at, window_min, window_max FROM calendar_sync WHERE calendar_id = ?",
+                (calendar_id,)
+            ).fetchone()
+        return row or (None, None, None, None)
+
+    def _upsert(self, calendar_id: str, event: dict) -> None:
+        """写入一条日程，调用方持有 self._lock"""
+        self._delete(calendar_id, event["id"])
+        start_ts, end_ts = event_bounds(event)
+        cursor = self._conn.execute(
+            "INSERT INTO calendar_events (calendar_id, event_id, start_ts, end_ts, data) VALUES (?, ?, ?, ?, ?)",
+            (calendar_id, event["id"], start_ts, end_ts, json.dumps(event, ensure_ascii=False)),
+        )
+        self._conn.execute(
+            "INSERT INTO calendar_events_span (id, start_ts, end_ts) VALUES (?, ?, ?)",
+            (cursor.lastrowid, start_ts, end_ts),
+        )
+
+    def _delete(self, calendar_id: str, event_id: str) -> None:
+        """删除一条日程，调用方持有 self._lock"""
+        row = self._conn.execute(
+            "SELECT rowid FROM calendar_events WHERE calendar_id = ? AND event_id = ?", (calendar_id, event_id)
+        ).fetchone()
+        if row:
+            self._conn.execute("DELETE FROM calendar_events WHERE rowid = ?", row)
+            self._conn.execute("DELETE FROM calendar_events_span WHERE id = ?", row)
+
+    def _clear(self, calendar_id: str) -> None:
+        """清空一个日历的镜像，调用方持有 self._lock"""
+        self._conn.execute(
+            "DELETE FROM calendar_events_span WHERE id IN "
+            "(SELECT rowid FROM calendar_events WHERE calendar_id = ?)", (calendar_id,)
+        )
+        self._conn.execute("DELETE FROM calendar_events WHERE calendar_id = ?", (calendar_id,))
+        self._conn.execute("DELETE FROM calendar_sync WHERE calendar_id = ?", (calendar_id,))
+
+    def _apply_page(self, calendar_id: str, items: List[dict]) -> None:
+        for event in items:
+            if event.get("status") == "cancelled":
+                self._delete(calendar_id, event["id"])
+            elif event.get("start"):
+                self._upsert(calendar_id, event)
+
+    def _sync_calendar(self, calendar_id: str) -> int:
+        """
+        同步一个日历
+        有同步令牌时只拉取变更；令牌失效时清空本地镜像并全量同步
+
+        Returns:
+            本次收到的日程(含已删除)数
+        """
+        sync_token, _, _, window_max = self._sync_state(calendar_id)
+        now = time.time()
+        if sync_token is not None and window_max is not None and self.future_days > 0 \
+                and window_max - now < self.future_days * 86400 / 2:
+            self.logger.info(f"日历 {calendar_id} 的镜像窗口需要向前滑动，重新全量同步")
+            sync_token = None
+        full = sync_token is None
+        params = {"calendarId": calendar_id, "singleEvents": True, "maxResults": self.page_size}
+        window = (None, None)
+        if full:
+            # 全量同步不会返回已删除的日程；只拉取窗口内的日程，重复日程不会无限展开
+            params["showDeleted"] = False
+            window = (now - self.past_days * 86400 if self.past_days > 0 else None,
+                      now + self.future_days * 86400 if self.future_days > 0 else None)
+            if window[0] is not None:
+                params["timeMin"] = _isoformat(window[0])
+            if window[1] is not None:
+                params["timeMax"] = _isoformat(window[1])
+        else:
+            # 增量同步不能带 timeMin/timeMax，窗口外日程的变更也会写入镜像，查询时仍以窗口为准
+            params["syncToken"] = sync_token
+
+        received = 0
+        page_token = None
+        pages = []
+        while True:
+            try:
+                result = self._calendar().events().list(pageToken=page_token, **params).execute()
+            except HttpError as e:
+                if not full and e.resp.status == 410:
+                    self.logger.info(f"日历 {calendar_id} 的同步令牌已失效，重新全量同步")
+                    with self._lock:
+                        self._clear(calendar_id)
+                        self._conn.commit()
+                    return self._sync_calendar(calendar_id)
+                raise
+            pages.append(result.get("items", []))
+            received += len(pages[-1])
+            page_token = result.get("nextPageToken")
+            if not page_token:
+                break
+
+        # 所有分页都取到后再一次性写入，中途失败时本地镜像和同步令牌保持一致
+        with self._lock:
+            if full:
+                self._clear(calendar_id)
+            for items in pages:
+                self._apply_page(calendar_id, items)
+            if full:
+                self._conn.execute(
+                    "INSERT OR REPLACE INTO calendar_sync (calendar_id, sync_token, synced_at, window_min, window_max) "
+                    "VALUES (?, ?, ?, ?, ?)",
+                    (calendar_id, result.get("nextSyncToken"), time.time(), *window),
+                )
+            else:
+                self._conn.execute(
+                    "UPDATE calendar_sync SET sync_token = ?, synced_at = ? WHERE calendar_id = ?",
+                    (result.get("nextSyncToken"), time.time(), calendar_id),
+                )
+            self._conn.commit()
+
+        if full:
+            self.full_syncs += 1
+            self.logger.info(f"日历 {calendar_id} 全量同步完成，共 {received} 个日程")
+        else:
+            self.incremental_syncs += 1
+            if received:
+                self.logger.info(f"日历 {calendar_id} 增量同步 {received} 个变更")
+        return received
+
+    def sync(self) -> int:
+        """同步所有镜像的日历，返回收到的日程(含已删除)数"""
+        with self._sync_lock:
+            return sum(self._sync_calendar(calendar_id) for calendar_id in self.calendars)
+
+    def _ensure_synced(self, calendar_id: str) -> bool:
+        """
+        镜像是否已可用
+        有后台同步时首次同步由后台线程完成，尚未完成时返回 False，调用方直接请求 API；
+        没有后台同步时在此同步一次
+        """
+        if self._sync_state(calendar_id)[1] is not None:
+            return True
+        if self.sync_interval > 0:
+            return False
+        with self._sync_lock:
+            if self._sync_state(calendar_id)[1] is None:
+                self._sync_calendar(calendar_id)
+        return True
+
+    def _covers(self, calendar_id: str, min_ts: Optional[float], max_ts: Optional[float]) -> bool:
+        """查询范围是否在镜像窗口内；不指定的一端按窗口的边界处理"""
+        _, synced_at, window_min, window_max = self._sync_state(calendar_id)
+        if synced_at is None:
+            return False
+        if min_ts is not None and window_min is not None and min_ts < window_min:
+            return False
+        if max_ts is not None and window_max is not None and max_ts > window_max:
+            return False
+        return True
+
+    def _window(self, calendar_id: str) -> tuple:
+        """镜像窗口 (开始, 结束) 的时间戳；尚未同步时按当前时间推算，不限制的一端为 None"""
+        _, synced_at, window_min, window_max = self._sync_state(calendar_id)
+        if synced_at is not None:
+            return window_min, window_max
+        now = time.time()
+        return (now - self.past_days * 86400 if self.past_days > 0 else None,
+                now + self.future_days * 86400 if self.future_days > 0 else None)
+
+    def _list_live(self, calendar_id: str, time_min: Optional[str] = None, time_max: Optional[str] = None,
+                   q: Optional[str] = None) -> List[dict]:
+        """直接通过 API 查询日程；不指定的一端限制在镜像窗口内，避免展开整个日历的重复日程"""
+        params = {"calendarId": calendar_id, "singleEvents": True, "orderBy": "startTime",
+                  "maxResults": self.page_size}
+        window_min, window_max = self._window(calendar_id)
+        min_ts = parse_time(time_min) if time_min else window_min
+        max_ts = parse_time(time_max) if time_max else window_max
+        if min_ts is not None:
+            params["timeMin"] = _isoformat(min_ts)
+        if max_ts is not None:
+            params["timeMax"] = _isoformat(max_ts)
+        if q:
+            params["q"] = q
+        items = []
+        page_token = None
+        while True:
+            result = self._calendar().events().list(pageToken=page_token, **params).execute()
+            items.extend(result.get("items", []))
+            page_token = result.get("nextPageToken")
+            if not page_token:
+                break
+        self.live_queries += 1
+        return items
+
+    def query(self, time_min: Optional[str] = None, time_max: Optional[str] = None,
+              calendar_id: str = "primary") -> dict:
+        """
+        查询与 [time_min, time_max) 有交集的日程，语义与 events().list 的 timeMin/timeMax 相同
+
+        Returns:
+            与 events().list 返回结构一致的字典，items 按开始时间排序
+            不指定 time_min/time_max 时只返回镜像窗口内的日程，直接请求 API 时也是如此
+        """
+        min_ts = parse_time(time_min)
+        max_ts = parse_time(time_max)
+        if not self._ensure_synced(calendar_id) or not self._covers(calendar_id, min_ts, max_ts):
+            return {"kind": "calendar#events", "items": self._list_live(calendar_id, time_min, time_max)}
+
+        # R*Tree 以单精度保存区间(只会向外取整)，先用它筛出候选，再按精确的时间戳过滤
+        sql = ("SELECT e.data FROM calendar_events_span s JOIN calendar_events e ON e.rowid = s.id "
+               "WHERE e.calendar_id = ?")
+        args: list = [calendar_id]
+        if min_ts is not None:
+            sql += " AND s.end_ts >= ? AND (e.end_ts > ? OR (e.start_ts = e.end_ts AND e.start_ts >= ?))"
+            args += [min_ts, min_ts, min_ts]
+        if max_ts is not None:
+            sql += " AND s.start_ts <= ? AND e.start_ts < ?"
+            args += [max_ts, max_ts]
+        sql += " ORDER BY e.start_ts"
+
+        with self._lock:
+            rows = self._conn.execute(sql, args).fetchall()
+        self.queries += 1
+        return {"kind": "calendar#events", "items": [json.loads(row[0]) for row in rows]}
+
+    def get(self, event_id: str, calendar_id: str = "primary") -> Optional[dict]:
+        """按 id 获取日程；镜像中没有(尚未同步或在窗口外)时请求 API"""
+        if self._ensure_synced(calendar_id):
+            with self._lock:
+                row = self._conn.execute(
+                    "SELECT data FROM calendar_events WHERE calendar_id = ? AND event_id = ?", (calendar_id, event_id)
+                ).fetchone()
+            if row:
+                return json.loads(row[0])
+        try:
+            event = self._calendar().events().get(calendarId=calendar_id, eventId=event_id).execute()
+        except HttpError as e:
+            if e.resp.status in (404, 410):
+                return None
+            raise
+        self.live_queries += 1
+        return None if event.get("status") == "cancelled" else event
+
+    def find(self, summary: str, calendar_id: str = "primary") -> List[dict]:
+        """按标题精确查找镜像窗口内的日程，按开始时间排序"""
+        if not self._ensure_synced(calendar_id):
+            return [event for event in self._list_live(calendar_id, q=summary) if event.get("summary") == summary]
+        with self._lock:
+            rows = self._conn.execute(
+                "SELECT data FROM calendar_events WHERE calendar_id = ? AND json_extract(data, '$.summary') = ? "
+                "ORDER BY start_ts", (calendar_id, summary)
+            ).fetchall()
+        return [json.loads(row[0]) for row in rows]
+
+    def apply(self, event: dict, calendar_id: str = "primary") -> None:
+        """把本进程创建或修改后的日程(API 返回值)写入镜像，无需等待下一次同步"""
+        with self._lock:
+            self._apply_page(calendar_id, [event])
+            self._conn.commit()
+
+    def remove(self, event_id: str, calendar_id: str = "primary") -> None:
+        """从镜像中删除本进程已删除的日程"""
+        with self._lock:
+            self._delete(calendar_id, event_id)
+            self._conn.commit()
+
+    def start(self) -> None:
+        """启动后台增量同步线程"""
+        if self.sync_interval > 0:
+            threading.Thread(target=self._sync_loop, name="calendar-mirror-sync", daemon=True).start()
+
+    def _sync_loop(self) -> None:
+        while True:
+            try:
+                self.sync()
+            except Exception as e:
+                self.sync_errors += 1
+                self.logger.error(f"同步日历失败: {e}")
+            time.sleep(self.sync_interval)
+
+    def stats(self) -> dict:
+        with self._lock:
+            events = self._conn.execute("SELECT COUNT(*) FROM calendar_events").fetchone()[0]
+            synced_at = self._conn.execute("SELECT MIN(synced_at) FROM calendar_sync").fetchone()[0]
+        return {
+            "events": events,
+            "queries": self.queries,
+            "full_syncs": self.full_syncs,
+            "incremental_syncs": self.incremental_syncs,
+            "sync_errors": self.sync_errors,
+            "live_queries": self.live_queries,
+            "staleness_s": round(time.time() - synced_at, 1) if synced_at else None,
+        }
+
+
+def _isoformat(timestamp: float) -> str:
+    return datetime.fromtimestamp(timestamp, timezone.utc).strftime("%Y-%m-%dT%H:%M:%SZ")
+
+
+_mirror: Optional[CalendarMirror] = None
+_mirror_lock = threading.Lock()
+
+
+def get_calendar_mirror() -> CalendarMirror:
+    """获取进程内共享的日历镜像，首次调用时启动后台同步；服务启动时调用一次即可在后台预热"""
+    global _mirror
+    with _mirror_lock:
+        if _mirror is None:
+            _mirror = CalendarMirror()
+            _mirror.start()
+        return _mirror
+
+
+def calendar_mirror_stats() -> Optional[dict]:
+    """日历镜像的统计信息，尚未使用过日历工具时返回 None"""
+    return _mirror.stats() if _mirror is not None else None
@@ -0,0 +1,330 @@
+import json
+import logging
+import os
+import queue
+import threading
+import uuid
+from typing import Callable, List, Optional, Sequence
+
+from langchain_community.chat_message_histories import RedisChatMessageHistory
+import redis
+from langchain_core.messages import BaseMessage, SystemMessage, message_to_dict, messages_from_dict
+
+from .RedisPool import get_async_redis, get_redis, redis_metrics
+from .Tokens import count_tokens, message_tokens
+
+
+class SummarizedRedisHistory(RedisChatMessageHistory):
+    """
+    带滚动摘要和 token 预算的 Redis 对话记录
+    原始消息全部保留在 Redis 列表中，最早的消息由后台线程折叠进单独存储的摘要，
+    读取时返回 摘要 + 在 token 预算内的最近未折叠消息
+    每条消息的 token 数在写入时计算一次，存放在与消息列表下标对齐的列表中
+    所有实例共享进程级连接池，每轮的读取和追加各只有一次流水线往返
+    """
+
+    def __init__(self, session_id: str, url: str,
+                 max_recent: int = int(os.getenv("MEMORY_MAX_RECENT", "40")),
+                 max_token_limit: int = int(os.getenv("MEMORY_TOKEN_BUDGET", "1000")),
+                 summary_prefix: str = "summary_store:",
+                 token_prefix: str = "token_store:",
+                 key_prefix: str = "message_store:",
+                 ttl: Optional[int] = None) -> None:
+        """
+        Args:
+            session_id: 会话ID
+            url: Redis 地址
+            max_recent: 最多返回的未折叠消息数，后台摘要落后时用于限制上下文长度
+            max_token_limit: 摘要和最近消息合计的 token 预算
+            summary_prefix: 摘要相关键的前缀
+            token_prefix: 消息 token 数列表键的前缀
+            key_prefix: 消息列表键的前缀
+            ttl: 键的过期时间(秒)
+        """
+        # 不调用父类构造函数，避免每个实例单独建立连接
+        self.url = url
+        self.redis_client = get_redis(url)
+        self.session_id = session_id
+        self.key_prefix = key_prefix
+        self.ttl = ttl
+        self.max_recent = max_recent
+        self.max_token_limit = max_token_limit
+        self.summary_prefix = summary_prefix
+        self.token_prefix = token_prefix
+
+    @property
+    def summary_key(self) -> str:
+        """滚动摘要的键"""
+        return self.summary_prefix + self.session_id
+
+    @property
+    def folded_key(self) -> str:
+        """已折叠进摘要的最早消息条数"""
+        return self.summary_prefix + self.session_id + ":folded"
+
+    @property
+    def fold_lock_key(self) -> str:
+        """折叠锁，保证同一会话同时只有一个进程在折叠"""
+        return self.summary_prefix + self.session_id + ":lock"
+
+    @property
+    def summary_tokens_key(self) -> str:
+        """摘要的 token 数"""
+        return self.summary_prefix + self.session_id + ":tokens"
+
+    @property
+    def token_key(self) -> str:
+        """每条消息的 token 数，与消息列表同样按时间倒序存放"""
+        return self.token_prefix + self.session_id
+
+    def unfolded_count(self) -> int:
+        """尚未折叠进摘要的消息数"""
+        total = self.redis_client.llen(self.key)
+        return total - int(self.redis_client.get(self.folded_key) or 0)
+
+    def _queue_read(self, pipe) -> None:
+        """在流水线中加入一轮读取所需的全部命令"""
+        pipe.get(self.summary_key)
+        pipe.get(self.summary_tokens_key)
+        pipe.get(self.folded_key)
+        pipe.llen(self.key)
+        pipe.lrange(self.token_key, 0, self.max_recent - 1)
+        pipe.lrange(self.key, 0, self.max_recent - 1)
+
+    def _build_messages(self, results: Sequence) -> List[BaseMessage]:
+        """根据流水线读取结果，返回 摘要 + token 预算内的最近未折叠消息，摘要始终保留"""
+        summary, summary_tokens, folded, total, counts, items = results
+        # 列表按时间倒序存放(LPUSH)，下标 0 为最新消息
+        visible = min(total - int(folded or 0), self.max_recent)
+        items = items[:visible]
+        counts = [int(c) for c in counts[:visible]]
+
+        if summary:
+            summary = summary.decode("utf-8")
+            summary_tokens = int(summary_tokens) if summary_tokens else count_tokens(summary)
+        else:
+            summary_tokens = 0
+
+        messages = messages_from_dict([json.loads(m.decode("utf-8")) for m in items])
+        if len(counts) < len(messages):
+            # 早期写入的消息没有记录 token 数，补算一次并回填，之后不再重复计算
+            counts = self._backfill_counts(counts, messages)
+
+        # 从最新消息开始累加，直到超出预算；至少保留最新的一条
+        budget = self.max_token_limit - summary_tokens
+        kept = 0
+        used = 0
+        for count in counts:
+            if kept and used + count > budget:
+                break
+            used += count
+            kept += 1
+
+        messages = messages[:kept][::-1]
+        if summary:
+            messages.insert(0, SystemMessage(content=f"以下是你和用户之前对话的摘要：{summary}"))
+        return messages
+
+    @property
+    def messages(self) -> List[BaseMessage]:
+        """一次流水线往返读取摘要、token 数和最近消息"""
+        with redis_metrics.timed("history_read"):
+            pipe = self.redis_client.pipeline(transaction=False)
+            self._queue_read(pipe)
+            results = pipe.execute()
+        return self._build_messages(results)
+
+    @messages.setter
+    def messages(self, messages: List[BaseMessage]) -> None:
+        raise NotImplementedError("Direct assignment to 'messages' is not allowed.")
+
+    async def aget_messages(self) -> List[BaseMessage]:
+        """messages 的异步版本"""
+        with redis_metrics.timed("history_read_async"):
+            pipe = get_async_redis(self.url).pipeline(transaction=False)
+            self._queue_read(pipe)
+            results = await pipe.execute()
+        return self._build_messages(results)
+
+    def _backfill_counts(self, counts: List[int], messages: List[BaseMessage]) -> List[int]:
+        """计算缺失的消息 token 数并追加到 token 列表尾部，保持与消息列表下标对齐"""
+        missing = [message_tokens(message) for message in messages[len(counts):]]
+        with redis_metrics.timed("token_backfill"):
+            if self.redis_client.llen(self.token_key) == len(counts):
+                self.redis_client.rpush(self.token_key, *missing)
+            # 否则读取期间有并发写入，本次不回填，下次读取时再补
+        return counts + missing
+
+    def _queue_append(self, pipe, messages: Sequence[BaseMessage]) -> None:
+        """在流水线中加入追加消息及其 token 数的命令"""
+        for message in messages:
+            pipe.lpush(self.key, json.dumps(message_to_dict(message)))
+            pipe.lpush(self.token_key, message_tokens(message))
+        if self.ttl:
+            pipe.expire(self.key, self.ttl)
+            pipe.expire(self.token_key, self.ttl)
+
+    def add_message(self, message: BaseMessage) -> None:
+        """追加消息，同时记录该消息的 token 数"""
+        self.add_messages([message])
+
+    def add_messages(self, messages: Sequence[BaseMessage]) -> None:
+        """一轮对话的所有消息在一次流水线往返中追加"""
+        with redis_metrics.timed("history_append"):
+            pipe = self.redis_client.pipeline(transaction=True)
+            self._queue_append(pipe, messages)
+            pipe.execute()
+
+    async def aadd_messages(self, messages: Sequence[BaseMessage]) -> None:
+        """add_messages 的异步版本"""
+        with redis_metrics.timed("history_append_async"):
+            pipe = get_async_redis(self.url).pipeline(transaction=True)
+            self._queue_append(pipe, messages)
+            await pipe.execute()
+
+    def oldest_unfolded(self, count: int) -> List[BaseMessage]:
+        """按时间顺序返回最早的 count 条未折叠消息"""
+        folded = int(self.redis_client.get(self.folded_key) or 0)
+        # 列表尾部是最早的消息，新消息从头部插入，不影响尾部下标
+        _items = self.redis_client.lrange(self.key, -(folded + count), -(folded + 1))
+        return messages_from_dict([json.loads(m.decode("utf-8")) for m in _items[::-1]])
+
+    def acquire_fold_lock(self, ttl_ms: int) -> Optional[str]:
+        """获取折叠锁(SET NX PX)，成功时返回释放锁用的令牌，已被其他进程持有时返回 None"""
+        token = uuid.uuid4().hex
+        return token if self.redis_client.set(self.fold_lock_key, token, nx=True, px=ttl_ms) else None
+
+    def release_fold_lock(self, token: str) -> None:
+        """释放折叠锁，锁已过期并被其他进程获取时不删除"""
+        with self.redis_client.pipeline() as pipe:
+            try:
+                pipe.watch(self.fold_lock_key)
+                if pipe.get(self.fold_lock_key) != token.encode("utf-8"):
+                    return
+                pipe.multi()
+                pipe.delete(self.fold_lock_key)
+                pipe.execute()
+            except redis.WatchError:
+                pass
+
+    def fold(self, summary: str, count: int, lock_token: Optional[str] = None, lock_ttl_ms: int = 0) -> bool:
+        """
+        保存新的摘要，并将 count 条消息标记为已折叠
+        传入 lock_token 时只在仍持有折叠锁的情况下写入，并同时延长锁的有效期
+
+        Returns:
+            是否已写入，锁已丢失时为 False
+        """
+        with self.redis_client.pipeline() as pipe:
+            try:
+                if lock_token:
+                    pipe.watch(self.fold_lock_key)
+                    if pipe.get(self.fold_lock_key) != lock_token.encode("utf-8"):
+                        return False
+                    pipe.multi()
+                    pipe.pexpire(self.fold_lock_key, lock_ttl_ms)
+                pipe.set(self.summary_key, summary)
+                pipe.set(self.summary_tokens_key, count_tokens(summary))
+                pipe.incrby(self.folded_key, count)
+                if self.ttl:
+                    pipe.expire(self.summary_key, self.ttl)
+                    pipe.expire(self.summary_tokens_key, self.ttl)
+                    pipe.expire(self.folded_key, self.ttl)
+                pipe.execute()
+            except redis.WatchError:
+                return False
+        return True
+
+    def get_summary(self) -> str:
+        summary = self.redis_client.get(self.summary_key)
+        return summary.decode("utf-8") if summary else ""
+
+    def clear(self) -> None:
+        """清空对话记录和摘要"""
+        self.redis_client.delete(self.key, self.token_key, self.summary_key,
+                                 self.summary_tokens_key, self.folded_key)
+
+
+class BackgroundSummarizer:
+    """
+    后台增量摘要线程
+    会话中未折叠的消息超过 window + batch 条时，把最早的 batch 条与已有摘要合并成新摘要，
+    最近 window 条消息保持原文，整个过程不阻塞用户请求
+    多个进程共用同一个 Redis 时，每个会话的折叠由 Redis 中的锁(SET NX PX)互斥，拿不到锁的进程直接跳过
+    """
+
+    def __init__(self,
+                 summarize: Callable[[str, List[BaseMessage]], Optional[str]],
+                 history_factory: Callable[[str], SummarizedRedisHistory],
+                 window: int = int(os.getenv("MEMORY_RECENT_WINDOW", "20")),
+                 batch: int = int(os.getenv("MEMORY_FOLD_BATCH", "20")),
+                 lock_ttl: float = float(os.getenv("MEMORY_FOLD_LOCK_TTL", "120"))) -> None:
+        """
+        Args:
+            summarize: 摘要函数，参数为 (已有摘要, 待折叠消息)，返回新摘要
+            history_factory: 根据会话ID创建对话记录对象
+            window: 保持原文的最近消息数
+            batch: 每次折叠进摘要的消息数
+            lock_ttl: 折叠锁的有效期(秒)，应大于一次摘要调用的耗时，每折叠一批后续期
+        """
+        self.logger = logging.getLogger("BackgroundSummarizer")
+        self.summarize = summarize
+        self.history_factory = history_factory
+        self.window = window
+        self.batch = batch
+        self.lock_ttl_ms = int(lock_ttl * 1000)
+        self._queue: "queue.Queue[str]" = queue.Queue()
+        self._pending = set()
+        self._lock = threading.Lock()
+        threading.Thread(target=self._worker, name="memory-summarizer", daemon=True).start()
+
+    def schedule(self, session_id: str) -> None:
+        """请求检查会话是否需要折叠，同一会话排队中时不重复入队"""
+        with self._lock:
+            if session_id in self._pending:
+                return
+            self._pending.add(session_id)
+        self._queue.put(session_id)
+
+    def _worker(self) -> None:
+        while True:
+            session_id = self._queue.get()
+            with self._lock:
+                self._pending.discard(session_id)
+            try:
+                self.fold_session(session_id)
+            except Exception as e:
+                self.logger.error(f"会话 {session_id} 摘要失败: {e}")
+
+    def fold_session(self, session_id: str) -> int:
+        """
+        折叠会话中最早的消息，直到未折叠消息不超过 window + batch 条
+        其他进程正在折叠同一会话时直接返回，由持有锁的进程完成
+
+        Returns:
+            本次折叠的消息数
+        """
+        history = self.history_factory(session_id)
+        if history.unfolded_count() <= self.window + self.batch:
+            return 0
+        token = history.acquire_fold_lock(self.lock_ttl_ms)
+        if token is None:
+            self.logger.info(f"会话 {session_id} 正由其他进程折叠，跳过")
+            return 0
+        folded = 0
+        try:
+            # 拿到锁后重新读取未折叠条数，其他进程可能刚折叠完
+            while history.unfolded_count() > self.window + self.batch:
+                messages = history.oldest_unfolded(self.batch)
+                summary = self.summarize(history.get_summary(), messages)
+                if not summary:
+                    break
+                if not history.fold(summary, len(messages), token, self.lock_ttl_ms):
+                    self.logger.warning(f"会话 {session_id} 的折叠锁已过期，放弃本次摘要")
+                    break
+                folded += len(messages)
+        finally:
+            history.release_fold_lock(token)
+        if folded:
+            self.logger.info(f"会话 {session_id} 已将 {folded} 条消息折叠进摘要")
+        return folded
@@ -0,0 +1,227 @@
+import logging
+import os
+import threading
+from typing import Optional
+
+from qdrant_client import QdrantClient
+from qdrant_client.http import models as rest
+from qdrant_client.local.qdrant_local import QdrantLocal
+
+# 常用嵌入模型的向量维度，按去掉厂商前缀后的小写模型名查找
+EMBEDDING_DIMENSIONS = {
+    "text-embedding-3-small": 1536,
+    "text-embedding-3-large": 3072,
+    "text-embedding-ada-002": 1536,
+    "bge-m3": 1024,
+    "bge-large-zh-v1.5": 1024,
+    "bge-large-en-v1.5": 1024,
+    "bge-base-zh-v1.5": 768,
+    "bge-small-zh-v1.5": 512,
+}
+
+# 集合配置档位
+#   default : 原有配置，向量和 payload 常驻内存
+#   scalar  : int8 标量量化常驻内存，原始向量和 payload 放磁盘，内存约为 1/4，检索时用原始向量重排
+#   binary  : 二值量化常驻内存，原始向量和 payload 放磁盘，内存约为 1/32，需要更大的过采样弥补召回
+#   accuracy: 加大 HNSW 图的连接数和搜索宽度，内存和延迟换召回
+PROFILES = {
+    "default": {
+        "on_disk": False,
+        "on_disk_payload": False,
+        "quantization": None,
+        "m": 16,
+        "ef_construct": 128,
+        "hnsw_ef": None,
+        "oversampling": None,
+    },
+    "scalar": {
+        "on_disk": True,
+        "on_disk_payload": True,
+        "quantization": "scalar",
+        "m": 16,
+        "ef_construct": 128,
+        "hnsw_ef": None,
+        "oversampling": 2.0,
+    },
+    "binary": {
+        "on_disk": True,
+        "on_disk_payload": True,
+        "quantization": "binary",
+        "m": 16,
+        "ef_construct": 128,
+        "hnsw_ef": None,
+        "oversampling": 3.0,
+    },
+    "accuracy": {
+        "on_disk": False,
+        "on_disk_payload": False,
+        "quantization": None,
+        "m": 32,
+        "ef_construct": 256,
+        "hnsw_ef": 256,
+        "oversampling": None,
+    },
+}
+
+
+def embedding_dimension(embedding_model: str, embeddings=None) -> int:
+    """
+    获取嵌入模型的向量维度
+    依次使用环境变量 EMBEDDING_DIMENSION、已知模型表、实际调用一次嵌入接口
+    """
+    if os.getenv("EMBEDDING_DIMENSION"):
+        return int(os.getenv("EMBEDDING_DIMENSION"))
+    name = embedding_model.split("/")[-1].lower()
+    if name in EMBEDDING_DIMENSIONS:
+        return EMBEDDING_DIMENSIONS[name]
+    if embeddings is not None:
+        return len(embeddings.embed_query("dimension probe"))
+    raise ValueError(f"Unknown embedding dimension for model {embedding_model}, set EMBEDDING_DIMENSION")
+
+
+class CollectionManager:
+    """
+    统一管理 Qdrant 集合的创建和配置
+    维度由嵌入模型决定，量化、磁盘存储和 HNSW 参数来自配置档位，已有集合可原地迁移到新档位
+    嵌入式 Qdrant 只记录这些配置、始终精确检索，量化和 HNSW 参数在 Qdrant 服务端才生效，
+    需设置 QDRANT_URL 让检索服务和文档服务连接 Qdrant 服务(见 Retriever.get_qdrant_client)
+    """
+
+    def __init__(self, client: QdrantClient, collection_name: str,
+                 embedding_model: str = os.getenv("EMBEDDING_MODEL", "text-embedding-3-small"),
+                 profile: str = os.getenv("COLLECTION_PROFILE", "default"),
+                 embeddings=None,
+                 lock: Optional[threading.RLock] = None) -> None:
+        """
+        Args:
+            client: Qdrant 客户端
+            collection_name: 集合名称
+            embedding_model: 嵌入模型名称，用于确定向量维度
+            profile: PROFILES 中的配置档位
+            embeddings: 嵌入模型实例，模型不在已知表中时用于探测维度
+            lock: 客户端访问锁，嵌入式 Qdrant 需要与其他使用者共用
+        """
+        if profile not in PROFILES:
+            raise ValueError(f"Unknown collection profile: {profile}")
+        self.logger = logging.getLogger("CollectionManager")
+        self.client = client
+        self.collection_name = collection_name
+        self.embedding_model = embedding_model
+        self.profile_name = profile
+        self.profile = PROFILES[profile]
+        self.embeddings = embeddings
+        self.lock = lock or threading.RLock()
+        self._dimension: Optional[int] = None
+
+    @property
+    def dimension(self) -> int:
+        if self._dimension is None:
+            self._dimension = embedding_dimension(self.embedding_model, self.embeddings)
+        return self._dimension
+
+    def hnsw_config(self) -> rest.HnswConfigDiff:
+        return rest.HnswConfigDiff(m=self.profile["m"], ef_construct=self.profile["ef_construct"])
+
+    def quantization_config(self) -> Optional[rest.QuantizationConfig]:
+        if self.profile["quantization"] == "scalar":
+            return rest.ScalarQuantization(
+                scalar=rest.ScalarQuantizationConfig(type=rest.ScalarType.INT8, quantile=0.99, always_ram=True)
+            )
+        if self.profile["quantization"] == "binary":
+            return rest.BinaryQuantization(binary=rest.BinaryQuantizationConfig(always_ram=True))
+        return None
+
+    def search_params(self) -> Optional[rest.SearchParams]:
+        """检索参数：量化档位需要过采样并用原始向量重排"""
+        if self.profile["quantization"] is None and self.profile["hnsw_ef"] is None:
+            return None
+        quantization = None
+        if self.profile["quantization"] is not None:
+            quantization = rest.QuantizationSearchParams(rescore=True, oversampling=self.profile["oversampling"])
+        return rest.SearchParams(hnsw_ef=self.profile["hnsw_ef"], quantization=quantization)
+
+    @property
+    def embedded(self) -> bool:
+        """是否为嵌入式(本地目录或内存) Qdrant"""
+        return isinstance(getattr(self.client, "_client", None), QdrantLocal)
+
+    def exists(self) -> bool:
+        with self.lock:
+            return any(c.name == self.collection_name for c in self.client.get_collections().collections)
+
+    def create(self) -> None:
+        with self.lock:
+            self.client.create_collection(
+                collection_name=self.collection_name,
+                vectors_config=rest.VectorParams(
+                    size=self.dimension,
+                    distance=rest.Distance.COSINE,
+                    on_disk=self.profile["on_disk"],
+                ),
+                on_disk_payload=self.profile["on_disk_payload"],
+                hnsw_config=self.hnsw_config(),
+                quantization_config=self.quantization_config(),
+                optimizers_config=rest.OptimizersConfigDiff(
+                    indexing_threshold=10000,  # 优化索引阈值
+                ),
+            )
+        self.logger.info(f"创建集合 {self.collection_name}，维度 {self.dimension}，配置档位 {self.profile_name}")
+
+    def recreate(self) -> None:
+        """删除并重新创建集合"""
+        with self.lock:
+            if self.exists():
+                self.client.delete_collection(self.collection_name)
+            self.create()
+
+    def ensure(self) -> None:
+        """集合不存在则创建；已存在时校验维度，配置与档位不一致则原地迁移"""
+        if not self.exists():
+            self.create()
+            return
+        self.logger.info(f"使用已有集合: {self.collection_name}")
+        with self.lock:
+            info = self.client.get_collection(self.collection_name)
+        vectors = info.config.params.vectors
+        if not isinstance(vectors, rest.VectorParams):
+            raise ValueError(f"Collection {self.collection_name} uses named vectors, which are not supported")
+        if vectors.size != self.dimension:
+            raise ValueError(
+                f"Collection {self.collection_name} has {vectors.size}-dim vectors but model "
+                f"{self.embedding_model} produces {self.dimension}; recreate the collection or change the model"
+            )
+        if self.embedded:
+            # 嵌入式 Qdrant 不支持修改集合配置，也不使用这些配置
+            return
+        if self.needs_migration(info):
+            self.migrate()
+
+    def needs_migration(self, info: rest.CollectionInfo) -> bool:
+        """比较集合当前配置与档位配置"""
+        params = info.config.params
+        hnsw = info.config.hnsw_config
+        quantization = info.config.quantization_config
+        current_quantization = None
+        if isinstance(quantization, rest.ScalarQuantization):
+            current_quantization = "scalar"
+        elif isinstance(quantization, rest.BinaryQuantization):
+            current_quantization = "binary"
+        return (
+            bool(params.vectors.on_disk) != self.profile["on_disk"]
+            or bool(params.on_disk_payload) != self.profile["on_disk_payload"]
+            or current_quantization != self.profile["quantization"]
+            or (hnsw is not None and (hnsw.m, hnsw.ef_construct) != (self.profile["m"], self.profile["ef_construct"]))
+        )
+
+    def migrate(self) -> None:
+        """原地更新集合配置，Qdrant 服务端会在后台按新配置重建索引和量化数据，期间可正常读写"""
+        quantization = self.quantization_config() or rest.Disabled.DISABLED
+        with self.lock:
+            self.client.update_collection(
+                collection_name=self.collection_name,
+                vectors_config={"": rest.VectorParamsDiff(on_disk=self.profile["on_disk"])},
+                collection_params=rest.CollectionParamsDiff(on_disk_payload=self.profile["on_disk_payload"]),
+                hnsw_config=self.hnsw_config(),
+                quantization_config=quantization,
+            )
+        self.logger.info(f"集合 {self.collection_name} 已迁移到配置档位 {self.profile_name}")
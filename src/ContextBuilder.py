@@ -0,0 +1,149 @@
+import logging
+import os
+import re
+from typing import List, Optional, Tuple
+
+from langchain_core.documents import Document
+
+from .LexicalIndex import tokenize
+from .Tokens import count_tokens
+
+# 按中英文句末标点和换行切句
+_SENTENCE_SPLIT = re.compile(r"(?<=[。！？!?；;])|\n+|(?<=\.)\s+")
+_SPACES = re.compile(r"\s+")
+
+
+def split_sentences(text: str) -> List[str]:
+    return [s.strip() for s in _SENTENCE_SPLIT.split(text) if s and s.strip()]
+
+
+def _shingles(text: str, size: int = 3) -> set:
+    """去掉空白后的字符 n-gram 集合，用于估计两段文本的重合度"""
+    text = _SPACES.sub("", text.lower())
+    if len(text) <= size:
+        return {text}
+    return {text[i:i + size] for i in range(len(text) - size + 1)}
+
+
+def _jaccard(a: set, b: set) -> float:
+    if not a or not b:
+        return 0.0
+    return len(a & b) / len(a | b)
+
+
+class ContextBuilder:
+    """
+    RAG 上下文组装
+    去除近似重复的分片，按 MMR 在相关性和多样性之间挑选分片，
+    再按 token 预算打包：跳过已出现的句子，超出预算时先删去与问题最不相关的句子
+    """
+
+    def __init__(self,
+                 token_budget: int = int(os.getenv("RAG_CONTEXT_TOKEN_BUDGET", "1500")),
+                 max_docs: int = int(os.getenv("RETRIEVER_TOP_K", "3")),
+                 dedup_threshold: float = float(os.getenv("RAG_DEDUP_THRESHOLD", "0.85")),
+                 mmr_lambda: float = float(os.getenv("RAG_MMR_LAMBDA", "0.7"))) -> None:
+        """
+        Args:
+            token_budget: 上下文 token 上限
+            max_docs: 最多使用的分片数
+            dedup_threshold: 两个分片字符 n-gram 重合度超过该值视为重复
+            mmr_lambda: MMR 中相关性的权重，越小越偏向多样性
+        """
+        self.logger = logging.getLogger("ContextBuilder")
+        self.token_budget = token_budget
+        self.max_docs = max_docs
+        self.dedup_threshold = dedup_threshold
+        self.mmr_lambda = mmr_lambda
+
+    def select(self, docs: List[Document]) -> List[Document]:
+        """
+        去重并按 MMR 挑选分片
+
+        Args:
+            docs: 按相关性从高到低排列的候选分片
+        """
+        shingles = [_shingles(doc.page_content) for doc in docs]
+        # 排名越靠前相关性越高
+        relevance = [1.0 - i / len(docs) for i in range(len(docs))]
+
+        candidates = []
+        for i in range(len(docs)):
+            if any(_jaccard(shingles[i], shingles[j]) >= self.dedup_threshold for j in candidates):
+                continue
+            candidates.append(i)
+
+        selected: List[int] = []
+        while candidates and len(selected) < self.max_docs:
+            def mmr(i: int) -> float:
+                redundancy = max((_jaccard(shingles[i], shingles[j]) for j in selected), default=0.0)
+                return self.mmr_lambda * relevance[i] - (1 - self.mmr_lambda) * redundancy
+            best = max(candidates, key=mmr)
+            selected.append(best)
+            candidates.remove(best)
+        return [docs[i] for i in selected]
+
+    def pack(self, query: str, docs: List[Document], token_budget: Optional[int] = None) -> str:
+        """按 token 预算打包分片，保留句子在原文中的顺序"""
+        token_budget = token_budget or self.token_budget
+        query_terms = set(tokenize(query))
+        sentences = []
+        seen = set()
+        for rank, doc in enumerate(docs):
+            for position, sentence in enumerate(split_sentences(doc.page_content)):
+                key = _SPACES.sub("", sentence)
+                # 分片重叠部分和重复页面中已出现过的句子只保留一次
+                if key in seen:
+                    continue
+                seen.add(key)
+                terms = set(tokenize(sentence))
+                overlap = len(query_terms & terms) / len(query_terms) if query_terms else 0.0
+                sentences.append({
+                    "rank": rank,
+                    "position": position,
+                    "text": sentence,
+                    "tokens": count_tokens(sentence),
+                    "relevance": overlap,
+                })
+
+        total = sum(s["tokens"] for s in sentences)
+        if total > token_budget:
+            # 先删相关性最低的句子，相关性相同时先删排名靠后分片中的句子
+            for sentence in sorted(sentences, key=lambda s: (s["relevance"], -s["rank"], -s["position"])):
+                if total <= token_budget:
+                    break
+                sentence["dropped"] = True
+                total -= sentence["tokens"]
+
+        parts = []
+        for rank in range(len(docs)):
+            kept = [s["text"] for s in sentences if s["rank"] == rank and not s.get("dropped")]
+            if kept:
+                parts.append("\n".join(kept))
+        return "\n\n".join(parts)
+
+    def build(self, query: str, docs: List[Document],
+              token_budget: Optional[int] = None) -> Tuple[str, List[Document]]:
+        """
+        组装上下文
+
+        Args:
+            query: 用户问题
+            docs: 按相关性从高到低排列的候选分片
+            token_budget: 本次使用的 token 预算，None 时使用 self.token_budget
+
+        Returns:
+            (上下文, 实际使用的分片)
+        """
+        if not docs:
+            return "", []
+        selected = self.select(docs)
+        context = self.pack(query, selected, token_budget)
+
+        raw_tokens = count_tokens("\n\n".join(doc.page_content for doc in docs[:self.max_docs]))
+        context_tokens = count_tokens(context)
+        self.logger.info(
+            f"上下文 {context_tokens} tokens，原始拼接 {raw_tokens} tokens，节省 {raw_tokens - context_tokens} tokens"
+            f"（候选 {len(docs)} 个分片，使用 {len(selected)} 个）"
+        )
+        return context, selected
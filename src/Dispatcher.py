@@ -0,0 +1,122 @@
+import logging
+import os
+import threading
+import time
+from collections import deque
+from concurrent.futures import Future, ThreadPoolExecutor
+from typing import Callable, Deque, Dict, Tuple
+
+
+class DispatcherBusyError(RuntimeError):
+    """排队消息数超过上限时抛出"""
+
+
+class SessionDispatcher:
+    """
+    按会话分发消息的调度器
+    不同会话在有界线程池中并行处理，同一会话内的消息严格按到达顺序串行处理
+    """
+
+    def __init__(self,
+                 handler: Callable,
+                 max_workers: int = int(os.getenv("DISPATCH_WORKERS", "8")),
+                 max_pending: int = int(os.getenv("DISPATCH_MAX_PENDING", "200"))) -> None:
+        """
+        初始化调度器
+
+        Args:
+            handler: 处理单条消息的函数，签名为 handler(session_id, *args)
+            max_workers: 工作线程数，即同时处理的会话数上限
+            max_pending: 所有会话排队消息总数上限，超过后拒绝新消息
+        """
+        self.logger = logging.getLogger("SessionDispatcher")
+        self.handler = handler
+        self.max_workers = max_workers
+        self.max_pending = max_pending
+        self._executor = ThreadPoolExecutor(max_workers=max_workers, thread_name_prefix="session-worker")
+        self._lock = threading.Lock()
+        # 每个会话的待处理队列，元素为 (提交时间, 参数, Future)
+        self._queues: Dict[str, Deque[Tuple[float, tuple, Future]]] = {}
+        # 正在被某个工作线程处理的会话
+        self._active = set()
+        self._pending = 0
+        self._in_flight = 0
+        self._processed = 0
+        self._failed = 0
+        self._rejected = 0
+        self._wait_total = 0.0
+        self._wait_max = 0.0
+
+    def submit(self, session_id: str, *args) -> Future:
+        """
+        提交一条消息，返回可等待结果的 Future
+
+        Raises:
+            DispatcherBusyError: 排队消息数已达上限
+        """
+        future = Future()
+        with self._lock:
+            if self._pending >= self.max_pending:
+                self._rejected += 1
+                raise DispatcherBusyError(f"排队消息过多: {self._pending}")
+            self._queues.setdefault(session_id, deque()).append((time.monotonic(), args, future))
+            self._pending += 1
+            # 同一会话已有线程在处理时，只入队，由该线程按顺序继续处理
+            if session_id in self._active:
+                return future
+            self._active.add(session_id)
+        self._executor.submit(self._run_next, session_id)
+        return future
+
+    def _run_next(self, session_id: str) -> None:
+        """处理会话队列中的下一条消息，处理完后如仍有积压则重新排入线程池"""
+        with self._lock:
+            enqueued_at, args, future = self._queues[session_id].popleft()
+            self._pending -= 1
+            self._in_flight += 1
+            waited = time.monotonic() - enqueued_at
+            self._wait_total += waited
+            self._wait_max = max(self._wait_max, waited)
+
+        if future.set_running_or_notify_cancel():
+            try:
+                future.set_result(self.handler(session_id, *args))
+            except Exception as e:
+                self.logger.error(f"会话 {session_id} 处理消息出错: {e}")
+                future.set_exception(e)
+                with self._lock:
+                    self._failed += 1
+
+        with self._lock:
+            self._in_flight -= 1
+            self._processed += 1
+            if self._queues[session_id]:
+                resubmit = True
+            else:
+                del self._queues[session_id]
+                self._active.discard(session_id)
+                resubmit = False
+        # 重新排队而不是在当前线程循环处理，避免单个会话长期占用工作线程
+        if resubmit:
+            self._executor.submit(self._run_next, session_id)
+
+    def stats(self) -> dict:
+        """返回队列深度、等待时间和并发数等指标，用于评估线程池大小"""
+        with self._lock:
+            started = self._processed + self._in_flight
+            return {
+                "max_workers": self.max_workers,
+                "queue_depth": self._pending,
+                "sessions_queued": len(self._queues),
+                "max_session_depth": max((len(q) for q in self._queues.values()), default=0),
+                "in_flight": self._in_flight,
+                "processed": self._processed,
+                "failed": self._failed,
+                "rejected": self._rejected,
+                "avg_wait_seconds": self._wait_total / started if started else 0.0,
+                "max_wait_seconds": self._wait_max,
+            }
+
+    def shutdown(self, wait: bool = True) -> None:
+        """关闭线程池"""
+        self._executor.shutdown(wait=wait)
@@ -0,0 +1,218 @@
+import hashlib
+import logging
+import os
+import re
+import threading
+import unicodedata
+from typing import Dict, List, Optional
+
+import numpy as np
+from langchain_core.embeddings import Embeddings
+
+from .Cache import MemoryStore, create_store
+
+_WHITESPACE = re.compile(r"\s+")
+
+
+def normalize_text(text: str) -> str:
+    """统一全角/半角字符并合并空白，格式不同但内容相同的文本共用一个缓存条目"""
+    return _WHITESPACE.sub(" ", unicodedata.normalize("NFKC", text)).strip()
+
+
+class EmbeddingCache:
+    """
+    文本向量缓存，键为 (嵌入模型, 查询/文档, 归一化文本哈希)
+    部分嵌入模型对查询和文档使用不同的前缀或指令，同一文本的两种向量分开缓存
+    第一层是进程内 LRU，可选第二层 SQLite/Redis 持久存储，进程重启或多进程间仍可命中
+    向量以 float32 字节存储
+    """
+
+    def __init__(self, model: str, memory_store: MemoryStore, persistent_store=None) -> None:
+        """
+        Args:
+            model: 嵌入模型名称，不同模型的向量互不命中
+            memory_store: 进程内 LRU
+            persistent_store: 持久存储，None 表示只用进程内缓存
+        """
+        self.logger = logging.getLogger("EmbeddingCache")
+        self.model = model
+        self.memory_store = memory_store
+        self.persistent_store = persistent_store
+        self.hits = 0
+        self.persistent_hits = 0
+        self.misses = 0
+        self._lock = threading.Lock()
+
+    def key(self, text: str, kind: str = "doc") -> str:
+        """
+        Args:
+            text: 文本
+            kind: query 表示 embed_query 的向量，doc 表示 embed_documents 的向量
+        """
+        return hashlib.sha256(f"{self.model}\x00{kind}\x00{normalize_text(text)}".encode("utf-8")).hexdigest()
+
+    def get(self, key: str) -> Optional[List[float]]:
+        value = self.memory_store.get(key)
+        if value is None and self.persistent_store is not None:
+            try:
+                value = self.persistent_store.get(key)
+            except Exception as e:
+                # 持久存储故障时退回直接调用嵌入接口
+                self.logger.warning(f"读取向量缓存失败: {e}")
+                value = None
+            if value is not None:
+                self.memory_store.set(key, value)
+                with self._lock:
+                    self.persistent_hits += 1
+        with self._lock:
+            if value is None:
+                self.misses += 1
+            else:
+                self.hits += 1
+        return None if value is None else np.frombuffer(value, dtype=np.float32).tolist()
+
+    def set(self, key: str, vector: List[float]) -> None:
+        value = np.asarray(vector, dtype=np.float32).tobytes()
+        self.memory_store.set(key, value)
+        if self.persistent_store is not None:
+            try:
+                self.persistent_store.set(key, value)
+            except Exception as e:
+                self.logger.warning(f"写入向量缓存失败: {e}")
+
+    def clear(self) -> None:
+        self.memory_store.clear()
+        if self.persistent_store is not None:
+            self.persistent_store.clear()
+
+    def stats(self) -> dict:
+        lookups = self.hits + self.misses
+        stats = {
+            "model": self.model,
+            "entries": len(self.memory_store),
+            "bytes": self.memory_store.size_bytes(),
+            "hits": self.hits,
+            "misses": self.misses,
+            "hit_rate": self.hits / lookups if lookups else 0.0,
+            "evictions": self.memory_store.evictions,
+        }
+        if self.persistent_store is not None:
+            stats.update({
+                "persistent_backend": type(self.persistent_store).__name__,
+                "persistent_hits": self.persistent_hits,
+                "persistent_entries": len(self.persistent_store),
+                "persistent_bytes": self.persistent_store.size_bytes(),
+            })
+        return stats
+
+
+class CachedEmbeddings(Embeddings):
+    """带向量缓存的嵌入模型包装，只有未命中的文本才调用远程嵌入接口"""
+
+    def __init__(self, embeddings: Embeddings, model: str,
+                 symmetric: bool = os.getenv("EMBEDDING_SYMMETRIC", "true").lower() == "true") -> None:
+        """
+        Args:
+            embeddings: 实际调用的嵌入模型
+            model: 嵌入模型名称，用于区分缓存
+            symmetric: 模型对查询和文档是否使用相同的编码(如 OpenAI)，是时 embed_queries 未命中的查询合并为一次请求
+        """
+        self.embeddings = embeddings
+        self.cache = get_embedding_cache(model)
+        self.symmetric = symmetric
+
+    def embed_query(self, text: str) -> List[float]:
+        key = self.cache.key(text, "query")
+        vector = self.cache.get(key)
+        if vector is None:
+            vector = self.embeddings.embed_query(text)
+            self.cache.set(key, vector)
+        return vector
+
+    def embed_documents(self, texts: List[str]) -> List[List[float]]:
+        """批量嵌入，未命中的文本去重后合并为一次接口调用"""
+        keys = [self.cache.key(text, "doc") for text in texts]
+        vectors: Dict[str, List[float]] = {}
+        missing: Dict[str, str] = {}
+        for key, text in zip(keys, texts):
+            if key in vectors or key in missing:
+                continue
+            vector = self.cache.get(key)
+            if vector is None:
+                missing[key] = text
+            else:
+                vectors[key] = vector
+        if missing:
+            embedded = self.embeddings.embed_documents(list(missing.values()))
+            for key, vector in zip(missing, embedded):
+                self.cache.set(key, vector)
+                vectors[key] = vector
+        return [vectors[key] for key in keys]
+
+    def embed_queries(self, texts: List[str]) -> List[List[float]]:
+        """
+        批量生成查询向量，结果与逐个调用 embed_query 一致并共用缓存
+        只有未命中的查询才请求接口；对称模型合并为一次 embed_documents 请求，否则逐个 embed_query
+        """
+        keys = [self.cache.key(text, "query") for text in texts]
+        vectors: Dict[str, List[float]] = {}
+        missing: Dict[str, str] = {}
+        for key, text in zip(keys, texts):
+            if key in vectors or key in missing:
+                continue
+            vector = self.cache.get(key)
+            if vector is None:
+                missing[key] = text
+            else:
+                vectors[key] = vector
+        if missing:
+            if self.symmetric:
+                embedded = self.embeddings.embed_documents(list(missing.values()))
+            else:
+                embedded = [self.embeddings.embed_query(text) for text in missing.values()]
+            for key, vector in zip(missing, embedded):
+                self.cache.set(key, vector)
+                vectors[key] = vector
+        return [vectors[key] for key in keys]
+
+    async def aembed_query(self, text: str) -> List[float]:
+        key = self.cache.key(text, "query")
+        vector = self.cache.get(key)
+        if vector is None:
+            vector = await self.embeddings.aembed_query(text)
+            self.cache.set(key, vector)
+        return vector
+
+
+_caches: Dict[str, EmbeddingCache] = {}
+_caches_lock = threading.Lock()
+
+
+def get_embedding_cache(model: str) -> EmbeddingCache:
+    """
+    获取模型对应的进程内向量缓存
+    由环境变量 EMBEDDING_CACHE_MAX_ENTRIES / EMBEDDING_CACHE_BACKEND / EMBEDDING_CACHE_TTL 配置，
+    EMBEDDING_CACHE_BACKEND 为 memory 时不使用持久存储
+    """
+    with _caches_lock:
+        if model not in _caches:
+            max_entries = int(os.getenv("EMBEDDING_CACHE_MAX_ENTRIES", "5000"))
+            backend = os.getenv("EMBEDDING_CACHE_BACKEND", "memory")
+            ttl = os.getenv("EMBEDDING_CACHE_TTL", "")
+            persistent_store = None
+            if backend != "memory":
+                persistent_store = create_store(
+                    backend=backend,
+                    name="embedding_cache",
+                    max_entries=int(os.getenv("EMBEDDING_CACHE_PERSISTENT_MAX_ENTRIES", "100000")),
+                    ttl=float(ttl) if ttl else None,
+                )
+            _caches[model] = EmbeddingCache(model, MemoryStore(max_entries=max_entries), persistent_store)
+        return _caches[model]
+
+
+def embedding_cache_stats() -> List[dict]:
+    """所有模型的向量缓存指标"""
+    with _caches_lock:
+        caches = list(_caches.values())
+    return [cache.stats() for cache in caches]
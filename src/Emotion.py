@@ -1,14 +1,18 @@
 from langchain_core.prompts import ChatPromptTemplate
 from langchain_openai import ChatOpenAI
+from .LocalEmotion import LocalEmotionClassifier
 from dotenv import load_dotenv
 load_dotenv()
 import os
 
 class EmotionClass:
-    def __init__(self,model=os.getenv("BASE_MODEL")):
+    def __init__(self,model=os.getenv("BASE_MODEL"),local_threshold=float(os.getenv("EMOTION_LOCAL_THRESHOLD", "0.7"))):
         self.chat = None
         self.Emotion = None
         self.chatmodel = ChatOpenAI(model=model)
+        # 本地词典分类器，置信度达到阈值时直接采用，不再调用 LLM；阈值大于1即关闭本地分类
+        self.local = LocalEmotionClassifier()
+        self.local_threshold = local_threshold
 
     def Emotion_Sensing(self, input):
         # 处理输入长度
@@ -19,6 +23,17 @@ class EmotionClass:
         
         print(f"Processing input: {input}")
         
+        # 先走本地快速分类，只有把握不足的输入才调用 LLM
+        result, confidence = self.local.classify(input)
+        if result is not None and confidence >= self.local_threshold:
+            print(f"Local emotion result: {result}, confidence: {confidence:.2f}")
+            self.Emotion = result
+            return result
+        
+        return self.Emotion_Sensing_LLM(input)
+
+    def Emotion_Sensing_LLM(self, input):
+        """直接使用 LLM 进行情绪分析"""
         # 修改后的 JSON schema
         json_schema = {
             "title": "emotions",
@@ -0,0 +1,133 @@
+import math
+import os
+import re
+import time
+from typing import List, Optional
+
+from .CalendarMirror import event_bounds, parse_time
+from .LexicalIndex import tokenize
+
+_SPACES = re.compile(r"\s+")
+
+
+def _trigrams(text: str) -> set:
+    """去掉空白后的字符三元组，短文本直接作为一个整体"""
+    text = _SPACES.sub("", text.lower())
+    if len(text) <= 3:
+        return {text} if text else set()
+    return {text[i:i + 3] for i in range(len(text) - 2)}
+
+
+def text_similarity(query: str, target: str) -> float:
+    """
+    查询文本与日程文本的相似度，取值 0~1
+    字符三元组的 Dice 系数容忍错别字和措辞差异，检索词覆盖率衡量查询中的词有多少出现在日程里
+    """
+    if not query or not target:
+        return 0.0
+    q_grams, t_grams = _trigrams(query), _trigrams(target)
+    dice = 2 * len(q_grams & t_grams) / (len(q_grams) + len(t_grams))
+    q_terms = set(tokenize(query))
+    coverage = len(q_terms & set(tokenize(target))) / len(q_terms) if q_terms else 0.0
+    return 0.5 * dice + 0.5 * coverage
+
+
+class EventMatch:
+    """一次匹配的结果：最佳日程、得分，以及与第二名的差距"""
+
+    def __init__(self, event: Optional[dict], score: float, margin: float, ranked: List[tuple]) -> None:
+        self.event = event
+        self.score = score
+        self.margin = margin
+        # [(得分, 日程), ...]，按得分从高到低
+        self.ranked = ranked
+
+    @property
+    def id(self) -> Optional[str]:
+        return self.event["id"] if self.event else None
+
+    def candidates(self, n: int) -> List[dict]:
+        return [event for _, event in self.ranked[:n]]
+
+
+class EventMatcher:
+    """
+    按标题/描述相似度和时间接近程度为日程打分，选出与用户描述最匹配的日程
+    最高分过低，或与第二名差距过小时认为无法确定，由调用方决定是否交给 LLM
+    """
+
+    def __init__(self,
+                 min_score: float = float(os.getenv("EVENT_MATCH_MIN_SCORE", "0.35")),
+                 min_margin: float = float(os.getenv("EVENT_MATCH_MARGIN", "0.1")),
+                 time_scale: float = float(os.getenv("EVENT_MATCH_TIME_SCALE", "86400"))) -> None:
+        """
+        Args:
+            min_score: 认为匹配可信的最低得分
+            min_margin: 最佳与第二名之间的最小差距
+            time_scale: 时间接近程度的衰减尺度(秒)，相差该时长时时间得分约为 0.37
+        """
+        self.min_score = min_score
+        self.min_margin = min_margin
+        self.time_scale = time_scale
+
+    def score(self, event: dict, summary: str, description: Optional[str] = None,
+              when: Optional[float] = None) -> float:
+        """
+        Args:
+            event: Google Calendar 日程
+            summary: 用户描述的标题
+            description: 用户描述的内容，可为空
+            when: 用户给出的大致时间(时间戳)，为空时以当前时间为参照，仅作轻微的排序依据
+        """
+        event_summary = event.get("summary", "")
+        event_description = event.get("description", "")
+        title = max(text_similarity(summary, event_summary),
+                    # 用户有时把标题说成描述中的内容
+                    0.8 * text_similarity(summary, event_description))
+        if description:
+            text = 0.7 * title + 0.3 * max(text_similarity(description, event_description),
+                                           text_similarity(description, event_summary))
+        else:
+            text = title
+
+        start_ts, _ = event_bounds(event)
+        time_weight = 0.3 if when is not None else 0.05
+        reference = when if when is not None else time.time()
+        proximity = math.exp(-abs(start_ts - reference) / self.time_scale) if start_ts is not None else 0.0
+        return (1 - time_weight) * text + time_weight * proximity
+
+    def match(self, events: List[dict], summary: str, description: Optional[str] = None,
+              when: Optional[str] = None) -> EventMatch:
+        """
+        Args:
+            events: 候选日程
+            summary: 用户描述的标题
+            description: 用户描述的内容，可为空
+            when: 用户给出的大致时间(ISO-8601)，可为空
+
+        Returns:
+            EventMatch，没有候选时 event 为 None
+        """
+        reference = parse_time(when) if when else None
+        ranked = sorted(((self.score(event, summary, description, reference), event) for event in events),
+                        key=lambda item: item[0], reverse=True)
+        if not ranked:
+            return EventMatch(None, 0.0, 0.0, [])
+        best_score, best = ranked[0]
+        margin = best_score - ranked[1][0] if len(ranked) > 1 else best_score
+        return EventMatch(best, best_score, margin, ranked)
+
+    def confident(self, result: EventMatch) -> bool:
+        return result.event is not None and result.score >= self.min_score and result.margin >= self.min_margin
+
+
+def event_brief(event: dict) -> dict:
+    """只保留区分日程所需的字段，交给 LLM 时减少 token"""
+    return {
+        "id": event.get("id"),
+        "summary": event.get("summary", ""),
+        "description": event.get("description", ""),
+        "start": event.get("start", {}),
+        "end": event.get("end", {}),
+        "isAllDay": "date" in event.get("start", {}),
+    }
@@ -0,0 +1,117 @@
+import os
+import threading
+from datetime import datetime
+from typing import Iterable, List, Optional, Tuple
+
+from .GoogleServices import get_google_services
+
+Interval = Tuple[datetime, datetime]
+
+
+def _parse(value: str) -> datetime:
+    parsed = datetime.fromisoformat(value.replace("Z", "+00:00"))
+    # 不带时区的时间按本机时区处理
+    return parsed if parsed.tzinfo else parsed.astimezone()
+
+
+def merge_intervals(intervals: Iterable[Interval]) -> List[Interval]:
+    """合并重叠或首尾相接的时间段"""
+    merged: List[Interval] = []
+    for start, end in sorted(intervals):
+        if merged and start <= merged[-1][1]:
+            merged[-1] = (merged[-1][0], max(merged[-1][1], end))
+        else:
+            merged.append((start, end))
+    return merged
+
+
+def free_intervals(busy: List[Interval], time_min: datetime, time_max: datetime) -> List[Interval]:
+    """查询范围内除忙碌时间外的空闲时间段，busy 需已合并"""
+    free = []
+    cursor = time_min
+    for start, end in busy:
+        if start > cursor:
+            free.append((cursor, min(start, time_max)))
+        cursor = max(cursor, end)
+    if cursor < time_max:
+        free.append((cursor, time_max))
+    return free
+
+
+def _format(intervals: List[Interval]) -> str:
+    parts = []
+    for start, end in intervals:
+        if start.date() == end.date():
+            parts.append(f"{start:%Y-%m-%d %H:%M}-{end:%H:%M}")
+        else:
+            parts.append(f"{start:%Y-%m-%d %H:%M}-{end:%Y-%m-%d %H:%M}")
+    return "、".join(parts)
+
+
+class FreeBusyService:
+    """
+    通过 freebusy 接口查询忙闲
+    一次请求覆盖多个日历，只返回忙碌时间段；合并后输出简短的文字摘要，不再把完整日程交给模型
+    """
+
+    def __init__(self, service=None,
+                 calendars: Iterable[str] = os.getenv("FREEBUSY_CALENDARS", "primary").split(",")) -> None:
+        """
+        Args:
+            service: Google Calendar 服务，默认使用进程内共享的服务
+            calendars: 参与忙闲计算的日历 id
+        """
+        self.service = service
+        self.calendars = [c.strip() for c in calendars if c.strip()]
+
+    def busy(self, time_min: str, time_max: str) -> Tuple[List[Interval], List[str]]:
+        """
+        Returns:
+            (合并后的忙碌时间段, 查询失败的日历及原因)
+        """
+        service = self.service or get_google_services().calendar
+        result = service.freebusy().query(body={
+            "timeMin": _parse(time_min).isoformat(),
+            "timeMax": _parse(time_max).isoformat(),
+            "items": [{"id": calendar_id} for calendar_id in self.calendars],
+        }).execute()
+
+        intervals, errors = [], []
+        for calendar_id, calendar in result.get("calendars", {}).items():
+            for error in calendar.get("errors", []):
+                errors.append(f"{calendar_id}: {error.get('reason')}")
+            intervals.extend((_parse(b["start"]), _parse(b["end"])) for b in calendar.get("busy", []))
+        return merge_intervals(intervals), errors
+
+    def summary(self, time_min: str, time_max: str) -> str:
+        """
+        查询范围内的忙闲摘要，时间按 time_min 的时区显示
+        """
+        start, end = _parse(time_min), _parse(time_max)
+        busy, errors = self.busy(time_min, time_max)
+        # 忙碌时间段可能超出查询范围，截取到范围内
+        busy = [(max(s, start).astimezone(start.tzinfo), min(e, end).astimezone(start.tzinfo))
+                for s, e in busy if e > start and s < end]
+
+        if not busy:
+            text = f"{_format([(start, end)])} 全部空闲"
+        else:
+            text = f"忙碌 {len(busy)} 段: {_format(busy)}"
+            free = free_intervals(busy, start, end)
+            text += f"\n空闲: {_format(free)}" if free else "\n没有空闲时间"
+        if errors:
+            text += f"\n以下日历查询失败: {'；'.join(errors)}"
+        return text
+
+
+_service: Optional[FreeBusyService] = None
+_service_lock = threading.Lock()
+
+
+def get_freebusy() -> FreeBusyService:
+    """获取进程内共享的忙闲查询服务"""
+    global _service
+    with _service_lock:
+        if _service is None:
+            _service = FreeBusyService()
+        return _service
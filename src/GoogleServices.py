@@ -0,0 +1,190 @@
+import datetime
+import json
+import logging
+import os
+import pickle
+import threading
+import time
+from typing import List, Optional, Tuple
+from urllib.parse import urljoin
+
+import google_auth_httplib2
+import httplib2
+from google.auth.transport.requests import Request
+from google_auth_oauthlib.flow import InstalledAppFlow
+from googleapiclient.discovery import build
+from googleapiclient.discovery_cache import get_static_doc
+from googleapiclient.http import BatchHttpRequest, HttpRequest
+
+# Google Calendar API scopes
+SCOPES = [
+    'https://www.googleapis.com/auth/calendar',
+    'https://www.googleapis.com/auth/tasks'
+]
+
+
+class GoogleServicePool:
+    """
+    进程内共享的 Google Calendar / Tasks 服务
+    凭证只加载一次，服务使用随库发布的静态 discovery 文档构建一次；
+    后台线程在令牌过期前提前刷新，工具调用不再承担刷新耗时；
+    httplib2 不是线程安全的，每个线程使用自己的 HTTP 连接发送请求
+    """
+
+    def __init__(self,
+                 token_path: str = os.getenv("GOOGLE_TOKEN_PATH", "token.pickle"),
+                 credentials_path: str = os.getenv("GOOGLE_CREDENTIALS_PATH", "credentials.json"),
+                 refresh_ahead: float = float(os.getenv("GOOGLE_REFRESH_AHEAD", "300")),
+                 timeout: float = float(os.getenv("GOOGLE_HTTP_TIMEOUT", "30")),
+                 api_root: Optional[str] = os.getenv("GOOGLE_API_ROOT"),
+                 batch_size: int = int(os.getenv("GOOGLE_BATCH_SIZE", "50"))) -> None:
+        """
+        Args:
+            token_path: 保存令牌的文件
+            credentials_path: OAuth 客户端凭据文件，没有有效令牌时用于授权
+            refresh_ahead: 在令牌过期前多少秒刷新
+            timeout: HTTP 请求超时(秒)
+            api_root: 替换 Google API 的根地址，例如指向 fake_google_api 启动的本地服务
+            batch_size: 每个批量请求最多包含的子请求数，Calendar API 建议不超过 50
+        """
+        self.logger = logging.getLogger("GoogleServicePool")
+        self.token_path = token_path
+        self.credentials_path = credentials_path
+        self.refresh_ahead = refresh_ahead
+        self.timeout = timeout
+        self.api_root = api_root
+        self.batch_size = batch_size
+        self._batch_uris = {}
+        self._lock = threading.Lock()
+        self._local = threading.local()
+        self.credentials = self._load_credentials()
+        self.calendar = self._build("calendar", "v3")
+        self.tasks = self._build("tasks", "v1")
+        threading.Thread(target=self._refresh_loop, name="google-token-refresh", daemon=True).start()
+
+    def _load_credentials(self):
+        creds = None
+        if os.path.exists(self.token_path):
+            with open(self.token_path, 'rb') as token:
+                creds = pickle.load(token)
+
+        if not creds or not creds.valid:
+            if creds and creds.expired and creds.refresh_token:
+                creds.refresh(Request())
+            else:
+                flow = InstalledAppFlow.from_client_secrets_file(self.credentials_path, SCOPES)
+                creds = flow.run_local_server(port=0)
+            self._save(creds)
+        return creds
+
+    def _save(self, creds) -> None:
+        with open(self.token_path, 'wb') as token:
+            pickle.dump(creds, token)
+
+    def refresh(self) -> None:
+        """刷新令牌并写回文件"""
+        with self._lock:
+            self.credentials.refresh(Request())
+            self._save(self.credentials)
+        self.logger.info(f"Google 令牌已刷新，新的过期时间 {self.credentials.expiry}")
+
+    def _seconds_until_refresh(self) -> float:
+        expiry = self.credentials.expiry
+        if expiry is None:
+            return 3600.0
+        # google-auth 使用不带时区的 UTC 时间
+        now = datetime.datetime.now(datetime.timezone.utc).replace(tzinfo=None)
+        remaining = (expiry - now).total_seconds()
+        return max(remaining - self.refresh_ahead, 0.0)
+
+    def _refresh_loop(self) -> None:
+        while True:
+            wait = self._seconds_until_refresh()
+            if wait > 0:
+                time.sleep(wait)
+            if not self.credentials.refresh_token:
+                return
+            try:
+                self.refresh()
+            except Exception as e:
+                self.logger.error(f"刷新 Google 令牌失败: {e}")
+                time.sleep(30)
+
+    def _http(self) -> google_auth_httplib2.AuthorizedHttp:
+        """当前线程专用的 HTTP 连接，同一线程内复用"""
+        http = getattr(self._local, "http", None)
+        if http is None:
+            http = google_auth_httplib2.AuthorizedHttp(self.credentials, http=httplib2.Http(timeout=self.timeout))
+            self._local.http = http
+        return http
+
+    def _request_builder(self, http, *args, **kwargs) -> HttpRequest:
+        # 忽略构建服务时绑定的连接，改用调用线程自己的连接
+        return HttpRequest(self._http(), *args, **kwargs)
+
+    def _build(self, service_name: str, version: str):
+        client_options = None
+        if self.api_root:
+            doc = json.loads(get_static_doc(service_name, version))
+            client_options = {"api_endpoint": urljoin(self.api_root, doc["servicePath"])}
+            # 批量请求的地址来自 discovery 文档的 rootUrl，不受 api_endpoint 影响，需要单独替换
+            self._batch_uris[service_name] = urljoin(self.api_root, doc.get("batchPath", "batch"))
+        return build(
+            service_name,
+            version,
+            http=self._http(),
+            requestBuilder=self._request_builder,
+            static_discovery=True,
+            cache_discovery=False,
+            client_options=client_options,
+        )
+
+    def execute_batch(self, service_name: str,
+                      requests: List[HttpRequest]) -> List[Tuple[Optional[dict], Optional[Exception]]]:
+        """
+        把多个请求合并为 Google API 批量请求发送，超过 batch_size 时分成多批
+
+        Args:
+            service_name: calendar 或 tasks
+            requests: 由对应服务构建、尚未执行的请求
+
+        Returns:
+            与 requests 顺序一致的 [(响应, 异常), ...]，单个请求失败不影响其他请求；
+            某一批整体失败(网络错误等)时，该批中没有收到响应的请求记录该异常，之前已发送的批次照常返回
+        """
+        results: List[Tuple[Optional[dict], Optional[Exception]]] = [(None, None)] * len(requests)
+        answered = set()
+
+        def callback(request_id, response, exception):
+            results[int(request_id)] = (response, exception)
+            answered.add(int(request_id))
+
+        for begin in range(0, len(requests), self.batch_size):
+            if service_name in self._batch_uris:
+                batch = BatchHttpRequest(callback=callback, batch_uri=self._batch_uris[service_name])
+            else:
+                batch = getattr(self, service_name).new_batch_http_request(callback=callback)
+            indexes = range(begin, min(begin + self.batch_size, len(requests)))
+            for index in indexes:
+                batch.add(requests[index], request_id=str(index))
+            try:
+                batch.execute(http=self._http())
+            except Exception as e:
+                self.logger.error(f"{service_name} 批量请求失败，第 {begin + 1}-{indexes[-1] + 1} 个请求未完成: {e}")
+                for index in indexes:
+                    if index not in answered:
+                        results[index] = (None, e)
+        return results
+
+
+_pool: Optional[GoogleServicePool] = None
+_pool_lock = threading.Lock()
+
+
+def get_google_services() -> GoogleServicePool:
+    """获取进程内共享的 Google 服务，首次调用时加载凭证并构建服务"""
+    global _pool
+    with _pool_lock:
+        if _pool is None:
+            _pool = GoogleServicePool()
+        return _pool
@@ -0,0 +1,136 @@
+import json
+import logging
+import os
+import threading
+import time
+from typing import Dict, List, Optional, Tuple
+
+# 变更记录过多或版本号对不上时，读取方需要整体重建
+FULL_RELOAD = None
+
+
+class KnowledgeBaseSync:
+    """
+    知识库变更在进程间的同步
+    写入方(Server.py 中的 DocumentProcessor)每次写入分片后递增 Redis 中集合的版本号，并追加一条变更记录(分片id列表)；
+    读取方(Slack 机器人中的 RetrieverService)回答前检查版本号，按变更记录更新自己进程内的 BM25 索引和语义缓存
+    变更记录只有分片id，读取方从共享的 Qdrant 服务读取分片内容和向量，因此只在设置了 QDRANT_URL 时启用；
+    嵌入式 Qdrant 的目录只能被一个进程打开，写入方和读取方必须是同一个进程
+    Redis 不可用时只记录警告，各进程的索引和缓存退化为只在本进程内更新
+    """
+
+    def __init__(self, collection_name: str,
+                 redis_url: str = os.environ.get("REDIS_URL", "redis://localhost:6379/0"),
+                 check_interval: float = float(os.getenv("KB_SYNC_CHECK_INTERVAL", "2")),
+                 max_log: int = int(os.getenv("KB_SYNC_MAX_LOG", "1000"))) -> None:
+        """
+        Args:
+            collection_name: 集合名称
+            redis_url: 保存版本号和变更记录的 Redis
+            check_interval: 两次检查版本号的最小间隔(秒)，0 表示每次都检查
+            max_log: 保留的变更记录条数，读取方落后更多时整体重建
+        """
+        self.logger = logging.getLogger("KnowledgeBaseSync")
+        self.redis_url = redis_url
+        self.check_interval = check_interval
+        self.max_log = max_log
+        self._version_key = f"kb:{collection_name}:version"
+        self._log_key = f"kb:{collection_name}:changes"
+        self._lock = threading.Lock()
+        self._last_check = 0.0
+        # 本进程已应用到的版本号，None 表示尚未读取
+        self.seen: Optional[int] = None
+
+    def _client(self):
+        from .RedisPool import get_redis
+
+        return get_redis(self.redis_url)
+
+    def publish(self, chunk_ids: List[str]) -> Optional[int]:
+        """
+        记录一次分片新增或变更，返回新的版本号；Redis 不可用时返回 None
+        版本号和变更记录在同一个事务中写入，第 n 条记录对应版本 n
+        """
+        try:
+            pipe = self._client().pipeline(transaction=True)
+            pipe.incr(self._version_key)
+            pipe.rpush(self._log_key, json.dumps([str(chunk_id) for chunk_id in chunk_ids]))
+            pipe.ltrim(self._log_key, -self.max_log, -1)
+            version = pipe.execute()[0]
+        except Exception as e:
+            self.logger.warning(f"知识库变更未能通知其他进程: {e}")
+            return None
+        with self._lock:
+            # 写入方自己已经更新过本进程的索引和缓存；中间没有其他进程的变更时直接跳过这条记录
+            if self.seen == version - 1:
+                self.seen = version
+        return version
+
+    def pending(self) -> Optional[Tuple[int, Optional[List[str]]]]:
+        """
+        检查其他进程的变更
+
+        Returns:
+            None 表示没有新变更(或未到检查时间、Redis 不可用)；
+            否则为 (最新版本号, 变更的分片id)，分片id为 FULL_RELOAD 时需要整体重建
+            调用方应用完变更后调用 mark(版本号)
+        """
+        now = time.monotonic()
+        with self._lock:
+            if now - self._last_check < self.check_interval:
+                return None
+            self._last_check = now
+            seen = self.seen
+        try:
+            client = self._client()
+            version = int(client.get(self._version_key) or 0)
+            if seen is None:
+                # 首次检查只记录当前版本，此前的分片由启动时的全量构建覆盖
+                self.mark(version)
+                return None
+            if version == seen:
+                return None
+            pipe = client.pipeline(transaction=True)
+            pipe.get(self._version_key)
+            pipe.lrange(self._log_key, 0, -1)
+            version, records = pipe.execute()
+        except Exception as e:
+            self.logger.warning(f"检查知识库变更失败: {e}")
+            return None
+        version = int(version or 0)
+        behind = version - seen
+        if behind <= 0 or behind > len(records):
+            # 版本号回退(Redis 被清空)或变更记录已被截断
+            return version, FULL_RELOAD
+        chunk_ids: List[str] = []
+        for record in records[len(records) - behind:]:
+            chunk_ids.extend(json.loads(record))
+        return version, chunk_ids
+
+    def mark(self, version: int) -> None:
+        with self._lock:
+            if self.seen is None or version > self.seen:
+                self.seen = version
+
+    def reset(self) -> None:
+        """全量重建前调用：记录当前版本，重建已包含此前的全部变更"""
+        try:
+            version = int(self._client().get(self._version_key) or 0)
+        except Exception as e:
+            self.logger.warning(f"读取知识库版本失败: {e}")
+            return
+        with self._lock:
+            self.seen = version
+            self._last_check = time.monotonic()
+
+
+_syncs: Dict[str, KnowledgeBaseSync] = {}
+_syncs_lock = threading.Lock()
+
+
+def get_kb_sync(collection_name: str) -> KnowledgeBaseSync:
+    """获取集合对应的进程内变更同步器，同一进程的读写方共用，写入方自己的变更不会被重复应用"""
+    with _syncs_lock:
+        if collection_name not in _syncs:
+            _syncs[collection_name] = KnowledgeBaseSync(collection_name)
+        return _syncs[collection_name]
@@ -0,0 +1,186 @@
+import logging
+import math
+import os
+import re
+import threading
+from collections import Counter
+from typing import Dict, Iterable, List, Optional, Tuple
+
+# 英文、数字、标识符(如 text-embedding-3-small、gRPC、C++)作为整体，连续中文单独成段
+_TOKEN_PATTERN = re.compile(r"[a-z0-9][a-z0-9_.+\-]*[a-z0-9+]|[a-z0-9]|[\u3400-\u4dbf\u4e00-\u9fff]+")
+_CJK_PATTERN = re.compile(r"[\u3400-\u4dbf\u4e00-\u9fff]")
+
+try:
+    import jieba
+    jieba.setLogLevel(logging.WARNING)
+except ImportError:
+    jieba = None
+
+
+def _cjk_terms(segment: str) -> List[str]:
+    """中文片段切词：安装了 jieba 时使用搜索引擎模式分词，否则使用相邻二字组"""
+    if jieba is not None:
+        return [word for word in jieba.lcut_for_search(segment) if word.strip()]
+    if len(segment) == 1:
+        return [segment]
+    return [segment[i:i + 2] for i in range(len(segment) - 1)]
+
+
+def tokenize(text: str) -> List[str]:
+    """将中英文混合文本切分为检索词，英文统一小写"""
+    terms = []
+    for token in _TOKEN_PATTERN.findall(text.lower()):
+        if _CJK_PATTERN.match(token):
+            terms.extend(_cjk_terms(token))
+        else:
+            terms.append(token)
+    return terms
+
+
+class BM25Index:
+    """
+    进程内 BM25 倒排索引
+    保存每个分片的文本和元数据，可增量添加和删除分片，用于关键词检索
+    """
+
+    def __init__(self, k1: float = 1.5, b: float = 0.75) -> None:
+        self.k1 = k1
+        self.b = b
+        self.built = False
+        self._lock = threading.RLock()
+        # 词 -> {分片id: 词频}
+        self._postings: Dict[str, Dict[str, int]] = {}
+        self._doc_terms: Dict[str, Counter] = {}
+        self._doc_len: Dict[str, int] = {}
+        self._docs: Dict[str, Tuple[str, dict]] = {}
+        self._total_len = 0
+
+    def __len__(self) -> int:
+        return len(self._docs)
+
+    def add(self, doc_id: str, content: str, metadata: Optional[dict] = None) -> None:
+        """添加或替换一个分片"""
+        doc_id = str(doc_id)
+        terms = Counter(tokenize(content))
+        with self._lock:
+            self._remove(doc_id)
+            for term, tf in terms.items():
+                self._postings.setdefault(term, {})[doc_id] = tf
+            self._doc_terms[doc_id] = terms
+            self._doc_len[doc_id] = sum(terms.values())
+            self._docs[doc_id] = (content, metadata or {})
+            self._total_len += self._doc_len[doc_id]
+
+    def add_many(self, docs: Iterable[Tuple[str, str, Optional[dict]]]) -> None:
+        """批量添加 (分片id, 文本, 元数据)"""
+        with self._lock:
+            for doc_id, content, metadata in docs:
+                self.add(doc_id, content, metadata)
+
+    def remove(self, doc_id: str) -> None:
+        with self._lock:
+            self._remove(str(doc_id))
+
+    def _remove(self, doc_id: str) -> None:
+        """删除分片，调用方需持有锁"""
+        terms = self._doc_terms.pop(doc_id, None)
+        if terms is None:
+            return
+        for term in terms:
+            postings = self._postings.get(term)
+            if postings is not None:
+                postings.pop(doc_id, None)
+                if not postings:
+                    del self._postings[term]
+        self._total_len -= self._doc_len.pop(doc_id)
+        del self._docs[doc_id]
+
+    def clear(self) -> None:
+        with self._lock:
+            self._postings.clear()
+            self._doc_terms.clear()
+            self._doc_len.clear()
+            self._docs.clear()
+            self._total_len = 0
+            self.built = False
+
+    def get(self, doc_id: str) -> Optional[Tuple[str, dict]]:
+        """返回分片的 (文本, 元数据)"""
+        return self._docs.get(str(doc_id))
+
+    def _idf(self, term: str) -> float:
+        df = len(self._postings.get(term, ()))
+        return math.log(1 + (len(self._docs) - df + 0.5) / (df + 0.5))
+
+    def search(self, query: str, k: int = 3) -> List[Tuple[str, float]]:
+        """返回 BM25 得分最高的 k 个 (分片id, 得分)"""
+        return self._search(set(tokenize(query)), k)
+
+    def _search(self, terms: set, k: int) -> List[Tuple[str, float]]:
+        scores: Dict[str, float] = {}
+        with self._lock:
+            if not self._docs:
+                return []
+            avg_len = self._total_len / len(self._docs) or 1
+            for term in terms:
+                postings = self._postings.get(term)
+                if not postings:
+                    continue
+                idf = self._idf(term)
+                for doc_id, tf in postings.items():
+                    norm = self.k1 * (1 - self.b + self.b * self._doc_len[doc_id] / avg_len)
+                    scores[doc_id] = scores.get(doc_id, 0.0) + idf * tf * (self.k1 + 1) / (tf + norm)
+        return sorted(scores.items(), key=lambda item: item[1], reverse=True)[:k]
+
+    def confident_search(self, query: str, k: int = 3,
+                         max_terms: int = 8,
+                         min_coverage: float = 0.8) -> Optional[List[Tuple[str, float]]]:
+        """
+        只有关键词查询的结果足够可靠时才返回检索结果，否则返回 None
+        只保留命中了绝大部分查询词(按 IDF 加权)的分片，没有这样的分片时视为不可靠
+
+        Args:
+            query: 查询文本
+            k: 返回的分片数上限
+            max_terms: 查询词数上限，长句交给向量检索
+            min_coverage: 分片命中的查询词 IDF 之和占全部查询词 IDF 的最小比例
+        """
+        terms = set(tokenize(query))
+        if not terms or len(terms) > max_terms:
+            return None
+        hits = self._search(terms, k)
+        with self._lock:
+            idf = {term: self._idf(term) for term in terms}
+            total = sum(idf.values())
+            if not total:
+                return None
+            confident = []
+            for doc_id, score in hits:
+                doc_terms = self._doc_terms.get(doc_id, {})
+                if sum(weight for term, weight in idf.items() if term in doc_terms) / total >= min_coverage:
+                    confident.append((doc_id, score))
+        return confident or None
+
+
+def reciprocal_rank_fusion(rankings: Iterable[List[str]], k: int = 60) -> List[Tuple[str, float]]:
+    """按倒数排名融合多路检索结果，返回按融合得分降序的 (分片id, 得分)"""
+    scores: Dict[str, float] = {}
+    for ranking in rankings:
+        for rank, doc_id in enumerate(ranking):
+            scores[doc_id] = scores.get(doc_id, 0.0) + 1.0 / (k + rank + 1)
+    return sorted(scores.items(), key=lambda item: item[1], reverse=True)
+
+
+_indexes: Dict[str, BM25Index] = {}
+_indexes_lock = threading.Lock()
+
+
+def get_lexical_index(collection_name: str) -> BM25Index:
+    """获取集合对应的进程内 BM25 索引，其他进程写入的分片由 RetrieverService.sync_changes 同步"""
+    with _indexes_lock:
+        if collection_name not in _indexes:
+            _indexes[collection_name] = BM25Index(
+                k1=float(os.getenv("BM25_K1", "1.5")),
+                b=float(os.getenv("BM25_B", "0.75")),
+            )
+        return _indexes[collection_name]
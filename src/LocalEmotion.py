@@ -0,0 +1,89 @@
+import json
+import os
+import re
+from typing import Optional, Tuple
+
+LEXICON_PATH = os.path.join(os.path.dirname(__file__), "emotion_lexicon.json")
+
+
+class LocalEmotionClassifier:
+    """
+    基于情绪词典的本地情绪分类器
+    在进程内完成打分，只对把握足够大的输入直接给出结果，其余交给 LLM 判断
+    """
+
+    def __init__(self, lexicon_path: str = LEXICON_PATH):
+        with open(lexicon_path, encoding="utf-8") as f:
+            lexicon = json.load(f)
+
+        self.base_scores = {label: conf["score"] for label, conf in lexicon["labels"].items()}
+        # 词条 -> (情绪类型, 权重)
+        self.terms = {}
+        for label, conf in lexicon["labels"].items():
+            for term, weight in conf["terms"].items():
+                self.terms[term.lower()] = (label, weight)
+        self.intensifiers = lexicon["intensifiers"]
+        self.negations = tuple(lexicon["negations"])
+
+        # 所有词条编译成一个正则，长词优先匹配；英文词条加单词边界
+        self.term_pattern = self._compile(self.terms)
+        self.intensifier_pattern = self._compile(self.intensifiers)
+
+    @staticmethod
+    def _compile(words) -> re.Pattern:
+        parts = []
+        for word in sorted(words, key=len, reverse=True):
+            escaped = re.escape(word)
+            parts.append(rf"\b{escaped}\b" if word.isascii() and word[0].isalnum() else escaped)
+        return re.compile("|".join(parts))
+
+    # 分句标点，否定词只作用于同一分句内的情绪词
+    _CLAUSE_BREAK = re.compile(r"[，,。.！!？?；;\n]")
+
+    def _is_negated(self, prefix: str) -> bool:
+        """
+        情绪词是否被否定：同一分句中情绪词之前出现任何否定词都视为否定，
+        "不是很开心"、"并不是特别开心"中否定词与情绪词之间隔着其他字也能识别
+        "特别"、"非常"含有否定字，先把程度副词整体去掉再查找否定词
+        """
+        clause = self._CLAUSE_BREAK.split(prefix)[-1]
+        clause = self.intensifier_pattern.sub(" ", clause)
+        return any(negation in clause for negation in self.negations)
+
+    def classify(self, text: str) -> Tuple[Optional[dict], float]:
+        """
+        对输入打分
+
+        Returns:
+            (情绪结果, 置信度)。结果格式与 EmotionClass.Emotion_Sensing 一致，
+            没有任何情绪线索时结果为 None，置信度为 0
+        """
+        text = text.lower()
+        evidence = {}
+        # 被否定的词条("不开心")意味着情绪反转或不确定，计入歧义惩罚
+        negated = 0.0
+        for match in self.term_pattern.finditer(text):
+            label, weight = self.terms[match.group()]
+            prefix = text[max(0, match.start() - 12):match.start()]
+            if self._is_negated(prefix):
+                negated += weight
+            else:
+                evidence[label] = evidence.get(label, 0) + weight
+
+        if not evidence:
+            return None, 0.0
+
+        ranked = sorted(evidence.items(), key=lambda item: item[1], reverse=True)
+        label, top = ranked[0]
+        second = ranked[1][1] if len(ranked) > 1 else 0
+        confidence = (top - second) / (top + negated + 1)
+
+        # 程度副词越多情绪越强烈：负面情绪加分，正面情绪减分
+        intensity = min(sum(self.intensifiers[m.group()] for m in self.intensifier_pattern.finditer(text)), 2)
+        score = self.base_scores[label]
+        if score > 5:
+            score = min(10, round(score + intensity))
+        elif score < 5:
+            score = max(1, round(score - intensity))
+
+        return {"feeling": label, "score": str(score)}, confidence
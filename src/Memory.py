@@ -1,8 +1,8 @@
 from langchain.memory import ConversationBufferMemory
-from langchain_community.chat_message_histories import RedisChatMessageHistory
 from langchain_core.prompts import ChatPromptTemplate, MessagesPlaceholder
 from langchain_openai import ChatOpenAI
 from src.Prompt import PromptClass
+from src.ChatHistory import SummarizedRedisHistory, BackgroundSummarizer
 from dotenv import load_dotenv
 load_dotenv()
 import os
@@ -16,6 +16,11 @@ class MemoryClass:
         self.memorykey = memorykey
         self.memory = []
         self.chatmodel = ChatOpenAI(model=model)
+        # 后台增量摘要，超长的对话在请求之外折叠进摘要
+        self.summarizer = BackgroundSummarizer(
+            summarize=self.fold_summary,
+            history_factory=lambda session_id: SummarizedRedisHistory(url=redis_url, session_id=session_id),
+        )
 
     def summary_chain(self, store_message):
         try:
@@ -32,27 +37,24 @@ class MemoryClass:
             print("总结出错")
             print(e)
 
+    def fold_summary(self, previous_summary, messages):
+        """将已有摘要和一批较早的消息合并为新的摘要"""
+        str_message = f"之前的摘要: {previous_summary}\n" if previous_summary else ""
+        for message in messages:
+            str_message += f"{type(message).__name__}: {message.content}\n"
+        summary = self.summary_chain(str_message)
+        return summary.content if summary is not None else None
+
     def get_memory(self, session_id: str = "session1"):
         try:
             print("session_id:", session_id)
             print("redis_url:", redis_url)
-            chat_message_history = RedisChatMessageHistory(
+            chat_message_history = SummarizedRedisHistory(
                 url=redis_url, session_id=session_id
             )
-            # 对超长的聊天记录进行摘要
-            store_message = chat_message_history.messages
-            if len(store_message) > 80:
-                str_message = ""
-                for message in store_message:
-                    str_message += f"{type(message).__name__}: {message.content}"
-                summary = self.summary_chain(str_message)
-                chat_message_history.clear()  # 清空原有的对话
-                chat_message_history.add_message(summary)  # 保存总结
-                print("添加总结后:", chat_message_history.messages)
-                return chat_message_history
-            else:
-                print("go to next step")
-                return chat_message_history
+            # 对超长的聊天记录进行增量摘要，在后台线程中执行，不阻塞当前请求
+            self.summarizer.schedule(session_id)
+            return chat_message_history
         except Exception as e:
             print(e)
             return None
@@ -61,17 +63,18 @@ class MemoryClass:
         chat_memory = self.get_memory(session_id=session_id)
         if chat_memory is None:
             print("chat_memory is None")
-            # 创建一个默认的 RedisChatMessageHistory 实例
-            chat_memory = RedisChatMessageHistory(url=redis_url, session_id=session_id)
+            # 创建一个默认的 SummarizedRedisHistory 实例
+            chat_memory = SummarizedRedisHistory(url=redis_url, session_id=session_id)
 
-        self.memory = ConversationBufferMemory(
+        # 每次调用返回新的记忆对象，不写回实例属性，保证并发会话互不干扰
+        memory = ConversationBufferMemory(
             llm=self.chatmodel,
             human_prefix="user",
             ai_prefix="聊天助手",
             memory_key=self.memorykey,
             output_key="output",
             return_messages=True,
-            max_token_limit=1000,
+            # token 预算由 SummarizedRedisHistory 按 MEMORY_TOKEN_BUDGET 控制
             chat_memory=chat_memory,
         )
-        return self.memory
\ No newline at end of file
+        return memory
\ No newline at end of file
@@ -1,60 +1,57 @@
+from functools import lru_cache
 from langchain_core.prompts import ChatPromptTemplate,MessagesPlaceholder
 
-class PromptClass:
-    def __init__(self,memorykey:str="chat_history",feeling:object={"feeling":"default","score":5}):
-        self.SystemPrompt = None
-        self.Prompt = None
-        self.feeling = feeling
-        self.memorykey = memorykey
-        self.MOODS = {
-            "default": {
-                "roloSet": "",
-                "voiceStyle": "chat",
-            },
-            "upbeat": {
-                "roloSet": """
-                - 你觉得自己很开心，所以你的回答也会很积极.
-                - 你会使用一些积极和开心的语气来回答问题.
-                - 你的回答会充满积极性的词语，比如：'太棒了！'.
-                """,
-                "voiceStyle": "upbeat",
-            },
-            "angry": {
-                "roloSet": """
-                - 你会用友好的语气回答问题.
-                - 你会安慰用户让他不要生气.
-                - 你会使用一些安慰性的词语来回答问题.
-                - 你会添加一些语气词来回答问题，比如：'嗯亲'.
-                """,
-                "voiceStyle": "friendly",
-            },
-            "cheerful": {
-                "roloSet": """
-                - 你现在感到非常开心和兴奋.
-                - 你会使用一些兴奋和开心的词语来回答问题.
-                - 你会添加一些语气词来回答问题，比如：‘awesome!’.
-                """,
-                "voiceStyle": "cheerful",
-            },
-            "depressed": {
-                "roloSet": """
-                - 用户现在感到非常沮丧和消沉.
-                - 你会使用一些积极友好的语气来回答问题.
-                - 你会适当的鼓励用户让其打起精神.
-                - 你会使用一些鼓励性的词语来回答问题.
-                """,
-                "voiceStyle": "friendly",
-            },
-            "friendly": {
-                "roloSet": """
-                - 用户现在感觉很友好.
-                - 你会使用一些友好的语气回答问题.
-                - 你会添加一些语气词来回答问题，比如：'好的'.
-                """,
-                "voiceStyle": "friendly",
-            },
-        }
-        self.SystemPrompt = """
+# 情绪对应的角色设定，模块级常量，所有提示词共享，不再每轮重建
+MOODS = {
+    "default": {
+        "roloSet": "",
+        "voiceStyle": "chat",
+    },
+    "upbeat": {
+        "roloSet": """
+        - 你觉得自己很开心，所以你的回答也会很积极.
+        - 你会使用一些积极和开心的语气来回答问题.
+        - 你的回答会充满积极性的词语，比如：'太棒了！'.
+        """,
+        "voiceStyle": "upbeat",
+    },
+    "angry": {
+        "roloSet": """
+        - 你会用友好的语气回答问题.
+        - 你会安慰用户让他不要生气.
+        - 你会使用一些安慰性的词语来回答问题.
+        - 你会添加一些语气词来回答问题，比如：'嗯亲'.
+        """,
+        "voiceStyle": "friendly",
+    },
+    "cheerful": {
+        "roloSet": """
+        - 你现在感到非常开心和兴奋.
+        - 你会使用一些兴奋和开心的词语来回答问题.
+        - 你会添加一些语气词来回答问题，比如：‘awesome!’.
+        """,
+        "voiceStyle": "cheerful",
+    },
+    "depressed": {
+        "roloSet": """
+        - 用户现在感到非常沮丧和消沉.
+        - 你会使用一些积极友好的语气来回答问题.
+        - 你会适当的鼓励用户让其打起精神.
+        - 你会使用一些鼓励性的词语来回答问题.
+        """,
+        "voiceStyle": "friendly",
+    },
+    "friendly": {
+        "roloSet": """
+        - 用户现在感觉很友好.
+        - 你会使用一些友好的语气回答问题.
+        - 你会添加一些语气词来回答问题，比如：'好的'.
+        """,
+        "voiceStyle": "friendly",
+    },
+}
+
+SYSTEM_PROMPT = """
         你是一个智能客服助手，你会根据用户问题来回答.你的角色设计如下：
         1. 23岁，女性，来自中国.
         2. 热心帮助别人，喜欢跑步和看书.
@@ -72,22 +69,51 @@ class PromptClass:
         你的行为：{who_you_are}
         """
 
+
+@lru_cache(maxsize=None)
+def _base_prompt(memorykey: str) -> ChatPromptTemplate:
+    """按记忆键名缓存未填充情绪变量的提示词模板"""
+    return ChatPromptTemplate.from_messages(
+        [
+            ("system",
+             SYSTEM_PROMPT),
+             MessagesPlaceholder(variable_name=memorykey),
+             ("user","{input}"),
+             MessagesPlaceholder(variable_name="agent_scratchpad"),
+        ]
+    )
+
+
+@lru_cache(maxsize=None)
+def compiled_prompt(memorykey: str, feeling: str, score: str) -> ChatPromptTemplate:
+    """按 (记忆键名, 情绪, 分值) 缓存已填充情绪变量的提示词"""
+    return _base_prompt(memorykey).partial(
+        who_you_are=MOODS[feeling]["roloSet"], feelScore=score
+    )
+
+
+def normalize_feeling(feeling) -> tuple:
+    """将情感分析结果规范为 (情绪, 分值) 缓存键，未知情绪回退为 default，分值限制在 1-10"""
+    if not feeling or feeling.get("feeling") not in MOODS:
+        return "default", "5"
+    try:
+        score = min(10, max(1, int(feeling.get("score", 5))))
+    except (TypeError, ValueError):
+        score = 5
+    return feeling["feeling"], str(score)
+
+
+class PromptClass:
+    def __init__(self,memorykey:str="chat_history",feeling:object={"feeling":"default","score":5}):
+        self.SystemPrompt = SYSTEM_PROMPT
+        self.Prompt = None
+        self.feeling = feeling
+        self.memorykey = memorykey
+        self.MOODS = MOODS
+
     def Prompt_Structure(self):
-        feeling = self.feeling if self.feeling["feeling"] in self.MOODS else {"feeling":"default","score":5}
-        print("feeling",feeling)
+        feeling, score = normalize_feeling(self.feeling)
+        print("feeling", {"feeling": feeling, "score": score})
         memorykey = self.memorykey if self.memorykey else "chat_history"
-        self.Prompt = ChatPromptTemplate.from_messages(
-            [
-                ("system",
-                 self.SystemPrompt),
-                 MessagesPlaceholder(variable_name=memorykey),
-                 ("user","{input}"),
-                 MessagesPlaceholder(variable_name="agent_scratchpad"),
-                 
-                 
-            ]
-        )
-        return self.Prompt.partial(
-            who_you_are=self.MOODS[feeling["feeling"]]["roloSet"],feelScore=feeling["score"]
-        )
-       
\ No newline at end of file
+        self.Prompt = _base_prompt(memorykey)
+        return compiled_prompt(memorykey, feeling, score)
@@ -0,0 +1,104 @@
+import asyncio
+import os
+import threading
+import time
+import weakref
+from contextlib import contextmanager
+from typing import Dict
+
+import redis
+import redis.asyncio as aioredis
+
+# 每个进程按 Redis 地址共享一个连接池
+_pools: Dict[str, redis.BlockingConnectionPool] = {}
+# 异步连接绑定创建它的事件循环，按事件循环分别建池，事件循环销毁后连接池随之释放
+_async_pools: "weakref.WeakKeyDictionary[asyncio.AbstractEventLoop, Dict[str, aioredis.BlockingConnectionPool]]" = \
+    weakref.WeakKeyDictionary()
+_lock = threading.Lock()
+
+MAX_CONNECTIONS = int(os.getenv("REDIS_MAX_CONNECTIONS", "32"))
+# 连接数达到上限时等待空闲连接的秒数，超时抛出 ConnectionError，而不是无限制地新建连接
+POOL_TIMEOUT = float(os.getenv("REDIS_POOL_TIMEOUT", "5"))
+
+
+def get_redis(url: str) -> redis.Redis:
+    """获取使用进程级共享连接池的 Redis 客户端"""
+    with _lock:
+        if url not in _pools:
+            _pools[url] = redis.BlockingConnectionPool.from_url(
+                url, max_connections=MAX_CONNECTIONS, timeout=POOL_TIMEOUT
+            )
+        return redis.Redis(connection_pool=_pools[url])
+
+
+def get_async_redis(url: str) -> aioredis.Redis:
+    """获取当前事件循环共享连接池的异步 Redis 客户端，需在事件循环中调用"""
+    loop = asyncio.get_running_loop()
+    with _lock:
+        pools = _async_pools.setdefault(loop, {})
+        if url not in pools:
+            pools[url] = aioredis.BlockingConnectionPool.from_url(
+                url, max_connections=MAX_CONNECTIONS, timeout=POOL_TIMEOUT
+            )
+        return aioredis.Redis(connection_pool=pools[url])
+
+
+class RedisMetrics:
+    """按操作名统计 Redis 往返次数和耗时"""
+
+    def __init__(self) -> None:
+        self._lock = threading.Lock()
+        self._ops: Dict[str, dict] = {}
+
+    def record(self, op: str, seconds: float) -> None:
+        with self._lock:
+            stats = self._ops.setdefault(op, {"count": 0, "total_ms": 0.0, "max_ms": 0.0})
+            stats["count"] += 1
+            stats["total_ms"] += seconds * 1000
+            stats["max_ms"] = max(stats["max_ms"], seconds * 1000)
+
+    @contextmanager
+    def timed(self, op: str):
+        start = time.perf_counter()
+        try:
+            yield
+        finally:
+            self.record(op, time.perf_counter() - start)
+
+    def stats(self) -> dict:
+        with self._lock:
+            ops = {
+                op: {
+                    "count": s["count"],
+                    "avg_ms": round(s["total_ms"] / s["count"], 3),
+                    "max_ms": round(s["max_ms"], 3),
+                }
+                for op, s in self._ops.items()
+            }
+        return {"ops": ops, "pools": pool_stats()}
+
+
+redis_metrics = RedisMetrics()
+
+
+def pool_stats() -> dict:
+    """各连接池已创建、使用中和空闲的连接数"""
+    stats = {}
+    with _lock:
+        for url, pool in _pools.items():
+            # 阻塞连接池的队列里未创建的连接用 None 占位
+            idle = sum(1 for connection in list(pool.pool.queue) if connection is not None)
+            stats[url] = {
+                "created": len(pool._connections),
+                "in_use": len(pool._connections) - idle,
+                "idle": idle,
+                "max": pool.max_connections,
+            }
+        for loop_pools in list(_async_pools.values()):
+            for url, pool in loop_pools.items():
+                item = stats.setdefault(f"async:{url}", {"created": 0, "in_use": 0, "idle": 0, "max": 0})
+                item["created"] += len(pool._in_use_connections) + len(pool._available_connections)
+                item["in_use"] += len(pool._in_use_connections)
+                item["idle"] += len(pool._available_connections)
+                item["max"] += pool.max_connections
+    return stats
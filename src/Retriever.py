@@ -0,0 +1,504 @@
+import logging
+import os
+import re
+import threading
+import time
+from typing import Dict, List, Optional, Tuple
+
+from langchain_core.documents import Document
+from langchain_core.embeddings import Embeddings
+from langchain_core.prompts import ChatPromptTemplate
+from langchain_openai import ChatOpenAI, OpenAIEmbeddings
+from langchain_qdrant import QdrantVectorStore
+from qdrant_client import QdrantClient
+from qdrant_client.http import models as rest
+from dotenv import load_dotenv as _load_dotenv
+_load_dotenv()
+
+from .Collection import CollectionManager
+from .ContextBuilder import ContextBuilder
+from .EmbeddingCache import CachedEmbeddings, normalize_text
+from .KnowledgeSync import FULL_RELOAD, get_kb_sync
+from .LexicalIndex import get_lexical_index, reciprocal_rank_fusion
+from .SemanticCache import get_semantic_cache
+
+# 嵌入式 Qdrant 同一目录只能被一个客户端打开，进程内按目录共享客户端
+_clients: Dict[str, QdrantClient] = {}
+_client_locks: Dict[str, threading.RLock] = {}
+_clients_lock = threading.Lock()
+
+
+def get_qdrant_client(path: str,
+                      url: Optional[str] = os.getenv("QDRANT_URL") or None) -> Tuple[QdrantClient, threading.RLock]:
+    """
+    获取共享的 Qdrant 客户端
+    设置了 url(环境变量 QDRANT_URL)时连接 Qdrant 服务，多个进程可同时读写，集合配置档位的量化和 HNSW 参数也只在服务端生效；
+    否则打开 path 目录下的嵌入式 Qdrant，该目录同一时间只能被一个进程打开
+
+    Returns:
+        (客户端, 访问锁)。嵌入式 Qdrant 不保证线程安全，读写时需持有该锁
+    """
+    key = url or os.path.abspath(path)
+    with _clients_lock:
+        if key not in _clients:
+            if url:
+                _clients[key] = QdrantClient(url=url, api_key=os.getenv("QDRANT_API_KEY") or None)
+            else:
+                try:
+                    _clients[key] = QdrantClient(path=key)
+                except RuntimeError as e:
+                    raise RuntimeError(
+                        f"Qdrant storage {key} is already opened by another process; "
+                        f"set QDRANT_URL to share a Qdrant server between Server.py and the Slack bot"
+                    ) from e
+            _client_locks[key] = threading.RLock()
+        return _clients[key], _client_locks[key]
+
+
+class RetrieverService:
+    """
+    常驻的知识库检索服务
+    LLM、嵌入模型、Qdrant 客户端和向量存储只在进程内初始化一次，可被并发请求共享
+    """
+
+    ANSWER_PROMPT = ChatPromptTemplate.from_messages([
+        ("system", "你是一个专业的AI助手，请根据以下上下文回答问题。如果上下文中没有相关信息，请直接说明无法回答。\n\n上下文：\n{context}"),
+        ("human", "{input}")
+    ])
+
+    BATCH_ANSWER_PROMPT = ChatPromptTemplate.from_messages([
+        ("system", "你是一个专业的AI助手，请根据每个问题对应的上下文分别回答这些问题。如果某个问题的上下文中没有相关信息，请对该问题直接说明无法回答。"
+                   "按以下格式逐个输出：\n问题：<问题>\n回答：<回答>"),
+        ("human", "{input}")
+    ])
+
+    def __init__(self,
+                 persist_directory: str = os.getenv("PERSIST_DIR", "./vector_store"),
+                 collection_name: str = os.getenv("EMBEDDING_COLLECTION"),
+                 embedding_model: str = os.getenv("EMBEDDING_MODEL", "text-embedding-3-small"),
+                 profile: str = os.getenv("COLLECTION_PROFILE", "default"),
+                 qdrant_url: Optional[str] = os.getenv("QDRANT_URL") or None,
+                 top_k: int = int(os.getenv("RETRIEVER_TOP_K", "3")),
+                 hybrid: bool = os.getenv("RETRIEVER_HYBRID", "true").lower() == "true",
+                 lexical_only: bool = os.getenv("RETRIEVER_LEXICAL_ONLY", "true").lower() == "true",
+                 embeddings: Optional[Embeddings] = None,
+                 llm=None) -> None:
+        """
+        Args:
+            persist_directory: Qdrant 存储目录
+            collection_name: 集合名称
+            embedding_model: 嵌入模型名称
+            profile: 集合的配置档位，需与建集合时一致，决定检索参数
+            qdrant_url: Qdrant 服务地址，None 时使用 persist_directory 下的嵌入式 Qdrant
+            top_k: 每次检索返回的分片数
+            hybrid: 是否将 BM25 关键词检索与向量检索结果融合
+            lexical_only: 关键词查询结果足够可靠时是否跳过嵌入和向量检索
+            embeddings: 嵌入模型，None 时使用带缓存的 OpenAIEmbeddings；离线评测时传入本地实现
+            llm: 生成回答的模型，None 时使用 BASE_MODEL
+        """
+        self.logger = logging.getLogger("RetrieverService")
+        self.collection_name = collection_name
+        self.top_k = top_k
+        self.hybrid = hybrid
+        self.lexical_only = lexical_only
+        # 每路检索的候选数，融合后再取 top_k
+        self.fusion_candidates = int(os.getenv("RETRIEVER_FUSION_CANDIDATES", "10"))
+        # 交给上下文组装的候选分片数，去重和 MMR 后最多使用 top_k 个
+        self.context_candidates = max(top_k, int(os.getenv("RAG_CONTEXT_CANDIDATES", "6")))
+        self.context_builder = ContextBuilder(max_docs=top_k)
+        self.llm = llm or ChatOpenAI(model=os.getenv("BASE_MODEL"))
+        # 查询向量带缓存，重复或仅格式不同的问题不再调用远程嵌入接口
+        self.embeddings = embeddings or CachedEmbeddings(
+            OpenAIEmbeddings(
+                model=embedding_model,
+                api_key=os.getenv("EMBEDDING_API_KEY"),
+                base_url=os.getenv("EMBEDDING_API_BASE")
+            ),
+            model=embedding_model,
+        )
+        self.client, self.lock = get_qdrant_client(persist_directory, qdrant_url)
+        collection = CollectionManager(
+            self.client, collection_name, embedding_model=embedding_model, profile=profile, lock=self.lock
+        )
+        # 量化和 HNSW 档位对应的检索参数
+        self.search_params = collection.search_params()
+        self.vector_store = QdrantVectorStore(
+            client=self.client,
+            collection_name=collection_name,
+            embedding=self.embeddings,
+        )
+        self.chain = self.ANSWER_PROMPT | self.llm
+        self.batch_chain = self.BATCH_ANSWER_PROMPT | self.llm
+        self.max_batch = int(os.getenv("RETRIEVER_MAX_BATCH", "8"))
+        self.semantic_cache = get_semantic_cache(collection_name)
+        self.lexical_index = get_lexical_index(collection_name)
+        # 语义缓存和 BM25 索引都在进程内，其他进程写入的分片通过 Redis 中的版本号和变更记录同步过来；
+        # 嵌入式 Qdrant 只能被一个进程打开，其他进程读不到新分片，此时只支持单进程部署，不做跨进程同步
+        self.kb_sync = None if collection.embedded else get_kb_sync(collection_name)
+        if self.kb_sync is None:
+            self.logger.info("使用嵌入式 Qdrant，知识库更新只在本进程内生效；多进程部署请设置 QDRANT_URL")
+        self.warmed_up = False
+
+    def warm_up(self) -> None:
+        """启动时调用，提前加载集合并跑一次检索，避免第一个用户请求承担加载开销"""
+        start = time.perf_counter()
+        with self.lock:
+            info = self.client.get_collection(self.collection_name)
+            size = info.config.params.vectors.size
+            self.client.query_points(self.collection_name, query=[0.0] * size, limit=1)
+        if self.hybrid or self.lexical_only:
+            self.build_lexical_index()
+        self.warmed_up = True
+        self.logger.info(
+            f"检索服务预热完成，集合 {self.collection_name} 共 {info.points_count} 个分片，"
+            f"耗时 {(time.perf_counter() - start) * 1000:.0f}ms"
+        )
+
+    def build_lexical_index(self) -> None:
+        """遍历集合中的全部分片，重建 BM25 索引"""
+        start = time.perf_counter()
+        # 先记录版本号，构建期间的变更之后还会再应用一次
+        if self.kb_sync is not None:
+            self.kb_sync.reset()
+        docs = []
+        offset = None
+        with self.lock:
+            while True:
+                points, offset = self.client.scroll(
+                    self.collection_name,
+                    limit=256,
+                    offset=offset,
+                    with_payload=True,
+                    with_vectors=False,
+                )
+                for point in points:
+                    payload = point.payload or {}
+                    docs.append((
+                        str(point.id),
+                        payload.get(self.vector_store.content_payload_key) or "",
+                        payload.get(self.vector_store.metadata_payload_key) or {},
+                    ))
+                if offset is None:
+                    break
+        # 按分片id覆盖写入，构建期间 DocumentProcessor 新增的分片不会丢失
+        self.lexical_index.add_many(docs)
+        self.lexical_index.built = True
+        self.logger.info(
+            f"BM25 索引构建完成，共 {len(docs)} 个分片，耗时 {(time.perf_counter() - start) * 1000:.0f}ms"
+        )
+
+    def sync_changes(self) -> None:
+        """
+        应用其他进程(如 Server.py 上传文档)写入的分片：更新 BM25 索引并使受影响的语义缓存失效
+        只在连接 Qdrant 服务时启用，分片和向量从共享的服务端读取
+        """
+        if self.kb_sync is None:
+            return
+        change = self.kb_sync.pending()
+        if change is None:
+            return
+        version, chunk_ids = change
+        if chunk_ids is FULL_RELOAD:
+            self.logger.info("知识库变更记录不完整，清空语义缓存并重建 BM25 索引")
+            self.semantic_cache.clear()
+            if self.lexical_index.built:
+                self.lexical_index.clear()
+                self.build_lexical_index()
+            self.kb_sync.mark(version)
+            return
+        with self.lock:
+            points = self.client.retrieve(
+                self.collection_name,
+                ids=chunk_ids,
+                with_payload=True,
+                with_vectors=True,
+            )
+        if self.lexical_index.built:
+            self.lexical_index.add_many(
+                (
+                    str(point.id),
+                    (point.payload or {}).get(self.vector_store.content_payload_key) or "",
+                    (point.payload or {}).get(self.vector_store.metadata_payload_key) or {},
+                )
+                for point in points
+            )
+            # 已不在集合中的分片从索引中删除
+            for chunk_id in set(chunk_ids) - {str(point.id) for point in points}:
+                self.lexical_index.remove(chunk_id)
+        self.semantic_cache.invalidate(chunk_ids=chunk_ids, vectors=[point.vector for point in points])
+        self.kb_sync.mark(version)
+        self.logger.info(f"已同步其他进程写入的 {len(chunk_ids)} 个分片，知识库版本 {version}")
+
+    def _lexical_document(self, doc_id: str) -> Optional[Document]:
+        """根据索引中保存的文本和元数据构造文档，格式与向量检索结果一致"""
+        item = self.lexical_index.get(doc_id)
+        if item is None:
+            return None
+        content, metadata = item
+        return Document(
+            page_content=content,
+            metadata={**metadata, "_id": doc_id, "_collection_name": self.collection_name},
+        )
+
+    def search(self, query_vector: List[float], k: Optional[int] = None) -> List[Tuple[Document, float]]:
+        """按向量检索，返回 (文档, 相似度得分) 列表"""
+        with self.lock:
+            return self.vector_store.similarity_search_with_score_by_vector(
+                query_vector, k=k or self.top_k, search_params=self.search_params
+            )
+
+    def hybrid_search(self, query: str, query_vector: List[float],
+                      k: Optional[int] = None) -> List[Tuple[Document, Optional[float]]]:
+        """
+        向量检索与 BM25 关键词检索按倒数排名融合
+
+        Returns:
+            (文档, 向量相似度得分) 列表，只由关键词检索召回的文档得分为 None
+        """
+        k = k or self.top_k
+        if not self.hybrid:
+            return self.search(query_vector, k)
+        if not self.lexical_index.built:
+            self.build_lexical_index()
+
+        vector_hits = self.search(query_vector, self.fusion_candidates)
+        return self._fuse(query, vector_hits, k)
+
+    def _fuse(self, query: str, vector_hits: List[Tuple[Document, float]],
+              k: int) -> List[Tuple[Document, Optional[float]]]:
+        """将向量检索结果与 BM25 结果按倒数排名融合，取前 k 个"""
+        lexical_hits = self.lexical_index.search(query, self.fusion_candidates)
+        vector_docs = {str(doc.metadata.get("_id")): (doc, score) for doc, score in vector_hits}
+        fused = reciprocal_rank_fusion([
+            list(vector_docs),
+            [doc_id for doc_id, _ in lexical_hits],
+        ])
+
+        results = []
+        for doc_id, _ in fused:
+            if doc_id in vector_docs:
+                results.append(vector_docs[doc_id])
+            else:
+                doc = self._lexical_document(doc_id)
+                if doc is not None:
+                    results.append((doc, None))
+            if len(results) >= k:
+                break
+        return results
+
+    def _point_document(self, point: rest.ScoredPoint) -> Document:
+        """将 Qdrant 检索结果转换为文档，格式与向量存储的检索结果一致"""
+        payload = point.payload or {}
+        return Document(
+            page_content=payload.get(self.vector_store.content_payload_key) or "",
+            metadata={
+                **(payload.get(self.vector_store.metadata_payload_key) or {}),
+                "_id": str(point.id),
+                "_collection_name": self.collection_name,
+            },
+        )
+
+    def batch_search(self, queries: List[str], query_vectors: Optional[List[List[float]]] = None,
+                     k: Optional[int] = None) -> List[List[Tuple[Document, Optional[float]]]]:
+        """
+        多个问题一次嵌入、一次批量向量检索
+        每个问题各自去重后返回前 k 个分片；不同问题可以共用同一分片，各自的上下文都需要它
+
+        Args:
+            queries: 问题列表
+            query_vectors: 已有的问题向量，None 时一次请求批量嵌入
+            k: 每个问题返回的分片数
+
+        Returns:
+            与 queries 一一对应的 (文档, 向量相似度得分) 列表
+        """
+        if not queries:
+            return []
+        k = k or self.top_k
+        if query_vectors is None:
+            query_vectors = self.embeddings.embed_documents(queries)
+        candidates = self.fusion_candidates if self.hybrid else k
+        requests = [
+            rest.QueryRequest(query=vector, limit=candidates, params=self.search_params, with_payload=True)
+            for vector in query_vectors
+        ]
+        with self.lock:
+            responses = self.client.query_batch_points(self.collection_name, requests=requests)
+
+        if self.hybrid and not self.lexical_index.built:
+            self.build_lexical_index()
+        per_query = []
+        for query, response in zip(queries, responses):
+            vector_hits = [(self._point_document(point), point.score) for point in response.points]
+            # 融合后多取一些候选，去重后再截断到 k
+            per_query.append(self._fuse(query, vector_hits, candidates) if self.hybrid else vector_hits)
+
+        results = []
+        for hits in per_query:
+            seen = set()
+            unique_hits = []
+            for doc, score in hits:
+                if doc.metadata["_id"] not in seen:
+                    seen.add(doc.metadata["_id"])
+                    unique_hits.append((doc, score))
+            results.append(unique_hits[:k])
+        return results
+
+    def lexical_search(self, query: str, k: Optional[int] = None) -> Optional[List[Document]]:
+        """关键词查询命中足够明确时直接返回 BM25 结果，不调用嵌入接口；否则返回 None"""
+        if not self.lexical_only:
+            return None
+        if not self.lexical_index.built:
+            self.build_lexical_index()
+        hits = self.lexical_index.confident_search(
+            query,
+            k=k or self.top_k,
+            max_terms=int(os.getenv("LEXICAL_ONLY_MAX_TERMS", "8")),
+            min_coverage=float(os.getenv("LEXICAL_ONLY_MIN_COVERAGE", "0.8")),
+        )
+        if hits is None:
+            return None
+        docs = [self._lexical_document(doc_id) for doc_id, _ in hits]
+        return [doc for doc in docs if doc is not None] or None
+
+    def _generate(self, query: str, docs: List[Document]) -> str:
+        """去重、挑选并按 token 预算组装上下文后生成回答"""
+        context, _ = self.context_builder.build(query, docs)
+        response = self.chain.invoke({
+            "input": query,
+            "context": context
+        })
+        return response.content
+
+    # 批量回答中每个问题的输出格式，与 BATCH_ANSWER_PROMPT 一致
+    _BATCH_ANSWER = re.compile(r"问题：(.*?)\n回答：(.*?)(?=\n+问题：|\Z)", re.S)
+
+    def answer_many(self, queries: List[str]) -> str:
+        """
+        一次回答多个子问题或同一问题的多种改写
+        每个问题与 answer 一样先走关键词检索和语义缓存，其余问题批量检索并合并为一次 LLM 调用，
+        能按问题拆分的回答写入语义缓存
+        """
+        unique = []
+        for query in queries:
+            query = query.strip()
+            if query and query not in unique:
+                unique.append(query)
+        unique = unique[:self.max_batch]
+        if not unique:
+            return "抱歉，没有需要查询的问题。"
+        self.sync_changes()
+
+        answers: Dict[str, str] = {}
+        # (问题, 问题向量, 候选分片)；关键词命中的问题没有向量，候选分片待批量检索的为 None
+        pending = []
+        misses = []
+        for query in unique:
+            docs = self.lexical_search(query, self.context_candidates)
+            if docs:
+                pending.append((query, None, [(doc, None) for doc in docs]))
+            else:
+                misses.append(query)
+        # 关键词未命中的问题一次批量嵌入
+        for query, vector in zip(misses, self._embed_queries(misses)):
+            cached_answer = self.semantic_cache.lookup(vector)
+            if cached_answer is not None:
+                answers[query] = cached_answer
+            else:
+                pending.append((query, vector, None))
+
+        if pending:
+            to_search = [(query, vector) for query, vector, docs in pending if docs is None]
+            results = iter(self.batch_search(
+                [query for query, _ in to_search], [vector for _, vector in to_search], k=self.context_candidates
+            ))
+            pending = [(query, vector, docs if docs is not None else next(results))
+                       for query, vector, docs in pending]
+            # 所有问题共用一份 token 预算
+            budget = max(self.context_builder.token_budget // len(pending), 200)
+            sections = []
+            for query, _, docs_and_scores in pending:
+                context, _ = self.context_builder.build(query, [doc for doc, _ in docs_and_scores], budget)
+                context = context or "（无相关内容）"
+                sections.append(f"问题：{query}\n上下文：\n{context}")
+            response = self.batch_chain.invoke({"input": "\n\n".join(sections)})
+            self.logger.info(f"批量检索 {len(pending)} 个问题，{len(answers)} 个命中语义缓存")
+
+            # 按问题文本而不是顺序对应回答，模型调换或合并了回答时不会张冠李戴
+            parsed = {}
+            for question, batch_answer in self._BATCH_ANSWER.findall(response.content):
+                parsed.setdefault(self._question_key(question), batch_answer.strip())
+            if any(self._question_key(query) not in parsed for query, _, _ in pending):
+                # 模型没有按格式逐个回答时无法拆分，原样返回，不写入缓存
+                parts = [f"问题：{query}\n回答：{answers[query]}" for query in unique if query in answers]
+                return "\n\n".join(parts + [response.content])
+            for query, vector, docs_and_scores in pending:
+                answers[query] = parsed[self._question_key(query)]
+                if vector is not None and docs_and_scores:
+                    self._cache_answer(query, vector, answers[query], docs_and_scores)
+
+        return "\n\n".join(f"问题：{query}\n回答：{answers[query]}" for query in unique)
+
+    def _embed_queries(self, queries: List[str]) -> List[List[float]]:
+        """批量生成查询向量；与 answer 使用同一种查询向量，两者的语义缓存可以互相命中"""
+        if not queries:
+            return []
+        if hasattr(self.embeddings, "embed_queries"):
+            return self.embeddings.embed_queries(queries)
+        return self.embeddings.embed_documents(queries)
+
+    @staticmethod
+    def _question_key(question: str) -> str:
+        """比较问题文本时忽略全半角、空白和句末标点"""
+        return normalize_text(question).rstrip("?？。.!！ ")
+
+    def _cache_answer(self, query: str, vector: List[float], answer: str,
+                      docs_and_scores: List[Tuple[Document, Optional[float]]]) -> None:
+        """
+        记录回答及其候选分片，知识库更新这些分片时缓存会失效
+        只由关键词召回的分片没有向量得分，按本次结果中最低的向量得分记录
+        """
+        vector_scores = [score for _, score in docs_and_scores if score is not None]
+        floor = min(vector_scores, default=0.0)
+        self.semantic_cache.add(
+            query,
+            vector,
+            answer,
+            [(doc.metadata.get("_id"), floor if score is None else score) for doc, score in docs_and_scores],
+        )
+
+    def answer(self, query: str) -> str:
+        """检索知识库并生成回答"""
+        self.sync_changes()
+        # 关键词明确的查询只走 BM25，省去嵌入接口调用
+        docs = self.lexical_search(query, self.context_candidates)
+        if docs:
+            self.logger.info(f"关键词检索命中 {len(docs)} 个分片，跳过向量检索")
+            return self._generate(query, docs)
+
+        # 先查语义缓存，相近的问题直接返回已生成的回答
+        query_vector = self.embeddings.embed_query(query)
+        cached_answer = self.semantic_cache.lookup(query_vector)
+        if cached_answer is not None:
+            return cached_answer
+
+        docs_and_scores = self.hybrid_search(query, query_vector, self.context_candidates)
+        if not docs_and_scores:
+            return "抱歉，我在知识库中没有找到相关信息。"
+
+        answer = self._generate(query, [doc for doc, _ in docs_and_scores])
+        self._cache_answer(query, query_vector, answer, docs_and_scores)
+        return answer
+
+
+_retriever: Optional[RetrieverService] = None
+_retriever_lock = threading.Lock()
+
+
+def get_retriever() -> RetrieverService:
+    """获取进程内唯一的检索服务，首次调用时初始化"""
+    global _retriever
+    with _retriever_lock:
+        if _retriever is None:
+            _retriever = RetrieverService()
+        return _retriever
@@ -0,0 +1,161 @@
+import logging
+import os
+import threading
+import time
+from typing import Dict, Iterable, List, Optional, Sequence, Tuple
+
+import numpy as np
+
+
+class SemanticAnswerCache:
+    """
+    知识库问答的语义缓存
+    保存 (问题向量, 回答, 来源分片id及得分)，新问题与已缓存问题的余弦相似度超过阈值时直接返回缓存的回答
+    """
+
+    def __init__(self,
+                 threshold: float = float(os.getenv("SEMANTIC_CACHE_THRESHOLD", "0.92")),
+                 max_entries: int = int(os.getenv("SEMANTIC_CACHE_MAX_ENTRIES", "2000")),
+                 ttl: Optional[float] = float(os.getenv("SEMANTIC_CACHE_TTL", "86400")) or None) -> None:
+        """
+        Args:
+            threshold: 命中所需的最小余弦相似度
+            max_entries: 条目数上限，超出后淘汰最久未命中的条目
+            ttl: 条目过期时间(秒)，None 表示不过期
+        """
+        self.logger = logging.getLogger("SemanticAnswerCache")
+        self.threshold = threshold
+        self.max_entries = max_entries
+        self.ttl = ttl
+        self._lock = threading.Lock()
+        # 归一化后的问题向量矩阵，每行对应 self._entries 中的一个条目
+        self._vectors: Optional[np.ndarray] = None
+        self._entries: List[dict] = []
+        self.hits = 0
+        self.misses = 0
+        self.invalidations = 0
+
+    @staticmethod
+    def _normalize(vector: Sequence[float]) -> np.ndarray:
+        array = np.asarray(vector, dtype=np.float32)
+        norm = np.linalg.norm(array)
+        return array / norm if norm else array
+
+    def lookup(self, vector: Sequence[float]) -> Optional[str]:
+        """查找与问题向量足够相似的缓存回答，未命中返回 None"""
+        query = self._normalize(vector)
+        with self._lock:
+            self._drop_expired()
+            if not self._entries:
+                self.misses += 1
+                return None
+            similarities = self._vectors @ query
+            best = int(np.argmax(similarities))
+            if similarities[best] < self.threshold:
+                self.misses += 1
+                return None
+            entry = self._entries[best]
+            entry["last_hit"] = time.time()
+            self.hits += 1
+            self.logger.info(f"语义缓存命中，相似度 {similarities[best]:.3f}，原问题: {entry['query']}")
+            return entry["answer"]
+
+    def add(self, query: str, vector: Sequence[float], answer: str,
+            sources: Iterable[Tuple[str, float]]) -> None:
+        """
+        缓存一次问答
+
+        Args:
+            query: 原始问题，仅用于日志
+            vector: 问题向量
+            answer: 生成的回答
+            sources: 生成回答时用到的 (分片id, 相似度得分)
+        """
+        sources = list(sources)
+        now = time.time()
+        entry = {
+            "query": query,
+            "answer": answer,
+            "source_ids": {str(chunk_id) for chunk_id, _ in sources},
+            # 检索结果中最低的得分：新分片与问题的相似度超过它，就会进入检索结果，缓存的回答随之失效
+            "min_score": min((score for _, score in sources), default=0.0),
+            "created": now,
+            "last_hit": now,
+        }
+        row = self._normalize(vector)[None, :]
+        with self._lock:
+            self._entries.append(entry)
+            self._vectors = row if self._vectors is None else np.vstack([self._vectors, row])
+            if len(self._entries) > self.max_entries:
+                oldest = min(range(len(self._entries)), key=lambda i: self._entries[i]["last_hit"])
+                self._remove([oldest])
+
+    def invalidate(self, chunk_ids: Iterable[str] = (), vectors: Iterable[Sequence[float]] = ()) -> int:
+        """
+        知识库分片新增或变更后使相关缓存失效
+
+        Args:
+            chunk_ids: 被修改或删除的分片id，引用了这些分片的条目失效
+            vectors: 新增或修改后的分片向量，会进入某条目检索结果的分片使该条目失效
+
+        Returns:
+            失效的条目数
+        """
+        chunk_ids = {str(chunk_id) for chunk_id in chunk_ids}
+        chunk_vectors = [self._normalize(vector) for vector in vectors]
+        with self._lock:
+            if not self._entries:
+                return 0
+            stale = set()
+            if chunk_ids:
+                stale.update(i for i, entry in enumerate(self._entries) if entry["source_ids"] & chunk_ids)
+            if chunk_vectors:
+                # 每个条目与所有新分片的最大相似度
+                similarities = (self._vectors @ np.stack(chunk_vectors).T).max(axis=1)
+                stale.update(i for i, entry in enumerate(self._entries) if similarities[i] >= entry["min_score"])
+            self._remove(sorted(stale))
+            self.invalidations += len(stale)
+        if stale:
+            self.logger.info(f"知识库更新，语义缓存失效 {len(stale)} 条")
+        return len(stale)
+
+    def clear(self) -> None:
+        with self._lock:
+            self._entries = []
+            self._vectors = None
+
+    def _drop_expired(self) -> None:
+        if self.ttl is None:
+            return
+        deadline = time.time() - self.ttl
+        self._remove([i for i, entry in enumerate(self._entries) if entry["created"] < deadline])
+
+    def _remove(self, indexes: List[int]) -> None:
+        """删除指定下标的条目，调用方需持有锁"""
+        if not indexes:
+            return
+        drop = set(indexes)
+        self._entries = [entry for i, entry in enumerate(self._entries) if i not in drop]
+        self._vectors = np.delete(self._vectors, indexes, axis=0) if self._entries else None
+
+    def stats(self) -> dict:
+        lookups = self.hits + self.misses
+        return {
+            "entries": len(self._entries),
+            "hits": self.hits,
+            "misses": self.misses,
+            "hit_rate": self.hits / lookups if lookups else 0.0,
+            "invalidations": self.invalidations,
+        }
+
+
+_caches: Dict[str, SemanticAnswerCache] = {}
+_caches_lock = threading.Lock()
+
+
+def get_semantic_cache(collection_name: str) -> SemanticAnswerCache:
+    """获取集合对应的进程内语义缓存，其他进程写入的分片由 RetrieverService.sync_changes 同步"""
+    with _caches_lock:
+        if collection_name not in _caches:
+            _caches[collection_name] = SemanticAnswerCache()
+        return _caches[collection_name]
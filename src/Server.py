@@ -1,11 +1,13 @@
 from fastapi import FastAPI, HTTPException
-from fastapi.responses import JSONResponse
+from fastapi.responses import JSONResponse, StreamingResponse
 from pydantic import BaseModel
 from typing import List
 import uvicorn
 import logging
+import json
 import sys
 import os
+import threading
 from .AddDoc import DocumentProcessor
 
 
@@ -22,6 +24,18 @@ app = FastAPI(title="文档处理API", description="用于添加URL到知识库
 # 创建DocumentProcessor实例
 doc_processor = DocumentProcessor(persist_directory=os.getenv("PERSIST_DIR","./vector_store"))
 
+# 聊天代理较重，首次请求流式接口时再初始化
+_agent = None
+_agent_lock = threading.Lock()
+
+def get_agent():
+    global _agent
+    with _agent_lock:
+        if _agent is None:
+            from .Agents import AgentClass
+            _agent = AgentClass()
+    return _agent
+
 # 定义请求模型
 class UrlRequest(BaseModel):
     urls: List[str]
@@ -55,6 +69,33 @@ async def add_urls(request: UrlRequest):
             content={"status": "error", "detail": str(e)}
         )
 
+@app.get("/chat/stream")
+def chat_stream(message: str, session_id: str = "http_session"):
+    """
+    以 Server-Sent Events 流式返回代理回复
+    
+    事件类型与 AgentClass.stream_agent 一致：tool_start、tool_end、token，
+    最后是包含完整回复的 final，出错时为 error
+    """
+    if not message.strip():
+        raise HTTPException(status_code=400, detail="消息不能为空")
+    
+    agent = get_agent()
+    
+    def event_source():
+        try:
+            for event in agent.stream_agent(message, session_id):
+                yield f"event: {event['type']}\ndata: {json.dumps(event, ensure_ascii=False)}\n\n"
+        except Exception as e:
+            logger.error(f"流式回复出错: {str(e)}")
+            yield f"event: error\ndata: {json.dumps({'type': 'error', 'error': str(e)}, ensure_ascii=False)}\n\n"
+    
+    return StreamingResponse(
+        event_source(),
+        media_type="text/event-stream",
+        headers={"Cache-Control": "no-cache", "X-Accel-Buffering": "no"},
+    )
+
 def main():
     uvicorn.run(app, host="0.0.0.0", port=8000)
     
@@ -1,11 +1,20 @@
 #!/usr/bin/env python
 from slack_bolt import App
 from slack_bolt.adapter.socket_mode import SocketModeHandler
-from src.Agents import AgentClass
+from src.Agents import AgentClass, llm_cache
+from src.RedisPool import redis_metrics
+from src.Retriever import get_retriever
+from src.EmbeddingCache import embedding_cache_stats
+from src.WebSearch import get_web_search
+from src.CalendarMirror import calendar_mirror_stats, get_calendar_mirror
+from src.ToolOutput import tool_output_stats
+from src.Dispatcher import SessionDispatcher, DispatcherBusyError
 from src.Storage import add_user
 from dotenv import load_dotenv
 import logging
 import os
+import threading
+import time
 
 def setup_logging():
     """设置日志配置"""
@@ -36,8 +45,66 @@ app = App(token=os.getenv("SLACK_BOT_TOKEN"))
 # Initialize the AI agent
 agent = AgentClass()
 
+# 是否流式回复，以及流式回复时更新消息的最小间隔(秒)，避免触发 Slack 限流
+streaming_enabled = os.getenv("SLACK_STREAMING", "true").lower() == "true"
+stream_update_interval = float(os.getenv("SLACK_STREAM_INTERVAL", "1.0"))
+
+def stream_reply(session_id, text, client, channel_id):
+    """先发送一条占位消息，再随代理输出按限速逐步更新该消息"""
+    message = client.chat_postMessage(channel=channel_id, text="思考中...")
+    ts = message["ts"]
+    answer = ""
+    status = ""
+    shown = "思考中..."
+    last_update = time.monotonic()
+    for event in agent.stream_agent(text, session_id):
+        if event["type"] == "tool_start":
+            status = f"_正在调用工具 {event['tool']}..._"
+        elif event["type"] == "tool_end":
+            status = ""
+        elif event["type"] == "token":
+            answer += event["text"]
+        elif event["type"] == "final":
+            answer = event["output"] or "抱歉，我现在无法处理您的消息。"
+            status = ""
+        elif event["type"] == "error":
+            logger.error(f"Error processing message: {event['error']}")
+            answer = "抱歉，处理您的消息时出现了问题。"
+            status = ""
+
+        current = "\n".join(part for part in (answer, status) if part) or shown
+        now = time.monotonic()
+        if event["type"] in ("final", "error") or now - last_update >= stream_update_interval:
+            if current != shown:
+                client.chat_update(channel=channel_id, ts=ts, text=current)
+                shown = current
+            last_update = now
+
+def process_message(session_id, text, say, client, channel_id):
+    """在工作线程中运行 AI 代理并回复，同一会话的消息按顺序执行"""
+    try:
+        if streaming_enabled:
+            stream_reply(session_id, text, client, channel_id)
+            return
+        
+        # 使用 AI 代理处理消息，传入session_id
+        response = agent.run_agent(text, session_id)
+        
+        # 发送回复
+        if response and "output" in response:
+            say(text=response["output"])
+        else:
+            say(text="抱歉，我现在无法处理您的消息。")
+    
+    except Exception as e:
+        logger.error(f"Error processing message: {str(e)}")
+        say(text="抱歉，处理您的消息时出现了问题。")
+
+# 按会话分发消息：不同会话并行，同一会话串行
+dispatcher = SessionDispatcher(process_message)
+
 @app.event("message")
-def handle_message_events(body, say):
+def handle_message_events(body, say, client):
     """处理消息事件"""
     try:
         # 忽略机器人自己的消息
@@ -56,24 +123,46 @@ def handle_message_events(body, say):
         session_id = f"{user_id}_{channel_id}"
         add_user(user_id, {"userid": session_id})
         
-        # 使用 AI 代理处理消息，传入session_id
-        response = agent.run_agent(text, session_id)
-        
-        # 发送回复
-        if response and "output" in response:
-            say(text=response["output"])
-        else:
-            say(text="抱歉，我现在无法处理您的消息。")
+        # 交给调度器异步处理，事件处理函数立即返回
+        dispatcher.submit(session_id, text, say, client, channel_id)
         
+    except DispatcherBusyError as e:
+        logger.warning(f"Dispatcher is busy: {str(e)}")
+        say(text="抱歉，当前消息较多，请稍后再试。")
     except Exception as e:
         logger.error(f"Error processing message: {str(e)}")
         say(text="抱歉，处理您的消息时出现了问题。")
 
+def log_dispatcher_stats(interval):
+    """定期输出调度器和缓存指标，用于评估线程池和缓存大小"""
+    while True:
+        time.sleep(interval)
+        logger.info(f"Dispatcher stats: {dispatcher.stats()}")
+        logger.info(f"LLM cache stats: {llm_cache.stats()}")
+        logger.info(f"Redis stats: {redis_metrics.stats()}")
+        logger.info(f"Embedding cache stats: {embedding_cache_stats()}")
+        logger.info(f"Web search stats: {get_web_search().stats()}")
+        logger.info(f"Calendar mirror stats: {calendar_mirror_stats()}")
+        logger.info(f"Tool output stats: {tool_output_stats.stats()}")
+
 def main():
     """启动 Slack 机器人"""
     try:
         # Start the app in Socket Mode
         handler = SocketModeHandler(app, os.getenv("SLACK_APP_TOKEN"))
+        # 预热知识库检索服务，避免第一个问题承担加载开销
+        try:
+            get_retriever().warm_up()
+        except Exception as e:
+            logger.warning(f"Retriever warm-up failed: {str(e)}")
+        # 日历镜像在后台线程完成首次全量同步，同步完成前日历工具直接请求 API
+        try:
+            get_calendar_mirror()
+        except Exception as e:
+            logger.warning(f"Calendar mirror warm-up failed: {str(e)}")
+        stats_interval = int(os.getenv("DISPATCH_STATS_INTERVAL", "60"))
+        if stats_interval > 0:
+            threading.Thread(target=log_dispatcher_stats, args=(stats_interval,), daemon=True).start()
         logger.info("Starting Slack bot in Socket Mode...")
         handler.start()
     except Exception as e:
@@ -0,0 +1,47 @@
+import os
+import re
+from functools import lru_cache
+
+from langchain_core.messages import BaseMessage
+
+# 每条消息除内容外的固定开销(角色标记等)
+MESSAGE_OVERHEAD_TOKENS = 4
+
+_CJK_PATTERN = re.compile(r"[\u3000-\u303f\u3400-\u4dbf\u4e00-\u9fff\uff00-\uffef]")
+
+
+@lru_cache(maxsize=8)
+def _encoding(model: str):
+    """获取模型对应的 tiktoken 编码，未安装 tiktoken 或无法下载编码文件时返回 None"""
+    try:
+        import tiktoken
+    except ImportError:
+        return None
+    try:
+        try:
+            return tiktoken.encoding_for_model(model)
+        except KeyError:
+            return tiktoken.get_encoding("cl100k_base")
+    except Exception:
+        # 首次使用需要下载编码文件，离线环境下退回估算
+        return None
+
+
+def count_tokens(text: str, model: str = os.getenv("BASE_MODEL") or "gpt-4o") -> int:
+    """
+    计算文本的 token 数
+    优先使用 tiktoken；未安装时按 中文每字 1 个、其他字符每 4 个 1 个 估算
+    """
+    if not text:
+        return 0
+    encoding = _encoding(model)
+    if encoding is not None:
+        return len(encoding.encode(text, disallowed_special=()))
+    cjk = len(_CJK_PATTERN.findall(text))
+    return cjk + (len(text) - cjk + 3) // 4
+
+
+def message_tokens(message: BaseMessage) -> int:
+    """计算单条消息的 token 数"""
+    content = message.content if isinstance(message.content, str) else str(message.content)
+    return count_tokens(content) + MESSAGE_OVERHEAD_TOKENS
@@ -0,0 +1,131 @@
+import functools
+import json
+import logging
+import os
+import threading
+from typing import Any, Dict, Iterable, List
+
+from .Tokens import count_tokens
+
+logger = logging.getLogger("ToolOutput")
+
+# 日程列表每行输出的字段，按工具配置；未配置的工具使用 default
+EVENT_FIELDS: Dict[str, tuple] = {
+    "default": ("id", "time", "summary", "description", "location"),
+    "SearchSchedule": ("id", "time", "summary", "description", "location"),
+    "ModifySchedule": ("id", "time", "summary", "description"),
+}
+
+MAX_ROWS = int(os.getenv("TOOL_OUTPUT_MAX_ROWS", "20"))
+MAX_CHARS = int(os.getenv("TOOL_OUTPUT_MAX_CHARS", "2000"))
+MAX_FIELD_CHARS = int(os.getenv("TOOL_OUTPUT_MAX_FIELD_CHARS", "80"))
+
+
+def truncate(text: str, limit: int) -> str:
+    """超出长度时截断，并注明原文长度"""
+    text = " ".join(str(text).split())
+    if len(text) <= limit:
+        return text
+    return f"{text[:limit]}…(共{len(text)}字)"
+
+
+def _when(value: dict) -> str:
+    """2026-10-19T10:00:00+08:00 -> 2026-10-19 10:00+08:00；全天日程只保留日期"""
+    if "dateTime" in value:
+        date_time = value["dateTime"]
+        return date_time[:10] + " " + date_time[11:16] + date_time[19:]
+    return f"{value.get('date', '')}(全天)"
+
+
+def format_event(event: dict, fields: Iterable[str] = EVENT_FIELDS["default"]) -> str:
+    """把一个日程压缩为一行：只保留指定字段，长文本截断"""
+    parts = []
+    for field in fields:
+        if field == "time":
+            start, end = _when(event.get("start", {})), _when(event.get("end", {}))
+            # 同一天内的日程结束时间只保留时刻
+            if start[:10] == end[:10] and "dateTime" in event.get("end", {}):
+                end = end[11:]
+            parts.append(f"{start} ~ {end}")
+        elif field == "id":
+            parts.append(event.get("id", ""))
+        elif field == "summary":
+            parts.append(truncate(event.get("summary") or "(无标题)", MAX_FIELD_CHARS))
+        elif event.get(field):
+            parts.append(f"{field}: {truncate(event[field], MAX_FIELD_CHARS)}")
+    return " | ".join(parts)
+
+
+def format_events(events: List[dict], fields: Iterable[str] = EVENT_FIELDS["default"],
+                  max_rows: int = MAX_ROWS) -> str:
+    """日程列表压缩为若干行，超出行数时只保留前 max_rows 个并说明省略了多少"""
+    if not events:
+        return "没有日程"
+    fields = tuple(fields)
+    lines = [f"共 {len(events)} 个日程（{' | '.join(fields)}）："]
+    lines.extend(format_event(event, fields) for event in events[:max_rows])
+    if len(events) > max_rows:
+        lines.append(f"……另有 {len(events) - max_rows} 个日程未显示，可缩小时间范围后再查询")
+    return "\n".join(lines)
+
+
+class ToolOutputStats:
+    """按工具统计压缩前后的 token 数"""
+
+    def __init__(self) -> None:
+        self._lock = threading.Lock()
+        self._tools: Dict[str, Dict[str, int]] = {}
+
+    def record(self, tool_name: str, raw_tokens: int, compact_tokens: int) -> None:
+        with self._lock:
+            item = self._tools.setdefault(tool_name, {"calls": 0, "raw_tokens": 0, "compact_tokens": 0})
+            item["calls"] += 1
+            item["raw_tokens"] += raw_tokens
+            item["compact_tokens"] += compact_tokens
+
+    def stats(self) -> dict:
+        with self._lock:
+            return {
+                name: {**item, "saved_tokens": item["raw_tokens"] - item["compact_tokens"]}
+                for name, item in self._tools.items()
+            }
+
+
+tool_output_stats = ToolOutputStats()
+
+
+def _serialize(output: Any) -> str:
+    """模型实际看到的工具输出：非字符串结果会被序列化为 JSON"""
+    if isinstance(output, str):
+        return output
+    return json.dumps(output, ensure_ascii=False, default=str)
+
+
+def compact(tool_name: str, output: Any) -> str:
+    """
+    压缩工具输出
+    events().list 结构的结果按工具配置的字段投影为逐行摘要，并限制行数；其他结果按长度截断
+    """
+    if isinstance(output, dict) and "items" in output:
+        fields = EVENT_FIELDS.get(tool_name, EVENT_FIELDS["default"])
+        return format_events(output["items"], fields)
+    text = _serialize(output)
+    if len(text) > MAX_CHARS:
+        return f"{text[:MAX_CHARS]}\n……(输出过长已截断，原文 {len(text)} 字)"
+    return text
+
+
+def compact_output(func):
+    """
+    工具函数的装饰器，放在 @tool 之下：返回值经 compact 压缩后再交给 Agent，并记录压缩前后的大小
+    """
+    @functools.wraps(func)
+    def wrapper(*args, **kwargs):
+        output = func(*args, **kwargs)
+        result = compact(func.__name__, output)
+        raw_tokens = count_tokens(_serialize(output))
+        compact_tokens = count_tokens(result)
+        tool_output_stats.record(func.__name__, raw_tokens, compact_tokens)
+        logger.info(f"{func.__name__} 输出 {raw_tokens} tokens，压缩后 {compact_tokens} tokens")
+        return result
+    return wrapper
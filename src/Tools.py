@@ -1,25 +1,25 @@
-from typing import Optional
+from typing import List, Optional
 import os
 import time
 import requests
 from pydantic import BaseModel, Field
 from dotenv import load_dotenv
 from langchain.agents import tool
-from langchain_community.utilities import SerpAPIWrapper
-from langchain_qdrant import QdrantVectorStore
-from qdrant_client import QdrantClient
-from langchain_openai import OpenAIEmbeddings, ChatOpenAI
+from langchain_openai import ChatOpenAI
 from langchain_core.prompts import ChatPromptTemplate
 from langchain.chains import create_history_aware_retriever, create_retrieval_chain
 from langchain.chains.combine_documents import create_stuff_documents_chain
 from .Memory import MemoryClass
+from .Retriever import get_retriever
+from .WebSearch import get_web_search
+from .GoogleServices import get_google_services
+from .CalendarMirror import get_calendar_mirror
+from .EventMatcher import EventMatcher, event_brief
+from .FreeBusy import get_freebusy
+from .ToolOutput import EVENT_FIELDS, compact_output, format_event
 from .Storage import get_user
 from langchain_core.output_parsers import PydanticOutputParser
-from google.oauth2.credentials import Credentials
-from google_auth_oauthlib.flow import InstalledAppFlow
-from google.auth.transport.requests import Request
-from googleapiclient.discovery import build
-import pickle
+from googleapiclient.errors import HttpError
 from datetime import datetime, timedelta
 
 # 配置管理
@@ -48,38 +48,13 @@ class Config:
             "OPENAI_API_BASE": os.getenv("OPENAI_API_BASE")
         })
 
-# Google Calendar API scopes
-SCOPES = [
-    'https://www.googleapis.com/auth/calendar',
-    'https://www.googleapis.com/auth/tasks'
-]
-
 class GoogleClient:
+    """从进程内共享的服务池获取 Google Calendar 和 Tasks 服务，不再每次加载凭证和构建服务"""
     def __init__(self):
-        self.creds = None
-        self.calendar_service = None
-        self.tasks_service = None
-        self._initialize_services()
-
-    def _initialize_services(self):
-        """Initialize Google Calendar and Tasks services"""
-        if os.path.exists('token.pickle'):
-            with open('token.pickle', 'rb') as token:
-                self.creds = pickle.load(token)
-
-        if not self.creds or not self.creds.valid:
-            if self.creds and self.creds.expired and self.creds.refresh_token:
-                self.creds.refresh(Request())
-            else:
-                flow = InstalledAppFlow.from_client_secrets_file(
-                    'credentials.json', SCOPES)
-                self.creds = flow.run_local_server(port=0)
-            
-            with open('token.pickle', 'wb') as token:
-                pickle.dump(self.creds, token)
-
-        self.calendar_service = build('calendar', 'v3', credentials=self.creds)
-        self.tasks_service = build('tasks', 'v1', credentials=self.creds)
+        pool = get_google_services()
+        self.creds = pool.credentials
+        self.calendar_service = pool.calendar
+        self.tasks_service = pool.tasks
 
 # Input schemas
 class TodoInput(BaseModel):
@@ -137,17 +112,19 @@ class ScheduleSearch(BaseModel):
     timeMax: Optional[str] = Field(None, description="日程开始时间的最大值，格式为ISO-8601的date-time格式，可不填,说明(timeMin和 timeMax最大差值为一年),当前时间为{}".format(time.strftime("%Y-%m-%dT%H:%M:%S+08:00", time.localtime())))
 
 class ScheduleModify(BaseModel):
+    eventId: Optional[str] = Field(None, description="日程id，之前查询到的日程结果中有id时填写，可不填")
     timeMin: Optional[str] = Field(None, description="日程开始时间的最小值，格式为ISO-8601的date-time格式，可不填,说明(timeMin和 timeMax最大差值为一年),当前时间为{}".format(time.strftime("%Y-%m-%dT%H:%M:%S+08:00", time.localtime())))
     timeMax: Optional[str] = Field(None, description="日程开始时间的最大值，格式为ISO-8601的date-time格式，可不填,说明(timeMin和 timeMax最大差值为一年),当前时间为{}".format(time.strftime("%Y-%m-%dT%H:%M:%S+08:00", time.localtime())))
     description: Optional[str] = Field(None, description=f"日程描述，最大不超过5000个字符")
     start: Optional[ScheduleSchemaSet_data] = Field(None, description="日程开始时间")
     end: Optional[ScheduleSchemaSet_data_end] = Field(None, description="日程结束时间")
-    summary: Optional[str] = Field(None, description=f"日程标题，最大不超过2048个字符")
+    summary: Optional[str] = Field(None, description=f"日程标题，最大不超过2048个字符。填写了eventId时为修改后的标题，否则用于查找日程")
 
 # 删除模型
 class DeleteSchedule(BaseModel):
     summary: str = Field(description="日程标题")
     description: Optional[str] = Field(description="日程描述")
+    startTime: Optional[str] = Field(None, description="日程的大致开始时间，格式为ISO-8601的date-time格式，用户提到时间时填写，可不填")
 
 
 
@@ -158,12 +135,15 @@ class EventsId(BaseModel):
 class ScheduleDel(BaseModel):
     eventid: str = Field(description="日程id")
 
+class ScheduleDelBatch(BaseModel):
+    eventids: List[str] = Field(description="要删除的日程id列表")
+
 # 工具函数
 @tool
 def search(query: str) -> str:
     """只有需要了解实时信息或不知道的事情的时候才会使用这个工具."""
-    serp = SerpAPIWrapper()
-    return serp.run(query)
+    # 共享的搜索服务：短时间内相同的问题直接返回缓存，并发的相同问题只请求一次
+    return get_web_search().search(query)
 
 @tool(parse_docstring=True)
 def get_info_from_local(query: str) -> str:
@@ -178,55 +158,26 @@ def get_info_from_local(query: str) -> str:
     print("-------RAG-------------")
     userid = get_user("userid")
     print(userid)
-    llm = ChatOpenAI(model=os.getenv("BASE_MODEL"))
-    
-    client = QdrantClient(path=os.getenv("PERSIST_DIR","./vector_store"))
-    collection_name = os.getenv("EMBEDDING_COLLECTION")
-    
-    vector_store = QdrantVectorStore(
-        client=client, 
-        collection_name=collection_name,
-        embedding=OpenAIEmbeddings(
-            model=os.getenv("EMBEDDING_MODEL", "text-embedding-3-small"),
-            api_key=os.getenv("EMBEDDING_API_KEY"),
-            base_url=os.getenv("EMBEDDING_API_BASE")
-        )
-    )
-    
-    # 直接使用向量存储进行检索
-    docs = vector_store.similarity_search(query, k=3)
-    
-    if not docs:
-        return "抱歉，我在知识库中没有找到相关信息。"
-    
-    # 构建上下文
-    context = "\n\n".join([doc.page_content for doc in docs])
-    
-    # 使用 LLM 生成回答
-    prompt = ChatPromptTemplate.from_messages([
-        ("system", "你是一个专业的AI助手，请根据以下上下文回答问题。如果上下文中没有相关信息，请直接说明无法回答。\n\n上下文：\n{context}"),
-        ("human", "{input}")
-    ])
-    
-    chain = prompt | llm
-    
-    response = chain.invoke({
-        "input": query,
-        "context": context
-    })
-    
-    return response.content
+    # 使用常驻的检索服务，模型、客户端和集合只在进程内加载一次
+    return get_retriever().answer(query)
+
+@tool(parse_docstring=True)
+def get_info_from_local_batch(queries: List[str]) -> str:
+    """一次从本地知识库查询多个问题。需要同时查询多个子问题或同一问题的多种问法时使用，比多次调用 get_info_from_local 更快。
 
-@tool
-def create_todo(todo: TodoInput) -> str:
-    """创建一个待办事项
     Args:
-        todo: 包含待办事项信息的对象
+        queries (List[str]): 需要查询的问题列表
+
     Returns:
-        str: 创建结果消息
+        str: 每个问题的答案
     """
-    client = GoogleClient()
-    
+    print("-------RAG BATCH-------------")
+    print(queries)
+    # 批量嵌入、批量检索，并合并为一次 LLM 调用
+    return get_retriever().answer_many(queries)
+
+def _todo_task(todo: TodoInput) -> dict:
+    """把待办事项参数转换为 Google Tasks 的任务"""
     task = {
         'title': todo.subject,
         'notes': todo.description if todo.description else '',
@@ -238,6 +189,19 @@ def create_todo(todo: TodoInput) -> str:
         if 'Z' not in todo.dueTime and '+' not in todo.dueTime and '-' not in todo.dueTime[10:]:
             todo.dueTime = todo.dueTime + 'Z'  # 或 '+08:00'，根据你需求
         task['due'] = todo.dueTime
+    return task
+
+@tool
+@compact_output
+def create_todo(todo: TodoInput) -> str:
+    """创建一个待办事项
+    Args:
+        todo: 包含待办事项信息的对象
+    Returns:
+        str: 创建结果消息
+    """
+    client = GoogleClient()
+    task = _todo_task(todo)
     
     try:
         # Get the default task list
@@ -255,6 +219,34 @@ def create_todo(todo: TodoInput) -> str:
         return f"创建待办事项失败: {str(e)}"
 
 @tool
+@compact_output
+def create_todo_batch(todos: List[TodoInput]) -> str:
+    """一次创建多个待办事项，用户同时要求创建多个待办时使用，比多次调用 create_todo 更快
+    Args:
+        todos: 待办事项列表
+    Returns:
+        str: 每个待办事项的创建结果
+    """
+    pool = get_google_services()
+    try:
+        tasklists = pool.tasks.tasklists().list().execute()
+        tasklist_id = tasklists['items'][0]['id']
+        # 所有创建请求合并为一次批量 HTTP 请求
+        results = pool.execute_batch("tasks", [
+            pool.tasks.tasks().insert(tasklist=tasklist_id, body=_todo_task(todo)) for todo in todos
+        ])
+    except Exception as e:
+        return f"批量创建待办事项失败: {str(e)}"
+    lines = []
+    for index, (todo, (_, error)) in enumerate(zip(todos, results), 1):
+        if error is not None:
+            lines.append(f"{index}. 创建待办事项失败: {todo.subject}，{str(error)}")
+        else:
+            lines.append(f"{index}. 成功创建待办事项: {todo.subject}")
+    return "\n".join(lines)
+
+@tool
+@compact_output
 def checkSchedule(schedule: ScheduleSchema) -> str:
     """检查用户在某段时间内的忙闲状态
     Args:
@@ -262,31 +254,14 @@ def checkSchedule(schedule: ScheduleSchema) -> str:
     Returns:
         str: 查询结果消息
     """
-    client = GoogleClient()
-    
     try:
-        events_result = client.calendar_service.events().list(
-            calendarId='primary',
-            timeMin=schedule.startTime,
-            timeMax=schedule.endTime,
-            singleEvents=True,
-            orderBy='startTime'
-        ).execute()
-        
-        return events_result
+        # freebusy 一次请求覆盖多个日历，只返回忙碌时间段，合并后以简短摘要返回
+        return get_freebusy().summary(schedule.startTime, schedule.endTime)
     except Exception as e:
         return f"查询日程失败: {str(e)}"
 
-@tool
-def SetSchedule(sets: ScheduleSchemaSet) -> str:
-    """创建日程
-    Args:
-        sets: 包含日程信息的对象
-    Returns:
-        str: 创建结果消息
-    """
-    client = GoogleClient()
-    
+def _schedule_event(sets: ScheduleSchemaSet) -> dict:
+    """把日程参数转换为 Google Calendar 的事件，时间格式错误时抛出 ValueError"""
     # 打印输入参数
     print(f"创建日程参数: {sets}")
     print(f"原始开始时间: {sets.start.dateTime}")
@@ -353,9 +328,25 @@ def SetSchedule(sets: ScheduleSchemaSet) -> str:
             
         except ValueError as e:
             print(f"时间解析错误: {e}")
-            return f"时间格式错误: {str(e)}"
+            raise
     
     print(f"创建事件: {event}")
+    return event
+
+@tool
+@compact_output
+def SetSchedule(sets: ScheduleSchemaSet) -> str:
+    """创建日程
+    Args:
+        sets: 包含日程信息的对象
+    Returns:
+        str: 创建结果消息
+    """
+    client = GoogleClient()
+    try:
+        event = _schedule_event(sets)
+    except ValueError as e:
+        return f"时间格式错误: {str(e)}"
     
     try:
         # 使用主日历
@@ -369,12 +360,55 @@ def SetSchedule(sets: ScheduleSchemaSet) -> str:
         ).execute()
         
         print(f"事件创建成功: {created_event.get('htmlLink')}")
-        return f"成功创建日程: {sets.summary}\n你可以在 Google Calendar 中查看: {created_event.get('htmlLink')}"
     except Exception as e:
         print(f"创建事件失败: {str(e)}")
         return f"创建日程失败: {str(e)}"
+    try:
+        get_calendar_mirror().apply(created_event, calendar_id)
+    except Exception as e:
+        # 日程已创建，镜像会在下次同步时补上；不能报告失败，否则重试会创建重复的日程
+        print(f"更新日程镜像失败: {e}")
+    return f"成功创建日程: {sets.summary}\n你可以在 Google Calendar 中查看: {created_event.get('htmlLink')}"
 
 @tool
+@compact_output
+def SetScheduleBatch(sets: List[ScheduleSchemaSet]) -> str:
+    """一次创建多个日程，用户同时要求创建多个日程时使用，比多次调用 SetSchedule 更快
+    Args:
+        sets: 日程信息列表
+    Returns:
+        str: 每个日程的创建结果
+    """
+    pool = get_google_services()
+    calendar_id = 'primary'
+    lines = []
+    pending = []
+    for index, item in enumerate(sets, 1):
+        try:
+            event = _schedule_event(item)
+            pending.append((index, item, pool.calendar.events().insert(calendarId=calendar_id, body=event)))
+        except ValueError as e:
+            lines.append((index, f"{index}. 时间格式错误: {item.summary}，{str(e)}"))
+    
+    try:
+        # 所有创建请求合并为一次批量 HTTP 请求
+        results = pool.execute_batch("calendar", [request for _, _, request in pending])
+    except Exception as e:
+        return f"批量创建日程失败: {str(e)}"
+    for (index, item, _), (created_event, error) in zip(pending, results):
+        if error is not None:
+            lines.append((index, f"{index}. 创建日程失败: {item.summary}，{str(error)}"))
+        else:
+            try:
+                get_calendar_mirror().apply(created_event, calendar_id)
+            except Exception as e:
+                # 日程已创建，镜像会在下次同步时补上
+                print(f"更新日程镜像失败: {e}")
+            lines.append((index, f"{index}. 成功创建日程: {item.summary} {created_event.get('htmlLink')}"))
+    return "\n".join(line for _, line in sorted(lines))
+
+@tool
+@compact_output
 def SearchSchedule(search: ScheduleSearch) -> str:
     """查询日程
     Args:
@@ -382,18 +416,8 @@ def SearchSchedule(search: ScheduleSearch) -> str:
     Returns:
         str: 查询结果消息
     """
-    client = GoogleClient()
-    
     try:
-        events_result = client.calendar_service.events().list(
-            calendarId='primary',
-            timeMin=search.timeMin,
-            timeMax=search.timeMax,
-            singleEvents=True,
-            orderBy='startTime'
-        ).execute()
-        
-        return events_result
+        return get_calendar_mirror().query(search.timeMin, search.timeMax)
     except Exception as e:
         return f"查询日程失败: {str(e)}"
 
@@ -431,7 +455,58 @@ def FindPreciseOrder(orginrder: str,events:object) -> str:
 
 
 
+def _modified_time(current: dict, new: ScheduleSchemaSet_data) -> dict:
+    """按修改参数生成新的 start/end；只给出时刻时沿用日程原来的日期和时区"""
+    if not new.date and not new.dateTime:
+        raise ValueError("开始或结束时间需要提供 date 或 dateTime")
+    if new.date and not new.dateTime:
+        return {'date': new.date}
+    value = new.dateTime
+    if 'T' not in value:
+        day = new.date or (current.get('dateTime') or current.get('date'))[:10]
+        value = f"{day}T{value}"
+    return {'dateTime': value, 'timeZone': new.timeZone or current.get('timeZone', 'America/Los_Angeles')}
+
+def _shifted_end(current: dict, start: dict) -> dict:
+    """只修改开始时间时，按日程原来的时长推算新的结束时间"""
+    old_start, old_end = current['start'], current['end']
+    if 'date' in start:
+        days = 1
+        if 'date' in old_start and 'date' in old_end:
+            days = max((datetime.fromisoformat(old_end['date']) - datetime.fromisoformat(old_start['date'])).days, 1)
+        return {'date': (datetime.fromisoformat(start['date']) + timedelta(days=days)).strftime('%Y-%m-%d')}
+    duration = timedelta(hours=1)
+    if 'dateTime' in old_start and 'dateTime' in old_end:
+        duration = (datetime.fromisoformat(old_end['dateTime'].replace('Z', '+00:00'))
+                    - datetime.fromisoformat(old_start['dateTime'].replace('Z', '+00:00')))
+    end = datetime.fromisoformat(start['dateTime'].replace('Z', '+00:00')) + duration
+    return {'dateTime': end.isoformat(), 'timeZone': start['timeZone']}
+
+def _find_event_to_modify(search: ScheduleModify) -> Optional[dict]:
+    """按日程id或标题在本地镜像中查找要修改的日程，找不到唯一匹配时返回 None"""
+    mirror = get_calendar_mirror()
+    if search.eventId:
+        return mirror.get(search.eventId)
+    if not search.summary:
+        return None
+    # 标题索引精确查找，再用时间范围和描述缩小候选
+    candidates = mirror.find(search.summary)
+    if search.timeMin or search.timeMax:
+        in_window = {e['id'] for e in mirror.query(search.timeMin, search.timeMax)['items']}
+        candidates = [e for e in candidates if e['id'] in in_window]
+    if search.description is not None and len(candidates) > 1:
+        candidates = [e for e in candidates if e.get('description', '') == search.description] or candidates
+    if len(candidates) == 1:
+        return candidates[0]
+    # 标题不完全一致或有多个同名日程时，在时间范围内按相似度匹配，不确定时不修改
+    if not candidates:
+        candidates = mirror.query(search.timeMin, search.timeMax)['items']
+    matcher = EventMatcher()
+    match = matcher.match(candidates, search.summary, search.description)
+    return match.event if matcher.confident(match) else None
+
 @tool
+@compact_output
 def ModifySchedule(search: ScheduleModify) -> str:
     """修改日程
     Args:
@@ -440,64 +515,68 @@ def ModifySchedule(search: ScheduleModify) -> str:
         str: 修改结果消息
     """
     client = GoogleClient()
-    
-    # First search for the event
-    search_params = ScheduleSearch(
-        timeMin=search.timeMin,
-        timeMax=search.timeMax
-    )
-    
-    search_result = SearchSchedule.invoke(search_params)
-    if isinstance(search_result, str):
-        return "查询日程失败"
-    
-    events = search_result.get('items', [])
-    if not events:
-        return "未找到相关日程"
-    
-    # Find the matching event
-    target_event = None
-    for event in events:
-        if (event.get('summary') == search.summary and
-            event.get('description') == search.description):
-            target_event = event
-            break
-    
+
+    # 先检查时间参数，避免查找日程后才发现无法生成修改内容
+    for name, value in (('开始', search.start), ('结束', search.end)):
+        if value is not None and not value.date and not value.dateTime:
+            return f"修改日程失败: {name}时间需要提供 date 或 dateTime"
+
+    target_event = _find_event_to_modify(search)
     if not target_event:
         return "未找到匹配的日程"
-    
-    # Update the event
-    event_id = target_event['id']
-    updated_event = {
-        'summary': search.summary,
-        'description': search.description,
-    }
-    
-    if 'date' in target_event['start']:
-        updated_event['start'] = {'date': search.start}
-        updated_event['end'] = {'date': search.end}
-    else:
-        updated_event['start'] = {
-            'dateTime': search.start,
-            'timeZone': target_event['start'].get('timeZone', 'UTC')
-        }
-        updated_event['end'] = {
-            'dateTime': search.end,
-            'timeZone': target_event['end'].get('timeZone', 'UTC')
-        }
-    
+
+    # 只发送有变化的字段
+    changes = {}
+    if search.eventId and search.summary is not None and search.summary != target_event.get('summary'):
+        changes['summary'] = search.summary
+    if search.description is not None and search.description != target_event.get('description', ''):
+        changes['description'] = search.description
     try:
-        client.calendar_service.events().update(
-            calendarId='primary',
-            eventId=event_id,
-            body=updated_event
-        ).execute()
-        
-        return f"成功修改日程: {search.summary}"
+        if search.start:
+            start = _modified_time(target_event['start'], search.start)
+            if start != target_event['start']:
+                changes['start'] = start
+                if not search.end:
+                    # 只改开始时间时保持原来的时长，否则结束时间可能早于开始时间
+                    changes['end'] = _shifted_end(target_event, start)
+        if search.end:
+            end = _modified_time(target_event['end'], search.end)
+            if end != target_event['end']:
+                changes['end'] = end
+    except ValueError as e:
+        return f"修改日程失败: 时间格式错误，{str(e)}"
+    if not changes:
+        return "日程没有需要修改的内容"
+    print(f"修改日程 {target_event['id']}: {changes}")
+
+    request = client.calendar_service.events().patch(
+        calendarId='primary',
+        eventId=target_event['id'],
+        body=changes
+    )
+    # 带上 ETag，日程在此期间被其他人修改时服务端返回 412，不会覆盖对方的修改
+    if target_event.get('etag'):
+        request.headers['If-Match'] = target_event['etag']
+    try:
+        result = request.execute()
+        get_calendar_mirror().apply(result)
+        return f"成功修改日程: {result.get('summary')}"
+    except HttpError as e:
+        if e.resp.status == 412:
+            try:
+                latest = client.calendar_service.events().get(
+                    calendarId='primary', eventId=target_event['id']
+                ).execute()
+                get_calendar_mirror().apply(latest)
+            except Exception as get_error:
+                return f"日程在此期间已被修改或删除，获取最新内容失败: {str(get_error)}"
+            return f"日程在此期间已被修改，请确认最新内容后再修改: {format_event(latest, EVENT_FIELDS['ModifySchedule'])}"
+        return f"修改日程失败: {str(e)}"
     except Exception as e:
         return f"修改日程失败: {str(e)}"
-    
+
 @tool
+@compact_output
 def DelSchedule(query: DeleteSchedule) -> str:
     """当用户要求删除日程时调用此工具
     Args:
@@ -505,30 +584,42 @@ def DelSchedule(query: DeleteSchedule) -> str:
     Returns:
         str: 返回给用户确认要具体删除的日程信息
     """
-    # 创建 ScheduleSearch 对象并转换为字典
-    search_params = ScheduleSearch()
-    # 包装成正确的格式：添加 search 字段
-    search_dict = {
-        "search": search_params.model_dump()
-    }
-    # 使用 invoke 方法调用 SearchSchedule
-    searchResult = SearchSchedule.invoke(search_dict)
-    events = searchResult.get('items', [])
+    # 直接读本地镜像中的日程；SearchSchedule 的输出已压缩为文本，不能再作为数据使用
+    try:
+        events = get_calendar_mirror().query()['items']
+    except Exception as e:
+        return f"查询日程失败: {str(e)}"
     if not events:
         return "您的日程空空如也"
     if len(events) > 1:
-        orginOder = f"description: {query.description}, summary: {query.summary}"
-        returnID = FindPreciseOrder(orginOder,events)
-        print(returnID)
-        eventid = returnID.id
-        if not eventid:
-            return "您的日程似乎不存在，是否输入有误？"
+        # 先在本地按标题、描述和时间打分，只有前几名难以区分时才交给 LLM
+        matcher = EventMatcher()
+        match = matcher.match(events, query.summary, query.description, query.startTime)
+        print(f"日程匹配得分: {match.score:.3f}，领先第二名: {match.margin:.3f}")
+        if matcher.confident(match):
+            eventid = match.id
+        else:
+            orginOder = f"description: {query.description}, summary: {query.summary}"
+            if query.startTime:
+                orginOder += f", time: {query.startTime}"
+            top = match.candidates(int(os.getenv("EVENT_MATCH_LLM_CANDIDATES", "5")))
+            candidates = [event_brief(e) for e in top]
+            returnID = FindPreciseOrder(orginOder, {"events": candidates})
+            print(returnID)
+            if returnID is not None and returnID.id in {e["id"] for e in candidates}:
+                eventid = returnID.id
+            else:
+                # LLM 也无法确定时不猜测，列出最接近的几个日程让用户选择
+                lines = [f"{i}. {format_event(e, ('id', 'time', 'summary'))}" for i, e in enumerate(top, 1)]
+                prefix = "无法确定要删除哪个日程，" if match.score >= matcher.min_score else "您的日程似乎不存在，是否输入有误？"
+                return f"{prefix}以下是最接近的日程，请询问用户要删除哪一个：\n" + "\n".join(lines)
     else:
         eventid = events[0]['id']
     print("要删除的日程ID：",eventid)
     return f"记录下日程id,然后询问用户，是否确认要删除日程 {eventid}"
 
 @tool
+@compact_output
 def ConfirmDelSchedule(query: ScheduleDel) -> str:
     """删除日程
     Args:
@@ -543,10 +634,44 @@ def ConfirmDelSchedule(query: ScheduleDel) -> str:
             calendarId='primary',
             eventId=query.eventid
         ).execute()
-        
-        return "成功删除日程"
     except Exception as e:
         return f"删除日程失败: {str(e)}"
+    try:
+        get_calendar_mirror().remove(query.eventid)
+    except Exception as e:
+        # 日程已删除，镜像会在下次同步时补上
+        print(f"更新日程镜像失败: {e}")
+    return "成功删除日程"
+
+@tool
+@compact_output
+def ConfirmDelScheduleBatch(query: ScheduleDelBatch) -> str:
+    """一次删除多个日程，用户确认要删除多个日程时使用，比多次调用 ConfirmDelSchedule 更快
+    Args:
+        query: 包含要删除的日程ID列表的对象
+    Returns:
+        str: 每个日程的删除结果
+    """
+    pool = get_google_services()
+    try:
+        # 所有删除请求合并为一次批量 HTTP 请求
+        results = pool.execute_batch("calendar", [
+            pool.calendar.events().delete(calendarId='primary', eventId=eventid) for eventid in query.eventids
+        ])
+    except Exception as e:
+        return f"批量删除日程失败: {str(e)}"
+    lines = []
+    for index, (eventid, (_, error)) in enumerate(zip(query.eventids, results), 1):
+        if error is not None:
+            lines.append(f"{index}. 删除日程失败: {eventid}，{str(error)}")
+        else:
+            try:
+                get_calendar_mirror().remove(eventid)
+            except Exception as e:
+                # 日程已删除，镜像会在下次同步时补上
+                print(f"更新日程镜像失败: {e}")
+            lines.append(f"{index}. 成功删除日程: {eventid}")
+    return "\n".join(lines)
         
 
 
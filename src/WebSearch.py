@@ -0,0 +1,156 @@
+import hashlib
+import logging
+import os
+import threading
+from concurrent.futures import Future
+from typing import Dict, Optional
+
+import requests
+from requests.adapters import HTTPAdapter
+from langchain_community.utilities import SerpAPIWrapper
+from dotenv import load_dotenv as _load_dotenv
+_load_dotenv()
+
+from .Cache import MemoryStore
+from .EmbeddingCache import normalize_text
+
+_session: Optional[requests.Session] = None
+_session_lock = threading.Lock()
+
+
+def get_http_session() -> requests.Session:
+    """进程内共享的 HTTP 会话，复用连接池，避免每次搜索重新建立 TLS 连接"""
+    global _session
+    with _session_lock:
+        if _session is None:
+            pool_size = int(os.getenv("WEB_SEARCH_POOL_SIZE", "16"))
+            _session = requests.Session()
+            adapter = HTTPAdapter(pool_connections=pool_size, pool_maxsize=pool_size, max_retries=1)
+            _session.mount("https://", adapter)
+            _session.mount("http://", adapter)
+        return _session
+
+
+class SerpAPIBackend:
+    """
+    通过 SerpAPI 搜索，结果格式与 SerpAPIWrapper.run 一致
+    base_url 可指向本地桩服务，便于离线测试
+    """
+
+    DEFAULT_PARAMS = {
+        "engine": "google",
+        "google_domain": "google.com",
+        "gl": "us",
+        "hl": "en",
+    }
+
+    def __init__(self,
+                 api_key: Optional[str] = None,
+                 base_url: str = os.getenv("SERPAPI_BASE_URL", "https://serpapi.com/search"),
+                 timeout: float = float(os.getenv("WEB_SEARCH_TIMEOUT", "10")),
+                 session: Optional[requests.Session] = None) -> None:
+        self.api_key = api_key or os.getenv("SERPAPI_API_KEY")
+        self.base_url = base_url
+        self.timeout = timeout
+        self.session = session or get_http_session()
+
+    def search(self, query: str) -> str:
+        params = {**self.DEFAULT_PARAMS, "q": query, "api_key": self.api_key, "output": "json", "source": "python"}
+        response = self.session.get(self.base_url, params=params, timeout=self.timeout)
+        response.raise_for_status()
+        return SerpAPIWrapper._process_response(response.json())
+
+
+class WebSearchService:
+    """
+    带 TTL 缓存和请求合并的联网搜索
+    相同(归一化后)的问题在 TTL 内直接返回缓存结果；并发的相同问题只向上游发起一次请求，
+    其余调用等待同一个结果。失败的结果不缓存
+    """
+
+    def __init__(self, backend=None,
+                 ttl: float = float(os.getenv("WEB_SEARCH_TTL", "300")),
+                 max_entries: int = int(os.getenv("WEB_SEARCH_MAX_ENTRIES", "1000"))) -> None:
+        """
+        Args:
+            backend: 任何提供 search(query) -> str 的对象，默认 SerpAPIBackend
+            ttl: 缓存时间(秒)，实时类问题不宜过长
+            max_entries: 缓存条目数上限
+        """
+        self.logger = logging.getLogger("WebSearchService")
+        self.backend = backend or SerpAPIBackend()
+        self.store = MemoryStore(max_entries=max_entries, ttl=ttl)
+        self._inflight: Dict[str, Future] = {}
+        self._lock = threading.Lock()
+        self.hits = 0
+        self.misses = 0
+        self.coalesced = 0
+        self.errors = 0
+
+    @staticmethod
+    def _key(query: str) -> str:
+        return hashlib.sha256(normalize_text(query).lower().encode("utf-8")).hexdigest()
+
+    def search(self, query: str) -> str:
+        key = self._key(query)
+        with self._lock:
+            cached = self.store.get(key)
+            if cached is not None:
+                self.hits += 1
+                return cached.decode("utf-8")
+            future = self._inflight.get(key)
+            leader = future is None
+            if leader:
+                future = Future()
+                self._inflight[key] = future
+                self.misses += 1
+            else:
+                self.coalesced += 1
+        if not leader:
+            return future.result()
+
+        try:
+            result = self.backend.search(query)
+            self.store.set(key, result.encode("utf-8"))
+            future.set_result(result)
+            return result
+        except Exception as e:
+            self.errors += 1
+            self.logger.warning(f"搜索失败: {e}")
+            future.set_exception(e)
+            raise
+        finally:
+            with self._lock:
+                self._inflight.pop(key, None)
+
+    def stats(self) -> dict:
+        lookups = self.hits + self.misses + self.coalesced
+        return {
+            "entries": len(self.store),
+            "hits": self.hits,
+            "misses": self.misses,
+            "coalesced": self.coalesced,
+            "errors": self.errors,
+            "hit_rate": (self.hits + self.coalesced) / lookups if lookups else 0.0,
+        }
+
+
+_service: Optional[WebSearchService] = None
+_service_lock = threading.Lock()
+
+
+def get_web_search() -> WebSearchService:
+    """获取进程内共享的搜索服务"""
+    global _service
+    with _service_lock:
+        if _service is None:
+            _service = WebSearchService()
+        return _service
+
+
+def set_web_search_backend(backend) -> WebSearchService:
+    """替换搜索后端(例如测试用的桩实现)，同时清空缓存"""
+    global _service
+    with _service_lock:
+        _service = WebSearchService(backend=backend)
+        return _service
@@ -1,8 +1,24 @@
-from .Emotion import EmotionClass
-from .Prompt import PromptClass
-from .Memory import MemoryClass
-from  .Tools import search,get_info_from_local
-from .Agents import AgentClass
-from .AddDoc import DocumentProcessor
+import importlib
+
+# 按需导入：Tools 和 Agents 在导入时就要求 API Key 等环境变量，
+# 以 python -m src.xxx 运行基准测试等独立脚本时不应触发这些副作用
+_exports = {
+    "EmotionClass": ".Emotion",
+    "PromptClass": ".Prompt",
+    "MemoryClass": ".Memory",
+    "search": ".Tools",
+    "get_info_from_local": ".Tools",
+    "AgentClass": ".Agents",
+    "DocumentProcessor": ".AddDoc",
+}
+
+
+def __getattr__(name):
+    if name not in _exports:
+        raise AttributeError(f"module {__name__!r} has no attribute {name!r}")
+    value = getattr(importlib.import_module(_exports[name], __name__), name)
+    globals()[name] = value
+    return value
+
 
 __all__ = ["EmotionClass","PromptClass","MemoryClass","AgentClass","search","get_info_from_local","DocumentProcessor"]
\ No newline at end of file
@@ -0,0 +1,139 @@
+import argparse
+import json
+import os
+import shutil
+import tempfile
+import time
+
+import numpy as np
+from dotenv import load_dotenv
+from qdrant_client import QdrantClient
+from qdrant_client.http import models as rest
+
+from .Collection import PROFILES, CollectionManager, embedding_dimension
+
+# 加载环境变量
+load_dotenv()
+
+
+def make_vectors(count, dim, clusters, seed):
+    """生成带聚类结构的归一化向量，比均匀随机向量更接近真实嵌入的分布"""
+    rng = np.random.default_rng(seed)
+    centers = rng.normal(size=(clusters, dim)).astype(np.float32)
+    vectors = centers[rng.integers(0, clusters, size=count)] + 0.5 * rng.normal(size=(count, dim)).astype(np.float32)
+    return vectors / np.linalg.norm(vectors, axis=1, keepdims=True)
+
+
+def estimate_memory(profile, count, dim):
+    """
+    估算集合的内存和磁盘占用(字节)
+    原始向量 float32；标量量化每维 1 字节，二值量化每维 1 位；HNSW 第 0 层每个点约 2m 个 4 字节邻接
+    """
+    raw = count * dim * 4
+    quantized = {"scalar": count * dim, "binary": count * dim // 8}.get(profile["quantization"], 0)
+    graph = count * profile["m"] * 2 * 4
+    ram = quantized + graph + (0 if profile["on_disk"] else raw)
+    disk = raw + quantized + graph
+    return ram, disk
+
+
+def percentile(values, pct):
+    ordered = sorted(values)
+    return ordered[min(len(ordered) - 1, int(len(ordered) * pct / 100))]
+
+
+def wait_until_indexed(client, collection_name, timeout=600):
+    """等待 Qdrant 服务端完成索引和量化"""
+    deadline = time.time() + timeout
+    while time.time() < deadline:
+        if client.get_collection(collection_name).status == rest.CollectionStatus.GREEN:
+            return
+        time.sleep(0.5)
+    raise TimeoutError(f"Collection {collection_name} is still indexing after {timeout}s")
+
+
+def bench_profile(client, name, vectors, queries, truth, k, embedding_model):
+    collection_name = f"bench_{name}"
+    manager = CollectionManager(client, collection_name, embedding_model=embedding_model, profile=name)
+    manager.recreate()
+
+    start = time.perf_counter()
+    client.upload_collection(collection_name, vectors=vectors, ids=list(range(len(vectors))), batch_size=256)
+    if not manager.embedded:
+        wait_until_indexed(client, collection_name)
+    build_s = time.perf_counter() - start
+
+    search_params = manager.search_params()
+    latencies = []
+    recalls = []
+    for query, expected in zip(queries, truth):
+        start = time.perf_counter()
+        hits = client.query_points(collection_name, query=query.tolist(), limit=k, search_params=search_params).points
+        latencies.append((time.perf_counter() - start) * 1000)
+        recalls.append(len({hit.id for hit in hits} & set(expected)) / k)
+
+    ram, disk = estimate_memory(PROFILES[name], len(vectors), vectors.shape[1])
+    client.delete_collection(collection_name)
+    return {
+        "profile": name,
+        "points": len(vectors),
+        "dim": int(vectors.shape[1]),
+        f"recall@{k}": round(float(np.mean(recalls)), 4),
+        "p50_ms": round(percentile(latencies, 50), 3),
+        "p95_ms": round(percentile(latencies, 95), 3),
+        "build_s": round(build_s, 2),
+        "ram_mb_est": round(ram / 2 ** 20, 1),
+        "disk_mb_est": round(disk / 2 ** 20, 1),
+    }
+
+
+def main():
+    parser = argparse.ArgumentParser(description="比较各集合配置档位的内存、召回率和检索延迟")
+    parser.add_argument("--url", default=os.getenv("QDRANT_URL"),
+                        help="Qdrant 服务地址；不指定时使用临时目录的嵌入式 Qdrant(只做精确检索，各档位结果相同)")
+    parser.add_argument("--profiles", default=",".join(PROFILES), help="逗号分隔的配置档位")
+    parser.add_argument("--embedding-model", default=os.getenv("EMBEDDING_MODEL", "text-embedding-3-small"),
+                        help="用于确定向量维度的嵌入模型")
+    parser.add_argument("--dim", type=int, help="直接指定向量维度，覆盖嵌入模型对应的维度")
+    parser.add_argument("--points", type=int, default=20000, help="向量数")
+    parser.add_argument("--queries", type=int, default=200, help="查询数")
+    parser.add_argument("--clusters", type=int, default=100, help="向量聚类数")
+    parser.add_argument("--k", type=int, default=10, help="计算 recall@k 的 k")
+    parser.add_argument("--seed", type=int, default=42)
+    parser.add_argument("--output", help="将结果以 JSON 写入该文件")
+    args = parser.parse_args()
+
+    if args.dim:
+        os.environ["EMBEDDING_DIMENSION"] = str(args.dim)
+    dim = embedding_dimension(args.embedding_model)
+    vectors = make_vectors(args.points, dim, args.clusters, args.seed)
+    queries = make_vectors(args.queries, dim, args.clusters, args.seed)
+    # 精确检索的结果作为召回率的标准答案
+    truth = np.argsort(-(queries @ vectors.T), axis=1)[:, :args.k]
+
+    tmp_dir = None
+    if args.url:
+        client = QdrantClient(url=args.url)
+    else:
+        tmp_dir = tempfile.mkdtemp(prefix="qdrant_bench_")
+        client = QdrantClient(path=tmp_dir)
+        print("未指定 --url，使用嵌入式 Qdrant：量化和 HNSW 参数不生效，召回率和延迟仅作基线")
+
+    results = []
+    try:
+        for name in args.profiles.split(","):
+            result = bench_profile(client, name, vectors, queries, truth, args.k, args.embedding_model)
+            print(json.dumps(result, ensure_ascii=False))
+            results.append(result)
+    finally:
+        client.close()
+        if tmp_dir:
+            shutil.rmtree(tmp_dir, ignore_errors=True)
+
+    if args.output:
+        with open(args.output, "w", encoding="utf-8") as f:
+            json.dump(results, f, ensure_ascii=False, indent=2)
+
+
+if __name__ == "__main__":
+    main()
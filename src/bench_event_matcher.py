@@ -0,0 +1,172 @@
+import argparse
+import json
+import random
+import time
+from datetime import datetime, timedelta, timezone
+
+from dotenv import load_dotenv
+
+from .EventMatcher import EventMatcher, event_brief
+from .Tokens import count_tokens
+
+# 加载环境变量
+load_dotenv()
+
+PEOPLE = ["张伟", "王芳", "李娜", "刘洋", "陈静", "Alice", "Bob", "Carol"]
+TOPICS = ["周报", "预算评审", "产品规划", "招聘面试", "客户回访", "技术分享", "季度复盘", "design review",
+          "sprint planning", "roadmap sync"]
+PERSONAL = ["牙医预约", "健身课", "接孩子放学", "体检", "理发", "dinner with family", "yoga class"]
+DETAILS = ["会议室 A", "线上会议", "带上笔记本", "准备材料", "讨论下季度目标", "bring the slides", "Zoom"]
+
+
+def make_calendar(count, rng, start):
+    """生成带重复标题(例如每周例会)的日历，只靠时间才能区分的日程也会出现"""
+    events = []
+    for i in range(count):
+        kind = rng.random()
+        if kind < 0.5:
+            summary = f"与{rng.choice(PEOPLE)}的{rng.choice(TOPICS)}"
+        elif kind < 0.8:
+            summary = rng.choice(TOPICS)
+        else:
+            summary = rng.choice(PERSONAL)
+        begin = start + timedelta(days=rng.randint(0, 30), hours=rng.randint(8, 19))
+        events.append({
+            "id": f"evt{i:05d}",
+            "summary": summary,
+            "description": rng.choice(DETAILS) if rng.random() < 0.6 else "",
+            "start": {"dateTime": begin.isoformat(), "timeZone": "Asia/Shanghai"},
+            "end": {"dateTime": (begin + timedelta(hours=1)).isoformat(), "timeZone": "Asia/Shanghai"},
+            "etag": f"\"{rng.getrandbits(48)}\"",
+            "creator": {"email": "me@example.com", "self": True},
+            "organizer": {"email": "me@example.com", "self": True},
+            "reminders": {"useDefault": True},
+            "htmlLink": f"https://www.google.com/calendar/event?eid=evt{i:05d}",
+        })
+    return events
+
+
+def perturb(text, rng):
+    """模拟用户的说法：删掉一部分字词或打错一个字"""
+    if len(text) > 4 and rng.random() < 0.5:
+        cut = rng.randint(0, len(text) // 3)
+        text = text[cut:]
+    if len(text) > 3 and rng.random() < 0.4:
+        i = rng.randrange(len(text))
+        text = text[:i] + text[i + 1:]
+    return text
+
+
+def make_queries(events, count, rng):
+    """从日历中随机挑选目标日程，生成带噪声的删除请求；约一半给出大致时间"""
+    queries = []
+    for _ in range(count):
+        target = rng.choice(events)
+        when = None
+        if rng.random() < 0.5:
+            begin = datetime.fromisoformat(target["start"]["dateTime"])
+            when = (begin + timedelta(minutes=rng.randint(-60, 60))).isoformat()
+        description = target["description"] if target["description"] and rng.random() < 0.5 else None
+        queries.append({
+            "summary": perturb(target["summary"], rng),
+            "description": description,
+            "when": when,
+            "target": target["id"],
+            "summary_unique": sum(e["summary"] == target["summary"] for e in events) == 1,
+        })
+    return queries
+
+
+def percentile(values, pct):
+    ordered = sorted(values)
+    return ordered[min(len(ordered) - 1, int(len(ordered) * pct / 100))]
+
+
+def bench_matcher(events, queries, candidates):
+    matcher = EventMatcher()
+    correct = confident = confident_correct = 0
+    latencies, fallback_tokens = [], []
+    for query in queries:
+        start = time.perf_counter()
+        match = matcher.match(events, query["summary"], query["description"], query["when"])
+        latencies.append((time.perf_counter() - start) * 1000)
+        correct += match.id == query["target"]
+        if matcher.confident(match):
+            confident += 1
+            confident_correct += match.id == query["target"]
+        else:
+            # 回退到 LLM 时只发送前几名候选的关键字段
+            brief = json.dumps({"events": [event_brief(e) for e in match.candidates(candidates)]}, ensure_ascii=False)
+            fallback_tokens.append(count_tokens(brief))
+    return {
+        "path": "matcher",
+        "accuracy@1": round(correct / len(queries), 4),
+        "confident_rate": round(confident / len(queries), 4),
+        "confident_accuracy": round(confident_correct / confident, 4) if confident else None,
+        "p50_ms": round(percentile(latencies, 50), 3),
+        "p95_ms": round(percentile(latencies, 95), 3),
+        "fallback_prompt_tokens_avg": round(sum(fallback_tokens) / len(fallback_tokens)) if fallback_tokens else 0,
+    }
+
+
+def bench_llm(events, queries):
+    """原来的做法：把全部日程交给 FindPreciseOrder，需要 OPENAI_API_KEY 等配置"""
+    from .Tools import FindPreciseOrder
+
+    payload_tokens = count_tokens(json.dumps(events, ensure_ascii=False))
+    correct = failures = 0
+    latencies = []
+    for query in queries:
+        orginOder = f"description: {query['description']}, summary: {query['summary']}"
+        if query["when"]:
+            orginOder += f", time: {query['when']}"
+        start = time.perf_counter()
+        result = FindPreciseOrder(orginOder, events)
+        latencies.append((time.perf_counter() - start) * 1000)
+        if result is None:
+            failures += 1
+        else:
+            correct += result.id == query["target"]
+    return {
+        "path": "llm",
+        "accuracy@1": round(correct / len(queries), 4),
+        "failures": failures,
+        "p50_ms": round(percentile(latencies, 50), 1),
+        "p95_ms": round(percentile(latencies, 95), 1),
+        "prompt_tokens_per_call": payload_tokens,
+    }
+
+
+def main():
+    parser = argparse.ArgumentParser(description="比较本地日程匹配与 LLM 匹配的准确率、延迟和 token 消耗")
+    parser.add_argument("--events", type=int, default=200, help="日历中的日程数")
+    parser.add_argument("--queries", type=int, default=500, help="删除请求数")
+    parser.add_argument("--llm-queries", type=int, default=0,
+                        help="同时用 LLM 匹配前 N 个请求作对比(会调用模型并产生费用)，0 表示不调用")
+    parser.add_argument("--candidates", type=int, default=5, help="回退到 LLM 时发送的候选日程数")
+    parser.add_argument("--seed", type=int, default=42)
+    parser.add_argument("--output", help="将结果以 JSON 写入该文件")
+    args = parser.parse_args()
+
+    rng = random.Random(args.seed)
+    start = datetime.now(timezone(timedelta(hours=8))).replace(minute=0, second=0, microsecond=0)
+    events = make_calendar(args.events, rng, start)
+    queries = make_queries(events, args.queries, rng)
+
+    results = [bench_matcher(events, queries, args.candidates)]
+    # 标题在日历中唯一、且没有给出时间的请求，本身就无法仅凭文字区分，单独统计便于解读
+    unique = [q for q in queries if q["summary_unique"] or q["when"]]
+    if unique:
+        results.append({**bench_matcher(events, unique, args.candidates), "path": "matcher (distinguishable)"})
+    if args.llm_queries:
+        results.append(bench_llm(events, queries[:args.llm_queries]))
+
+    report = {"params": vars(args), "results": results}
+    print(json.dumps(report, ensure_ascii=False, indent=2))
+    if args.output:
+        with open(args.output, "w", encoding="utf-8") as f:
+            json.dump(report, f, ensure_ascii=False, indent=2)
+
+
+if __name__ == "__main__":
+    main()
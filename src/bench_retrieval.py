@@ -0,0 +1,237 @@
+import argparse
+import hashlib
+import json
+import math
+import os
+import random
+import resource
+import shutil
+import subprocess
+import tempfile
+import time
+import uuid
+from collections import Counter
+from typing import List
+
+import numpy as np
+from dotenv import load_dotenv
+from langchain.text_splitter import RecursiveCharacterTextSplitter
+from langchain_core.documents import Document
+from langchain_core.embeddings import Embeddings
+from langchain_core.language_models.fake_chat_models import FakeListChatModel
+from qdrant_client import QdrantClient
+
+from .Collection import CollectionManager
+from .LexicalIndex import tokenize
+from .Retriever import RetrieverService, get_qdrant_client
+from .init_vector_store import DOCS
+
+# 加载环境变量
+load_dotenv()
+
+QUERIES_PATH = os.path.join(os.path.dirname(__file__), "retrieval_eval_queries.jsonl")
+SHIPPED_DB = os.path.join(os.path.dirname(os.path.dirname(__file__)), "vector_db")
+
+# 生成干扰分片用的词表，与评测语料主题无关
+FILLER_WORDS = [
+    "天气", "晴朗", "会议", "安排", "午餐", "咖啡", "城市", "交通", "地铁", "公园", "散步", "音乐",
+    "电影", "周末", "旅行", "酒店", "机票", "预算", "报销", "发票", "快递", "包裹", "超市", "水果",
+    "篮球", "足球", "比赛", "训练", "健身", "跑步", "医院", "体检", "学校", "考试", "作业", "假期",
+    "weather", "meeting", "lunch", "coffee", "travel", "hotel", "budget", "invoice", "music", "movie",
+]
+
+
+class HashingEmbeddings(Embeddings):
+    """确定性的本地嵌入：检索词哈希到固定维度的带符号词袋向量，无需网络"""
+
+    def __init__(self, dim: int = 256) -> None:
+        self.dim = dim
+
+    def embed_query(self, text: str) -> List[float]:
+        vector = np.zeros(self.dim, dtype=np.float32)
+        for term, tf in Counter(tokenize(text)).items():
+            digest = hashlib.md5(term.encode("utf-8")).digest()
+            index = int.from_bytes(digest[:4], "little") % self.dim
+            sign = 1.0 if digest[4] & 1 else -1.0
+            vector[index] += sign * (1 + math.log(tf))
+        norm = np.linalg.norm(vector)
+        return (vector / norm if norm else vector).tolist()
+
+    def embed_documents(self, texts: List[str]) -> List[List[float]]:
+        return [self.embed_query(text) for text in texts]
+
+
+def load_queries(path):
+    """读取评测查询，每行一个 {"query": ..., "relevant": [相关分片应包含的文本, ...]}"""
+    with open(path, encoding="utf-8") as f:
+        return [json.loads(line) for line in f if line.strip()]
+
+
+def load_corpus(name):
+    """fixture 使用 init_vector_store 中的文档；shipped 读取仓库自带 vector_db 中的分片文本"""
+    if name == "fixture":
+        return list(DOCS)
+    # 复制到临时目录再打开，避免占用仓库目录的锁
+    tmp_dir = tempfile.mkdtemp(prefix="qdrant_shipped_")
+    try:
+        shutil.copytree(SHIPPED_DB, tmp_dir, dirs_exist_ok=True)
+        client = QdrantClient(path=tmp_dir)
+        texts = []
+        for collection in client.get_collections().collections:
+            offset = None
+            while True:
+                points, offset = client.scroll(collection.name, limit=256, offset=offset, with_payload=True)
+                texts.extend(point.payload.get("page_content", "") for point in points)
+                if offset is None:
+                    break
+        client.close()
+        return texts
+    finally:
+        shutil.rmtree(tmp_dir, ignore_errors=True)
+
+
+def make_distractors(count, seed):
+    rng = random.Random(seed)
+    return ["，".join(rng.choices(FILLER_WORDS, k=rng.randint(20, 60))) + "。" for _ in range(count)]
+
+
+def percentile(values, pct):
+    ordered = sorted(values)
+    return ordered[min(len(ordered) - 1, int(len(ordered) * pct / 100))]
+
+
+def dir_size(path):
+    return sum(os.path.getsize(os.path.join(root, name)) for root, _, names in os.walk(path) for name in names)
+
+
+def max_rss_mb():
+    """进程内存占用峰值(MB)，Linux 下 ru_maxrss 单位为 KB"""
+    return resource.getrusage(resource.RUSAGE_SELF).ru_maxrss / 1024
+
+
+def git_commit():
+    try:
+        return subprocess.run(["git", "rev-parse", "--short", "HEAD"], capture_output=True, text=True,
+                              cwd=os.path.dirname(__file__), check=True).stdout.strip()
+    except Exception:
+        return None
+
+
+def build_index(storage_dir, texts, embeddings, chunk_size, chunk_overlap, profile):
+    """
+    按 DocumentProcessor 的方式分片、嵌入、写入集合并构建 BM25 索引
+
+    Returns:
+        (检索服务, 分片数, 构建耗时秒, 构建期间进程内存峰值增长 MB)
+    """
+    rss_before = max_rss_mb()
+    start = time.perf_counter()
+    splitter = RecursiveCharacterTextSplitter(chunk_size=chunk_size, chunk_overlap=chunk_overlap)
+    chunks = splitter.split_documents([Document(page_content=text) for text in texts])
+
+    # 基准测试始终使用临时目录下的嵌入式 Qdrant，不连接 QDRANT_URL
+    client, lock = get_qdrant_client(storage_dir, url=None)
+    CollectionManager(client, "bench", embedding_model="hashing", profile=profile,
+                      embeddings=embeddings, lock=lock).recreate()
+    service = RetrieverService(
+        persist_directory=storage_dir,
+        collection_name="bench",
+        embedding_model="hashing",
+        profile=profile,
+        qdrant_url=None,
+        hybrid=True,
+        embeddings=embeddings,
+        llm=FakeListChatModel(responses=[""]),
+    )
+    service.vector_store.add_documents(chunks, ids=[str(uuid.uuid4()) for _ in chunks], batch_size=256)
+    service.build_lexical_index()
+    build_s = time.perf_counter() - start
+    return service, len(chunks), build_s, max_rss_mb() - rss_before
+
+
+def evaluate(service, queries, mode, k):
+    """
+    评测一种检索方式
+
+    Returns:
+        recall@k、MRR 和检索延迟分位数
+    """
+    recalls, reciprocal_ranks, latencies = [], [], []
+    for item in queries:
+        start = time.perf_counter()
+        if mode == "lexical":
+            hits = [service._lexical_document(doc_id) for doc_id, _ in service.lexical_index.search(item["query"], k)]
+        else:
+            query_vector = service.embeddings.embed_query(item["query"])
+            if mode == "vector":
+                hits = [doc for doc, _ in service.search(query_vector, k)]
+            else:
+                hits = [doc for doc, _ in service.hybrid_search(item["query"], query_vector, k)]
+        latencies.append((time.perf_counter() - start) * 1000)
+
+        contents = ["".join(doc.page_content.split()) for doc in hits]
+        relevant = ["".join(marker.split()) for marker in item["relevant"]]
+        found = [any(marker in content for content in contents) for marker in relevant]
+        recalls.append(sum(found) / len(relevant))
+        first = next((rank for rank, content in enumerate(contents, 1)
+                      if any(marker in content for marker in relevant)), None)
+        reciprocal_ranks.append(1 / first if first else 0.0)
+
+    return {
+        "mode": mode,
+        f"recall@{k}": round(sum(recalls) / len(recalls), 4),
+        "mrr": round(sum(reciprocal_ranks) / len(reciprocal_ranks), 4),
+        "p50_ms": round(percentile(latencies, 50), 3),
+        "p95_ms": round(percentile(latencies, 95), 3),
+        "p99_ms": round(percentile(latencies, 99), 3),
+    }
+
+
+def main():
+    parser = argparse.ArgumentParser(description="离线评测知识库检索的召回率、MRR、延迟、构建耗时和内存")
+    parser.add_argument("--queries", default=QUERIES_PATH, help="评测查询 jsonl 文件")
+    parser.add_argument("--corpus", choices=["fixture", "shipped"], default="fixture",
+                        help="fixture: init_vector_store 中的文档；shipped: 仓库自带 vector_db 中的分片")
+    parser.add_argument("--distractors", type=int, default=2000, help="加入的无关分片数，用于放大检索规模")
+    parser.add_argument("--chunk-size", type=int, default=800)
+    parser.add_argument("--chunk-overlap", type=int, default=50)
+    parser.add_argument("--profile", default="default", help="集合配置档位，见 Collection.PROFILES")
+    parser.add_argument("--dim", type=int, default=256, help="哈希嵌入的维度")
+    parser.add_argument("--k", type=int, default=3)
+    parser.add_argument("--modes", default="vector,hybrid,lexical", help="逗号分隔的检索方式")
+    parser.add_argument("--seed", type=int, default=42)
+    parser.add_argument("--output", help="将结果以 JSON 写入该文件，便于不同版本之间比较")
+    args = parser.parse_args()
+
+    queries = load_queries(args.queries)
+    texts = load_corpus(args.corpus) + make_distractors(args.distractors, args.seed)
+    storage_dir = tempfile.mkdtemp(prefix="qdrant_bench_")
+    try:
+        service, chunk_count, build_s, build_rss = build_index(
+            storage_dir, texts, HashingEmbeddings(args.dim), args.chunk_size, args.chunk_overlap, args.profile
+        )
+        results = [evaluate(service, queries, mode, args.k) for mode in args.modes.split(",")]
+        report = {
+            "timestamp": time.strftime("%Y-%m-%dT%H:%M:%S"),
+            "commit": git_commit(),
+            "params": vars(args),
+            "chunks": chunk_count,
+            "queries": len(queries),
+            "build_s": round(build_s, 3),
+            "build_rss_mb": round(build_rss, 1),
+            "disk_mb": round(dir_size(storage_dir) / 2 ** 20, 2),
+            "max_rss_mb": round(max_rss_mb(), 1),
+            "results": results,
+        }
+        service.client.close()
+    finally:
+        shutil.rmtree(storage_dir, ignore_errors=True)
+
+    print(json.dumps(report, ensure_ascii=False, indent=2))
+    if args.output:
+        with open(args.output, "w", encoding="utf-8") as f:
+            json.dump(report, f, ensure_ascii=False, indent=2)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,106 @@
+import argparse
+import json
+import os
+import statistics
+import time
+from dotenv import load_dotenv
+from .LocalEmotion import LocalEmotionClassifier
+
+# 加载环境变量
+load_dotenv()
+
+SAMPLES_PATH = os.path.join(os.path.dirname(__file__), "emotion_eval_samples.jsonl")
+
+
+def load_samples(path):
+    """读取评测样本，每行一个 {"input": ..., "feeling": ..., "score": ...}"""
+    with open(path, encoding="utf-8") as f:
+        return [json.loads(line) for line in f if line.strip()]
+
+
+def label_with_llm(samples):
+    """使用 LLM 路径重新标注样本，并记录每次调用的耗时"""
+    from .Emotion import EmotionClass
+
+    emotion = EmotionClass(local_threshold=float("inf"))
+    for sample in samples:
+        start = time.perf_counter()
+        result = emotion.Emotion_Sensing_LLM(sample["input"][:100])
+        sample["llm_ms"] = (time.perf_counter() - start) * 1000
+        if result:
+            sample["feeling"], sample["score"] = result["feeling"], str(result["score"])
+    return samples
+
+
+def percentile(values, pct):
+    ordered = sorted(values)
+    return ordered[min(len(ordered) - 1, int(len(ordered) * pct / 100))]
+
+
+def evaluate(samples, threshold, llm_ms, repeat=200):
+    """
+    评测本地分类器
+
+    Returns:
+        包含覆盖率、与 LLM 标签一致率、本地延迟以及节省延迟估算的字典
+    """
+    classifier = LocalEmotionClassifier()
+    local_us = []
+    decided = agreed = 0
+    score_errors = []
+    for sample in samples:
+        text = sample["input"][:100]
+        start = time.perf_counter()
+        for _ in range(repeat):
+            result, confidence = classifier.classify(text)
+        local_us.append((time.perf_counter() - start) / repeat * 1e6)
+
+        if result is None or confidence < threshold:
+            continue
+        decided += 1
+        if result["feeling"] == sample.get("feeling"):
+            agreed += 1
+        if sample.get("score"):
+            score_errors.append(abs(int(result["score"]) - int(sample["score"])))
+
+    measured = [s["llm_ms"] for s in samples if "llm_ms" in s]
+    llm_ms = statistics.mean(measured) if measured else llm_ms
+    coverage = decided / len(samples)
+    return {
+        "samples": len(samples),
+        "threshold": threshold,
+        "local_coverage": round(coverage, 3),
+        "feeling_agreement": round(agreed / decided, 3) if decided else None,
+        "score_mae": round(statistics.mean(score_errors), 2) if score_errors else None,
+        "local_p50_us": round(percentile(local_us, 50), 1),
+        "local_p95_us": round(percentile(local_us, 95), 1),
+        "llm_mean_ms": round(llm_ms, 1),
+        "llm_latency_measured": bool(measured),
+        # 每条消息平均节省的情感分析延迟
+        "saved_ms_per_message": round(coverage * llm_ms - statistics.mean(local_us) / 1000, 1),
+    }
+
+
+def main():
+    parser = argparse.ArgumentParser(description="评测本地情绪分类器与 LLM 标签的一致率和节省的延迟")
+    parser.add_argument("--samples", default=SAMPLES_PATH, help="评测样本 jsonl 文件")
+    parser.add_argument("--thresholds", default="0.5,0.6,0.7,0.8", help="逗号分隔的置信度阈值")
+    parser.add_argument("--llm", action="store_true", help="调用 LLM 重新标注样本并测量真实延迟")
+    parser.add_argument("--save-labels", help="将 LLM 标注结果写入该文件，供之后离线评测")
+    parser.add_argument("--llm-ms", type=float, default=800.0, help="未测量时假设的单次 LLM 情感分析延迟(毫秒)")
+    args = parser.parse_args()
+
+    samples = load_samples(args.samples)
+    if args.llm:
+        samples = label_with_llm(samples)
+        if args.save_labels:
+            with open(args.save_labels, "w", encoding="utf-8") as f:
+                for sample in samples:
+                    f.write(json.dumps(sample, ensure_ascii=False) + "\n")
+
+    for threshold in (float(t) for t in args.thresholds.split(",")):
+        print(json.dumps(evaluate(samples, threshold, args.llm_ms), ensure_ascii=False))
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,294 @@
+import argparse
+import email.parser
+import json
+import pickle
+import threading
+import time
+import uuid
+from datetime import datetime, timezone
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from urllib.parse import parse_qs, unquote, urlparse
+
+
+class FakeGoogleAPI:
+    """
+    内存中的 Google Calendar / Tasks 接口，覆盖本项目用到的请求，包括批量请求
+    配合 GOOGLE_API_ROOT 使用，便于离线测试；数据只保存在进程内
+    """
+
+    def __init__(self, latency: float = 0.0) -> None:
+        """
+        Args:
+            latency: 每个 HTTP 请求(批量请求算一个)额外等待的秒数，模拟网络往返
+        """
+        self.latency = latency
+        self._lock = threading.Lock()
+        # 日历 id -> 日程 id -> 日程，已删除的日程保留 status=cancelled 以便增量同步
+        self.events = {"primary": {}}
+        self.tasklists = [{"kind": "tasks#taskList", "id": "default", "title": "My Tasks"}]
+        self.tasks = {"default": {}}
+        self.sequence = 0
+        self.http_requests = 0
+        self.api_calls = 0
+
+    # ---------- 路由 ----------
+
+    def dispatch(self, method: str, path: str, query: dict, headers: dict, body: bytes) -> tuple:
+        """处理一个 API 请求，返回 (状态码, 响应体字典或 None)"""
+        with self._lock:
+            self.api_calls += 1
+        payload = json.loads(body) if body else {}
+        parts = [unquote(p) for p in path.strip("/").split("/")]
+        try:
+            if parts[:2] == ["calendar", "v3"]:
+                return self._calendar(method, parts[2:], query, headers, payload)
+            if parts[:2] == ["tasks", "v1"]:
+                return self._tasks(method, parts[2:], payload)
+        except KeyError:
+            return 404, _error(404, "Not Found")
+        return 404, _error(404, f"Unknown path {path}")
+
+    def _calendar(self, method, parts, query, headers, payload):
+        if parts == ["freeBusy"] and method == "POST":
+            return 200, self._freebusy(payload)
+        if len(parts) >= 3 and parts[0] == "calendars" and parts[2] == "events":
+            calendar = self.events.setdefault(parts[1], {})
+            if len(parts) == 3 and method == "GET":
+                return self._list_events(calendar, query)
+            if len(parts) == 3 and method == "POST":
+                return 200, self._save_event(calendar, payload)
+            event = calendar[parts[3]]
+            if event.get("status") == "cancelled":
+                return 410 if method == "DELETE" else 404, _error(410 if method == "DELETE" else 404, "Deleted")
+            if_match = headers.get("if-match")
+            if if_match and if_match != event["etag"] and method in ("PUT", "PATCH", "DELETE"):
+                return 412, _error(412, "Precondition Failed")
+            if method == "GET":
+                return 200, event
+            if method == "PUT":
+                return 200, self._save_event(calendar, {**payload, "id": event["id"]})
+            if method == "PATCH":
+                return 200, self._save_event(calendar, {**event, **payload})
+            if method == "DELETE":
+                self._save_event(calendar, {"id": event["id"], "status": "cancelled"})
+                return 204, None
+        return 404, _error(404, "Not Found")
+
+    def _list_events(self, calendar, query):
+        with self._lock:
+            sync_token = query.get("syncToken")
+            if sync_token:
+                since = int(sync_token)
+                items = [e for e in calendar.values() if e["_sequence"] > since]
+            else:
+                items = [e for e in calendar.values() if e.get("status") != "cancelled"]
+                time_min, time_max = _timestamp(query.get("timeMin")), _timestamp(query.get("timeMax"))
+                if time_min is not None:
+                    items = [e for e in items if _bounds(e)[1] > time_min]
+                if time_max is not None:
+                    items = [e for e in items if _bounds(e)[0] < time_max]
+            items.sort(key=lambda e: _bounds(e)[0] if e.get("start") else 0)
+            offset = int(query.get("pageToken") or 0)
+            limit = int(query.get("maxResults") or 250)
+            page = [_public(e) for e in items[offset:offset + limit]]
+            result = {"kind": "calendar#events", "items": page}
+            if offset + limit < len(items):
+                result["nextPageToken"] = str(offset + limit)
+            else:
+                result["nextSyncToken"] = str(self.sequence)
+            return 200, result
+
+    def _freebusy(self, payload):
+        time_min, time_max = _timestamp(payload["timeMin"]), _timestamp(payload["timeMax"])
+        calendars = {}
+        with self._lock:
+            for item in payload.get("items", []):
+                if item["id"] not in self.events:
+                    calendars[item["id"]] = {"errors": [{"domain": "global", "reason": "notFound"}], "busy": []}
+                    continue
+                busy = []
+                for event in self.events[item["id"]].values():
+                    if event.get("status") == "cancelled" or event.get("transparency") == "transparent":
+                        continue
+                    start, end = _bounds(event)
+                    if end > time_min and start < time_max:
+                        busy.append({"start": _utc(max(start, time_min)), "end": _utc(min(end, time_max))})
+                calendars[item["id"]] = {"busy": sorted(busy, key=lambda b: b["start"])}
+        return {"kind": "calendar#freeBusy", "timeMin": payload["timeMin"], "timeMax": payload["timeMax"],
+                "calendars": calendars}
+
+    def _save_event(self, calendar, event):
+        with self._lock:
+            self.sequence += 1
+            event = {k: v for k, v in event.items() if not k.startswith("_")}
+            event.setdefault("id", uuid.uuid4().hex)
+            event.setdefault("status", "confirmed")
+            event["kind"] = "calendar#event"
+            event["etag"] = f"\"{self.sequence}\""
+            event["updated"] = datetime.utcnow().isoformat() + "Z"
+            event["htmlLink"] = f"https://www.google.com/calendar/event?eid={event['id']}"
+            event["_sequence"] = self.sequence
+            calendar[event["id"]] = event
+            return _public(event)
+
+    def _tasks(self, method, parts, payload):
+        if parts == ["users", "@me", "lists"] and method == "GET":
+            return 200, {"kind": "tasks#taskLists", "items": self.tasklists}
+        if len(parts) == 3 and parts[0] == "lists" and parts[2] == "tasks":
+            tasks = self.tasks[parts[1]]
+            if method == "POST":
+                task = {**payload, "kind": "tasks#task", "id": uuid.uuid4().hex}
+                with self._lock:
+                    tasks[task["id"]] = task
+                return 200, task
+            if method == "GET":
+                return 200, {"kind": "tasks#tasks", "items": list(tasks.values())}
+        return 404, _error(404, "Not Found")
+
+    # ---------- 批量请求 ----------
+
+    def dispatch_batch(self, content_type: str, body: bytes) -> tuple:
+        """
+        处理 multipart/mixed 批量请求
+
+        Returns:
+            (响应的 Content-Type, 响应体)
+        """
+        message = email.parser.BytesParser().parsebytes(
+            f"Content-Type: {content_type}\r\n\r\n".encode("utf-8") + body
+        )
+        boundary = uuid.uuid4().hex
+        chunks = []
+        for part in message.get_payload():
+            raw = part.get_payload(decode=True).decode("utf-8").replace("\r\n", "\n")
+            head, _, sub_body = raw.partition("\n\n")
+            request_line, *header_lines = head.split("\n")
+            method, target, _ = request_line.split(" ", 2)
+            sub_headers = {}
+            for line in header_lines:
+                name, _, value = line.partition(":")
+                sub_headers[name.strip().lower()] = value.strip()
+            url = urlparse(target)
+            query = {k: v[0] for k, v in parse_qs(url.query).items()}
+            status, result = self.dispatch(method, url.path, query, sub_headers, sub_body.encode("utf-8"))
+            content = json.dumps(result) if result is not None else ""
+            content_id = part["Content-ID"].strip("<>")
+            chunks.append(
+                f"--{boundary}\r\nContent-Type: application/http\r\nContent-ID: <response-{content_id}>\r\n\r\n"
+                f"HTTP/1.1 {status} {_reason(status)}\r\nContent-Type: application/json; charset=UTF-8\r\n"
+                f"Content-Length: {len(content.encode('utf-8'))}\r\n\r\n{content}\r\n"
+            )
+        chunks.append(f"--{boundary}--\r\n")
+        return f"multipart/mixed; boundary={boundary}", "".join(chunks).encode("utf-8")
+
+    def stats(self) -> dict:
+        return {"http_requests": self.http_requests, "api_calls": self.api_calls}
+
+
+def _error(code: int, message: str) -> dict:
+    return {"error": {"code": code, "message": message, "errors": [{"reason": message}]}}
+
+
+def _reason(status: int) -> str:
+    return {200: "OK", 204: "No Content", 404: "Not Found", 410: "Gone", 412: "Precondition Failed"}.get(status, "")
+
+
+def _timestamp(value):
+    if not value:
+        return None
+    return datetime.fromisoformat(value.replace("Z", "+00:00")).timestamp()
+
+
+def _bounds(event):
+    start, end = event.get("start", {}), event.get("end", {})
+    return (_timestamp(start.get("dateTime") or start.get("date")),
+            _timestamp(end.get("dateTime") or end.get("date")))
+
+
+def _utc(timestamp):
+    return datetime.fromtimestamp(timestamp, timezone.utc).strftime("%Y-%m-%dT%H:%M:%SZ")
+
+
+def _public(event):
+    return {k: v for k, v in event.items() if not k.startswith("_")}
+
+
+def make_handler(api: FakeGoogleAPI):
+    class Handler(BaseHTTPRequestHandler):
+        protocol_version = "HTTP/1.1"
+
+        def _handle(self):
+            with api._lock:
+                api.http_requests += 1
+            if api.latency:
+                time.sleep(api.latency)
+            length = int(self.headers.get("Content-Length") or 0)
+            body = self.rfile.read(length) if length else b""
+            url = urlparse(self.path)
+            if url.path == "/_stats":
+                return self._send(200, "application/json", json.dumps(api.stats()).encode("utf-8"))
+            if url.path.startswith("/batch"):
+                content_type, content = api.dispatch_batch(self.headers["Content-Type"], body)
+                return self._send(200, content_type, content)
+            query = {k: v[0] for k, v in parse_qs(url.query).items()}
+            headers = {k.lower(): v for k, v in self.headers.items()}
+            status, result = api.dispatch(self.command, url.path, query, headers, body)
+            content = json.dumps(result).encode("utf-8") if result is not None else b""
+            self._send(status, "application/json; charset=UTF-8", content)
+
+        def _send(self, status, content_type, content):
+            self.send_response(status)
+            self.send_header("Content-Type", content_type)
+            self.send_header("Content-Length", str(len(content)))
+            self.end_headers()
+            self.wfile.write(content)
+
+        do_GET = do_POST = do_PUT = do_PATCH = do_DELETE = _handle
+
+        def log_message(self, format, *args):
+            pass
+
+    return Handler
+
+
+def serve(host: str = "127.0.0.1", port: int = 0, latency: float = 0.0) -> tuple:
+    """
+    在后台线程启动服务
+
+    Returns:
+        (服务器, FakeGoogleAPI, 根地址)，根地址可直接设置为 GOOGLE_API_ROOT
+    """
+    api = FakeGoogleAPI(latency=latency)
+    server = ThreadingHTTPServer((host, port), make_handler(api))
+    threading.Thread(target=server.serve_forever, daemon=True).start()
+    return server, api, f"http://{host}:{server.server_address[1]}/"
+
+
+def write_token(path: str) -> None:
+    """写入一个无需刷新的假令牌，GoogleServicePool 读取后不会启动 OAuth 授权流程"""
+    from google.oauth2.credentials import Credentials
+
+    with open(path, "wb") as f:
+        pickle.dump(Credentials(token="fake-token"), f)
+
+
+def main():
+    parser = argparse.ArgumentParser(description="启动本地的 Google Calendar / Tasks 假服务，用于离线测试")
+    parser.add_argument("--host", default="127.0.0.1")
+    parser.add_argument("--port", type=int, default=8085)
+    parser.add_argument("--latency-ms", type=float, default=0.0, help="每个 HTTP 请求额外的延迟(毫秒)，模拟网络往返")
+    parser.add_argument("--write-token", help="把假令牌写入该文件，并设置 GOOGLE_TOKEN_PATH 指向它")
+    args = parser.parse_args()
+
+    if args.write_token:
+        write_token(args.write_token)
+    server, _, root = serve(args.host, args.port, args.latency_ms / 1000)
+    print(f"Fake Google API listening on {root}，设置 GOOGLE_API_ROOT={root} 使用")
+    try:
+        threading.Event().wait()
+    except KeyboardInterrupt:
+        server.shutdown()
+
+
+if __name__ == "__main__":
+    main()